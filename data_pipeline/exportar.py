@@ -0,0 +1,81 @@
+import sys
+import os
+import gzip
+import argparse
+
+# --- CONFIGURACIÓN DE RUTAS ---
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+try:
+    from shared_code.database import db_manager
+    from shared_code import exportacion
+except ModuleNotFoundError as e:
+    print(f"Error de importación: {e}")
+    sys.exit(1)
+
+# Volcado offline del histórico de precios (mismo formato que /api/export/*).
+# Uso: python data_pipeline/exportar.py faena --desde 2024-01-01 --hasta 2024-12-31 --salida faena_2024.csv.gz
+# Sin --salida escribe a stdout; si el archivo termina en .gz se comprime con gzip.
+
+
+def _abrir_salida(ruta):
+    if not ruta or ruta == '-':
+        return sys.stdout, False
+    if ruta.endswith('.gz'):
+        return gzip.open(ruta, 'wt', encoding='utf-8', newline=''), True
+    return open(ruta, 'w', encoding='utf-8', newline=''), True
+
+
+def exportar(conn, args):
+    """Escribe la exportación lote a lote; devuelve la cantidad de filas."""
+    columnas, lotes = db_manager.exportar_precios(
+        conn, args.tabla, args.desde, args.hasta,
+        categoria=args.categoria, raza=args.raza, rango_peso=args.rango_peso,
+    )
+    filas = 0
+
+    def contar(lotes):
+        nonlocal filas
+        for lote in lotes:
+            filas += len(lote)
+            yield lote
+
+    salida, cerrar = _abrir_salida(args.salida)
+    try:
+        for trozo in exportacion.serializar(args.formato, columnas, contar(lotes)):
+            salida.write(trozo)
+    finally:
+        if cerrar:
+            salida.close()
+    return filas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exporta el histórico de precios a CSV o NDJSON")
+    parser.add_argument("tabla", choices=sorted(db_manager.COLUMNAS_EXPORTACION), help="Tabla a exportar")
+    parser.add_argument("--desde", default="0001-01-01", help="Fecha ISO (YYYY-MM-DD). Por defecto: todo el histórico.")
+    parser.add_argument("--hasta", default="9999-12-31", help="Fecha ISO (YYYY-MM-DD). Por defecto: todo el histórico.")
+    parser.add_argument("--categoria", help="Filtra por categoría original")
+    parser.add_argument("--raza", help="Filtra por raza (solo Faena)")
+    parser.add_argument("--rango-peso", dest="rango_peso", help="Filtra por rango de peso (solo Faena)")
+    parser.add_argument("--formato", choices=exportacion.FORMATOS_EXPORTACION, default="csv")
+    parser.add_argument("--salida", help="Archivo de salida (.gz para comprimir). Por defecto: stdout.")
+    args = parser.parse_args()
+
+    conn = db_manager.get_db_connection()
+    if not conn:
+        print("No hay conexión a base de datos.", file=sys.stderr)
+        sys.exit(1)
+
+    try:
+        filas = exportar(conn, args)
+    finally:
+        conn.close()
+    if args.salida:
+        print(f">> {filas} filas exportadas en {args.salida}")
+
+
+if __name__ == "__main__":
+    main()
@@ -23,6 +23,7 @@ LISTA_DESTINATARIOS = [email.strip() for email in RAW_RECIPIENTS.split(',') if e
 try:
     from shared_code.database import db_manager
     from shared_code.logger_config import setup_logger
+    from shared_code import snapshots
     from data_pipeline.scrapers import mag_scraper, cac_scraper
     from data_pipeline.reports import report_generator
     from data_pipeline.utils import email_sender
@@ -38,50 +39,27 @@ RECIPIENT_EMAIL = os.getenv('ALERT_RECIPIENT') # O una variable específica CLIE
 
 def _calcular_variacion_faena(conn, datos_faena):
     """
-    Enriquece los datos de faena con la variación semanal calculada.
-    Consulta el precio más cercano disponible a 7 días atrás para cada registro.
-    Si no hay datos exactos de -7 días, busca el último dato disponible anterior.
+    Enriquece los datos de faena con la variación semanal.
+    La variación ya quedó materializada en la BD al insertar (regla "as-of" única:
+    último precio de la misma serie con fecha <= fecha - 7 días), acá solo se lee.
     """
-    from datetime import datetime, timedelta
-    
-    cursor = conn.cursor()
+    variaciones_por_fecha = {}
     datos_enriquecidos = []
     
     for item in datos_faena:
-        # Calcular fecha de hace 7 días
-        fecha_actual = datetime.strptime(item['fecha_consulta_inicio'], '%d/%m/%Y')
-        fecha_7dias_atras = (fecha_actual - timedelta(days=7)).strftime('%Y-%m-%d')
-        
-        # Consultar el precio más reciente disponible antes o en la fecha de hace 7 días
-        # Esto maneja casos donde no hay datos exactos (fin de semana, feriado)
-        cursor.execute("""
-            SELECT precio_promedio_kg, fecha_consulta
-            FROM faena 
-            WHERE fecha_consulta <= ? 
-            AND categoria_original = ? 
-            AND (raza = ? OR (raza IS NULL AND ? IS NULL))
-            AND (rango_peso = ? OR (rango_peso IS NULL AND ? IS NULL))
-            ORDER BY fecha_consulta DESC
-            LIMIT 1
-        """, (
-            fecha_7dias_atras,
-            item['categoria_original'],
-            item.get('raza', ''), item.get('raza', ''),
-            item.get('rango_peso', ''), item.get('rango_peso', '')
-        ))
-        
-        row = cursor.fetchone()
-        if row and row[0] and row[0] > 0:
-            precio_referencia = row[0]
-            fecha_referencia = row[1]
-            precio_actual = item['precio_promedio_kg']
-            variacion = round(((precio_actual - precio_referencia) / precio_referencia) * 100, 2)
-            item['variacion_semanal_precio'] = variacion
-            # Guardamos la fecha de referencia para debugging
-            item['fecha_referencia_variacion'] = fecha_referencia
-        else:
-            item['variacion_semanal_precio'] = None
-            item['fecha_referencia_variacion'] = None
+        try:
+            fecha_iso = datetime.strptime(item['fecha_consulta_inicio'], '%d/%m/%Y').strftime('%Y-%m-%d')
+        except (ValueError, TypeError, KeyError):
+            fecha_iso = None
+
+        if fecha_iso not in variaciones_por_fecha:
+            variaciones_por_fecha[fecha_iso] = db_manager.get_variacion_faena(conn, fecha_iso) if fecha_iso else {}
+
+        clave = (item.get('categoria_original'), item.get('raza'), item.get('rango_peso'))
+        variacion, fecha_referencia = variaciones_por_fecha[fecha_iso].get(clave, (None, None))
+        item['variacion_semanal_precio'] = variacion
+        # Guardamos la fecha de referencia para debugging
+        item['fecha_referencia_variacion'] = fecha_referencia
         
         datos_enriquecidos.append(item)
     
@@ -116,9 +94,10 @@ def ejecutar_pipeline_diario(enviar_email=True):
         
         if datos_faena:
             # Insertar
-            count = db_manager.insertar_datos_faena(conn, datos_faena)
+            conteos = db_manager.insertar_datos_faena(conn, datos_faena, detalle=True)
             resumen_faena = len(datos_faena)
-            logger.info(f"   -> Faena: {count} registros insertados/actualizados.")
+            logger.info(f"   -> Faena: {conteos['insertados']} insertados, {conteos['actualizados']} actualizados, "
+                        f"{conteos['sin_cambios']} sin cambios.")
             
             # Enriquecer datos con variación semanal antes de generar PDF
             logger.info("   -> Calculando variación semanal para el reporte...")
@@ -147,9 +126,10 @@ def ejecutar_pipeline_diario(enviar_email=True):
         
         if datos_invernada:
             # Insertar
-            count_inv = db_manager.insertar_datos_invernada(conn, datos_invernada)
+            conteos_inv = db_manager.insertar_datos_invernada(conn, datos_invernada, detalle=True)
             resumen_invernada = len(datos_invernada)
-            logger.info(f"   -> Invernada: {count_inv} registros insertados/actualizados.")
+            logger.info(f"   -> Invernada: {conteos_inv['insertados']} insertados, {conteos_inv['actualizados']} actualizados, "
+                        f"{conteos_inv['sin_cambios']} sin cambios.")
             
             # Generar PDF
             try:
@@ -167,14 +147,31 @@ def ejecutar_pipeline_diario(enviar_email=True):
             logger.warning("   -> No se obtuvieron datos de Invernada.")
 
         # ---------------------------------------------------------
-        # PASO 3: ENVÍO DE EMAIL
+        # PASO 3: PUBLICACIÓN (Generación de la base y Snapshots del Dashboard)
+        # ---------------------------------------------------------
+        # Con PRECIOS_GENERACIONES la web no lee esta base: los datos nuevos se publican como una
+        # generación inmutable (compactada y con estadísticas) antes que los snapshots.
+        if db_manager.PRECIOS_GENERACIONES:
+            logger.info("3. Publicando generación de la base de precios...")
+            generacion = db_manager.publicar_generacion(conn)
+            if generacion:
+                logger.info(f"   -> Generación vigente: {os.path.basename(generacion)}")
+
+        # Series por rango estándar como archivos estáticos precomprimidos (ver shared_code/snapshots.py).
+        # Corre aunque no haya datos nuevos: los rangos terminan en la fecha de hoy.
+        logger.info("3. Publicando snapshots de las series del Dashboard...")
+        publicados = snapshots.publicar_snapshots(conn, hoy=hoy.date())
+        logger.info(f"   -> {publicados} snapshots publicados.")
+
+        # ---------------------------------------------------------
+        # PASO 4: ENVÍO DE EMAIL
         # ---------------------------------------------------------
         if reportes_generados:
             if enviar_email:
                 if not LISTA_DESTINATARIOS:
                     logger.warning("No hay destinatarios configurados en CLIENT_EMAILS.")
                 else:
-                    logger.info(f"3. Enviando reportes a {len(LISTA_DESTINATARIOS)} destinatarios...")
+                    logger.info(f"4. Enviando reportes a {len(LISTA_DESTINATARIOS)} destinatarios...")
                     
                     asunto = f"Reporte de Precios Hacienda - {hoy_str}"
                     cuerpo = (f"Consignataria Ortiz y Cia. le acerca los reportes del día:\n\n"
@@ -195,7 +192,7 @@ def ejecutar_pipeline_diario(enviar_email=True):
                     else:
                         logger.error("   -> Falló el envío del email.")
             else:
-                logger.info("3. Omitiendo envío de email (Modo silencioso).")
+                logger.info("4. Omitiendo envío de email (Modo silencioso).")
 
     except Exception as e:
         logger.exception("Excepción CRÍTICA no controlada en el Pipeline Principal.")
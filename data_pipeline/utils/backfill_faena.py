@@ -13,6 +13,7 @@ if project_root not in sys.path:
 try:
     from data_pipeline.scrapers import mag_scraper
     from shared_code.database import db_manager
+    from data_pipeline.utils import mantenimiento_precios
 except ModuleNotFoundError as e:
     print(f"Error de importación: {e}")
     print("Verifica que estás ejecutando desde la raíz o que las rutas son correctas.")
@@ -132,6 +133,7 @@ def ejecutar_backfill():
         print("\n\n>> Proceso interrumpido manualmente por el usuario.")
     
     finally:
+        mantenimiento_precios.publicar_generacion_pendiente(conn, hubo_cambios=total_registros_insertados > 0)
         conn.close()
         print("\n" + "="*50)
         print("RESUMEN FINAL DEL BACKFILL")
@@ -11,6 +11,7 @@ sys.path.insert(0, project_root)
 try:
     from data_pipeline.scrapers import cac_scraper
     from shared_code.database import db_manager
+    from data_pipeline.utils import mantenimiento_precios
 except ModuleNotFoundError as e:
     print(f"Error imports: {e}")
     sys.exit(1)
@@ -52,6 +53,7 @@ def ejecutar_backfill():
         return
 
     print("\n--- INICIANDO SCRAPING HISTÓRICO (3 AÑOS) ---")
+    count = 0
     try:
         datos = cac_scraper.scrape_invernada_historico(debug=True)
         
@@ -65,6 +67,7 @@ def ejecutar_backfill():
     except Exception as e:
         print(f"Error fatal: {e}")
     finally:
+        mantenimiento_precios.publicar_generacion_pendiente(conn, hubo_cambios=count > 0)
         conn.close()
 
 if __name__ == "__main__":
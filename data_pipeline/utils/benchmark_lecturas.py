@@ -0,0 +1,112 @@
+import sys
+import os
+import time
+import sqlite3
+import argparse
+from datetime import date, timedelta
+
+# --- SETUP DE RUTAS (ARQUITECTURA MONOREPO) ---
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+try:
+    from shared_code.database import db_manager
+    from shared_code.database.motor_columnar import MotorColumnar
+except ModuleNotFoundError as e:
+    print(f"Error de importación: {e}")
+    sys.exit(1)
+
+# Compara las lecturas de series con SQL (db_manager) y con el motor columnar en memoria.
+# Uso: python data_pipeline/utils/benchmark_lecturas.py [--sintetico AÑOS] [--repeticiones N]
+
+
+def base_sintetica(anios):
+    """Base en memoria con `anios` años diarios de Faena (3 categorías x 3 razas x 3 pesos) e Invernada semanal."""
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    db_manager.crear_tablas_precios(conn)
+    inicio = date.today() - timedelta(days=365 * anios)
+    dias = [inicio + timedelta(days=d) for d in range(365 * anios)]
+    filas = [
+        {'fecha_consulta_inicio': dia.strftime('%d/%m/%Y'), 'categoria_original': categoria, 'raza': raza,
+         'rango_peso': peso, 'precio_promedio_kg': 1000.0 + n + 7 * i, 'cabezas': 10 + i % 50,
+         'kilos_total': 4000.0 + i, 'importe_total': (1000.0 + n + 7 * i) * (4000.0 + i)}
+        for n, dia in enumerate(dias)
+        for i, (categoria, raza, peso) in enumerate(
+            (c, r, p) for c in ('NOVILLOS', 'VAQUILLONAS', 'VACAS') for r in ('Angus', 'Hereford', 'Cruza')
+            for p in ('300-400 kg', '400-500 kg', '+500 kg'))
+    ]
+    db_manager.insertar_datos_faena(conn, filas)
+    db_manager.insertar_datos_invernada(conn, [
+        {'fecha_consulta_inicio': dia.strftime('%d/%m/%Y'),
+         'fecha_consulta_fin': (dia + timedelta(days=6)).strftime('%d/%m/%Y'),
+         'categoria_original': categoria, 'precio_promedio_kg': 3000.0 + n, 'cabezas': 100}
+        for n, dia in enumerate(dias[::7]) for categoria in ('Terneros 160-180 kg', 'Terneras 160-180 kg')
+    ])
+    return conn
+
+
+def medir(funcion, repeticiones):
+    """Mejor tiempo (ms) de `repeticiones` ejecuciones."""
+    mejor = float('inf')
+    for _ in range(repeticiones):
+        t0 = time.perf_counter()
+        funcion()
+        mejor = min(mejor, time.perf_counter() - t0)
+    return mejor * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de lecturas de precios: SQL vs motor columnar")
+    parser.add_argument("--sintetico", type=int, metavar="AÑOS",
+                        help="Usa una base sintética en memoria con esa cantidad de años en lugar de la real.")
+    parser.add_argument("--repeticiones", type=int, default=20, help="Ejecuciones por consulta (se toma la mejor).")
+    args = parser.parse_args()
+
+    conn = base_sintetica(args.sintetico) if args.sintetico else db_manager.get_db_connection()
+    if not conn:
+        print("No hay conexión a base de datos.")
+        sys.exit(1)
+
+    try:
+        t0 = time.perf_counter()
+        motor = MotorColumnar.cargar(conn)
+        print(f"Carga del motor: {(time.perf_counter() - t0) * 1000:.1f} ms")
+
+        fin = date.today().isoformat()
+        inicio = (date.today() - timedelta(days=365 * 5)).isoformat()
+        anio = (date.today() - timedelta(days=365)).isoformat()
+        casos = [
+            ("historico faena NOVILLOS (5 años)",
+             lambda: db_manager.get_faena_historico(conn, inicio, fin, 'NOVILLOS'),
+             lambda: motor.faena_historico(inicio, fin, 'NOVILLOS')),
+            ("historico faena serie (1 año)",
+             lambda: db_manager.get_faena_historico(conn, anio, fin, 'NOVILLOS', 'Angus', '400-500 kg'),
+             lambda: motor.faena_historico(anio, fin, 'NOVILLOS', 'Angus', '400-500 kg')),
+            ("agrupado faena NOVILLOS semanal",
+             lambda: db_manager.get_faena_agrupado(conn, inicio, fin, 'NOVILLOS', agrupacion='semanal',
+                                                   formato_fecha='iso'),
+             lambda: motor.agrupado('faena', inicio, fin, ('NOVILLOS', None, None), 'semanal', 'iso')),
+            ("agrupado faena todo diario",
+             lambda: db_manager.get_faena_agrupado(conn, inicio, fin, agrupacion='diario', formato_fecha='iso'),
+             lambda: motor.agrupado('faena', inicio, fin, (None, None, None), 'diario', 'iso')),
+            ("resumen faena NOVILLOS",
+             lambda: db_manager.get_faena_resumen(conn, anio, fin, 'NOVILLOS'),
+             lambda: motor.resumen('faena', anio, fin, ('NOVILLOS', None, None))),
+            ("historico invernada",
+             lambda: db_manager.get_invernada_historico(conn, inicio, fin),
+             lambda: motor.invernada_historico(inicio, fin)),
+        ]
+
+        print(f"{'Consulta':<36}{'SQL (ms)':>10}{'NumPy (ms)':>12}{'x':>8}")
+        for nombre, sql, columnar in casos:
+            t_sql = medir(sql, args.repeticiones)
+            t_np = medir(columnar, args.repeticiones)
+            print(f"{nombre:<36}{t_sql:>10.2f}{t_np:>12.2f}{t_sql / t_np if t_np else float('inf'):>8.1f}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import sys
+import os
+import argparse
+
+# --- SETUP DE RUTAS (ARQUITECTURA MONOREPO) ---
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+try:
+    from shared_code.database import db_manager
+except ModuleNotFoundError as e:
+    print(f"Error de importación: {e}")
+    sys.exit(1)
+
+# Tareas de mantenimiento one-shot sobre la base de Precios.
+# Uso: python data_pipeline/utils/mantenimiento_precios.py <comando> [opciones]
+
+
+def publicar_generacion_pendiente(conn, hubo_cambios=True):
+    """
+    Con PRECIOS_GENERACIONES la web solo lee la generación publicada: los scripts que escriben
+    en la base (mantenimiento, backfill) la publican al terminar. Sin cambios solo se avisa.
+    """
+    if not db_manager.PRECIOS_GENERACIONES:
+        return
+    if not hubo_cambios:
+        print(">> Sin cambios: la web sigue leyendo la generación anterior. Para publicarla igual: "
+              "python data_pipeline/utils/mantenimiento_precios.py generacion")
+        return
+    cmd_generacion(conn, None)
+
+
+def cmd_variacion(conn, args):
+    """Recalcula la variación semanal materializada de Faena."""
+    desde = args.desde
+    print(f"Recalculando variación semanal de Faena {'desde ' + desde if desde else '(histórico completo)'}...")
+    actualizados = db_manager.recalcular_variacion_faena(conn, desde=desde)
+    print(f">> {actualizados} registros actualizados.")
+
+
+def cmd_rollups(conn, args):
+    """Reconstruye los rollups semanales/mensuales desde las tablas crudas."""
+    print("Reconstruyendo rollups de precios...")
+    for tabla, filas in db_manager.reconstruir_rollups(conn).items():
+        print(f">> {tabla}: {filas} filas.")
+
+
+def cmd_generacion(conn, args):
+    """Publica el contenido actual de la base como generación de lectura de la web."""
+    print("Publicando generación de la base de Precios...")
+    ruta = db_manager.publicar_generacion(conn)
+    print(f">> {ruta}" if ruta else ">> Falló la publicación (ver logs).")
+
+
+def cmd_migrar_v2(conn, args):
+    """Convierte la base al esquema v2 compacto (dimensiones + fechas enteras + vistas)."""
+    print("Migrando la base de Precios al esquema v2...")
+    resultado = db_manager.migrar_esquema_v2(conn)
+    if resultado is None:
+        print(">> Falló la migración (ver logs). La base quedó sin cambios.")
+    elif not resultado:
+        print(">> La base ya estaba en el esquema v2.")
+    else:
+        print(f">> Faena: {resultado['faena']} filas, Invernada: {resultado['invernada']} filas, "
+              f"{resultado['descartadas']} descartadas.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mantenimiento de la base de Precios Históricos")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p_var = sub.add_parser("variacion", help="Recalcula la variación semanal de Faena con la regla as-of")
+    p_var.add_argument("--desde", help="Fecha ISO (YYYY-MM-DD) desde la cual recalcular. Por defecto: todo.")
+    p_var.set_defaults(func=cmd_variacion)
+
+    p_roll = sub.add_parser("rollups", help="Reconstruye los rollups semanales/mensuales de Faena e Invernada")
+    p_roll.set_defaults(func=cmd_rollups)
+
+    p_gen = sub.add_parser("generacion", help="Publica una generación inmutable de la base para la web (PRECIOS_GENERACIONES)")
+    p_gen.set_defaults(func=cmd_generacion)
+
+    p_v2 = sub.add_parser("migrar-v2", help="Migra la base al esquema v2 compacto (tablas de dimensión, fechas enteras)")
+    p_v2.set_defaults(func=cmd_migrar_v2)
+
+    args = parser.parse_args()
+
+    conn = db_manager.get_db_connection()
+    if not conn:
+        print("No hay conexión a base de datos.")
+        sys.exit(1)
+
+    try:
+        # Asegura columnas/índices nuevos en bases creadas con versiones anteriores
+        db_manager.crear_tablas_precios(conn)
+        args.func(conn, args)
+        if args.func is not cmd_generacion:
+            publicar_generacion_pendiente(conn)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
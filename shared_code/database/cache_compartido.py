@@ -0,0 +1,259 @@
+import sqlite3
+import os
+import sys
+import time
+import json
+import zlib
+import threading
+
+# --- LOGGING SETUP ---
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(os.path.dirname(current_dir))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from shared_code.logger_config import setup_logger
+from shared_code.database.db_manager import DATABASES_DIR
+logger = setup_logger('Cache_Compartido')
+
+# --- CACHÉ DE RESPUESTAS COMPARTIDA ENTRE WORKERS ---
+# Los workers de gunicorn son procesos separados: una caché en memoria se calienta (e
+# invalida) una vez por worker. Esta caché vive en un archivo SQLite (WAL) junto a las
+# bases, así la respuesta que calcula un worker la sirven todos.
+# - Cada entrada pertenece a un "espacio" (api, pagina) y a una versión: publicar una
+#   versión nueva de un espacio borra las entradas de versiones anteriores.
+# - Publicar es un único INSERT OR REPLACE: los lectores ven la entrada vieja o la nueva.
+# - El tamaño total está acotado: se desalojan las entradas menos usadas recientemente.
+# - También guarda contadores por día (p.ej. vistas por categoría del Dashboard), para que
+#   todos los workers sumen sobre el mismo total.
+
+CACHE_COMPARTIDO_PATH = os.environ.get('CACHE_COMPARTIDO_PATH', os.path.join(DATABASES_DIR, 'cache_respuestas.db'))
+CACHE_COMPARTIDO_MB = float(os.environ.get('CACHE_COMPARTIDO_MB', 64))
+UMBRAL_COMPRESION = 1024  # Bytes: por debajo no vale la pena comprimir
+INTERVALO_ACCESO = 60     # Segundos: no se reescribe `ultimo_acceso` en cada lectura
+DIAS_CONTADORES = 365     # Los contadores por día más viejos se borran
+
+
+def _dia(hace_dias=0):
+    """Fecha local (YYYY-MM-DD) de hoy o de `hace_dias` días atrás."""
+    return time.strftime('%Y-%m-%d', time.localtime(time.time() - hace_dias * 86400))
+
+
+class RespuestaGuardada:
+    __slots__ = ('cuerpo', 'content_type', 'headers')
+
+    def __init__(self, cuerpo, content_type, headers):
+        self.cuerpo = cuerpo
+        self.content_type = content_type
+        self.headers = headers
+
+
+class CacheCompartido:
+    """
+    Caché de respuestas serializadas sobre SQLite, segura entre procesos.
+    Cualquier error de SQLite se registra y se trata como un miss: la caché nunca rompe una petición.
+    """
+
+    def __init__(self, ruta=CACHE_COMPARTIDO_PATH, max_bytes=int(CACHE_COMPARTIDO_MB * 1024 * 1024)):
+        self.ruta = ruta
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._reiniciar()
+
+    def _reiniciar(self):
+        self._pid = os.getpid()
+        self._conn = None
+        self._dia_purga = None
+        self.hits = 0
+        self.misses = 0
+        self.publicadas = 0
+        self.desalojos = 0
+        self.errores = 0
+
+    def _conexion(self):
+        """Conexión propia del proceso (se reabre tras un fork). Llamar con el lock tomado."""
+        if os.getpid() != self._pid:
+            self._reiniciar()
+        if self._conn is None:
+            conn = sqlite3.connect(self.ruta, timeout=1, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL;")
+            conn.execute("PRAGMA synchronous=NORMAL;")
+            conn.execute("""
+            CREATE TABLE IF NOT EXISTS respuestas (
+                espacio TEXT NOT NULL,
+                clave TEXT NOT NULL,
+                version TEXT NOT NULL,
+                expira REAL,
+                ultimo_acceso REAL NOT NULL,
+                tamano INTEGER NOT NULL,
+                comprimido INTEGER NOT NULL,
+                content_type TEXT,
+                headers TEXT,
+                cuerpo BLOB NOT NULL,
+                PRIMARY KEY (espacio, clave)
+            ) WITHOUT ROWID
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_respuestas_acceso ON respuestas (ultimo_acceso)")
+            conn.execute("""
+            CREATE TABLE IF NOT EXISTS contadores (
+                nombre TEXT NOT NULL,
+                clave TEXT NOT NULL,
+                dia TEXT NOT NULL,
+                cuenta INTEGER NOT NULL,
+                PRIMARY KEY (nombre, clave, dia)
+            ) WITHOUT ROWID
+            """)
+            self._conn = conn
+        return self._conn
+
+    def obtener(self, espacio, clave, version=''):
+        """Devuelve la RespuestaGuardada vigente para (espacio, clave, version) o None."""
+        ahora = time.time()
+        with self._lock:
+            try:
+                conn = self._conexion()
+                fila = conn.execute("""
+                    SELECT version, expira, ultimo_acceso, comprimido, content_type, headers, cuerpo
+                    FROM respuestas WHERE espacio = ? AND clave = ?
+                """, (espacio, clave)).fetchone()
+                if fila is None or fila[0] != version or (fila[1] is not None and fila[1] < ahora):
+                    self.misses += 1
+                    return None
+                if ahora - fila[2] > INTERVALO_ACCESO:
+                    conn.execute("UPDATE respuestas SET ultimo_acceso = ? WHERE espacio = ? AND clave = ?",
+                                 (ahora, espacio, clave))
+                self.hits += 1
+            except sqlite3.Error as e:
+                self.errores += 1
+                logger.error(f"Error leyendo la caché compartida: {e}")
+                return None
+
+        cuerpo = zlib.decompress(fila[6]) if fila[3] else bytes(fila[6])
+        return RespuestaGuardada(cuerpo, fila[4], json.loads(fila[5]) if fila[5] else {})
+
+    def publicar(self, espacio, clave, cuerpo, version='', content_type=None, headers=None, ttl=None):
+        """Guarda (de forma atómica) una respuesta y aplica el límite de tamaño."""
+        comprimido = len(cuerpo) >= UMBRAL_COMPRESION
+        datos = zlib.compress(cuerpo, 6) if comprimido else cuerpo
+        if len(datos) > self.max_bytes:
+            return False
+        ahora = time.time()
+        with self._lock:
+            try:
+                conn = self._conexion()
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    # Las versiones anteriores del espacio ya no pueden servirse
+                    conn.execute("DELETE FROM respuestas WHERE espacio = ? AND version != ?", (espacio, version))
+                    conn.execute("""
+                        INSERT OR REPLACE INTO respuestas
+                            (espacio, clave, version, expira, ultimo_acceso, tamano, comprimido, content_type, headers, cuerpo)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """, (espacio, clave, version, ahora + ttl if ttl else None, ahora, len(datos), int(comprimido),
+                          content_type, json.dumps(headers) if headers else None, sqlite3.Binary(datos)))
+                    self.desalojos += self._desalojar(conn)
+                    conn.execute("COMMIT")
+                except sqlite3.Error:
+                    conn.execute("ROLLBACK")
+                    raise
+                self.publicadas += 1
+                return True
+            except sqlite3.Error as e:
+                self.errores += 1
+                logger.error(f"Error publicando en la caché compartida: {e}")
+                return False
+
+    def _desalojar(self, conn):
+        """Borra las entradas menos usadas hasta que el total entre en `max_bytes`."""
+        cursor = conn.execute("""
+            DELETE FROM respuestas WHERE (espacio, clave) IN (
+                SELECT espacio, clave FROM (
+                    SELECT espacio, clave, SUM(tamano) OVER (ORDER BY ultimo_acceso DESC) AS acumulado
+                    FROM respuestas
+                ) WHERE acumulado > ?
+            )
+        """, (self.max_bytes,))
+        return cursor.rowcount
+
+    def invalidar(self, espacio):
+        """Borra todas las entradas de un espacio (p.ej. tras una escritura en el marketplace)."""
+        with self._lock:
+            try:
+                self._conexion().execute("DELETE FROM respuestas WHERE espacio = ?", (espacio,))
+            except sqlite3.Error as e:
+                self.errores += 1
+                logger.error(f"Error invalidando la caché compartida: {e}")
+
+    def contar(self, nombre, clave):
+        """Suma 1 al contador (nombre, clave) del día."""
+        hoy = _dia()
+        with self._lock:
+            try:
+                conn = self._conexion()
+                conn.execute("""
+                    INSERT INTO contadores (nombre, clave, dia, cuenta) VALUES (?, ?, ?, 1)
+                    ON CONFLICT(nombre, clave, dia) DO UPDATE SET cuenta = cuenta + 1
+                """, (nombre, clave, hoy))
+                if self._dia_purga != hoy:
+                    conn.execute("DELETE FROM contadores WHERE dia <= ?", (_dia(hace_dias=DIAS_CONTADORES),))
+                    self._dia_purga = hoy
+            except sqlite3.Error as e:
+                self.errores += 1
+                logger.error(f"Error actualizando el contador '{nombre}': {e}")
+
+    def ranking(self, nombre, dias):
+        """[(clave, total)] del contador en los últimos `dias` días, de mayor a menor ([] si falla)."""
+        desde = _dia(hace_dias=dias)
+        with self._lock:
+            try:
+                return self._conexion().execute("""
+                    SELECT clave, SUM(cuenta) AS total FROM contadores
+                    WHERE nombre = ? AND dia > ?
+                    GROUP BY clave ORDER BY total DESC, clave
+                """, (nombre, desde)).fetchall()
+            except sqlite3.Error as e:
+                self.errores += 1
+                logger.error(f"Error leyendo el contador '{nombre}': {e}")
+                return []
+
+    def limpiar(self):
+        with self._lock:
+            try:
+                self._conexion().execute("DELETE FROM contadores")
+                self._conexion().execute("DELETE FROM respuestas")
+            except sqlite3.Error as e:
+                logger.error(f"Error limpiando la caché compartida: {e}")
+
+    def estadisticas(self):
+        with self._lock:
+            try:
+                entradas, bytes_totales = self._conexion().execute(
+                    "SELECT COUNT(*), COALESCE(SUM(tamano), 0) FROM respuestas").fetchone()
+            except sqlite3.Error:
+                entradas, bytes_totales = None, None
+            consultas = self.hits + self.misses
+            return {
+                'archivo': os.path.basename(self.ruta),
+                'pid': self._pid,
+                'entradas': entradas,
+                'bytes': bytes_totales,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / consultas, 4) if consultas else None,
+                'publicadas': self.publicadas,
+                'desalojos': self.desalojos,
+                'errores': self.errores,
+            }
+
+
+_CACHE = None
+_CACHE_LOCK = threading.Lock()
+
+def get_cache_compartido():
+    """Instancia única por proceso (la conexión se abre al primer uso)."""
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = CacheCompartido()
+        return _CACHE
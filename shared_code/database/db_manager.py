@@ -1,7 +1,13 @@
 import sqlite3
 import os
 import sys # <--- Agregar sys
-from datetime import datetime
+import time
+import json
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from urllib.parse import quote
 
 # --- LOGGING SETUP ---
 # Asegurar que encuentra el logger_config subiendo niveles si es necesario
@@ -56,6 +62,193 @@ def get_conn_precios():
 
 def get_conn_market():
     return get_db_connection(DB_MARKET_PATH)
+
+# --- POOL DE CONEXIONES (WEB) ---
+# Cada worker de gunicorn (proceso) mantiene su propio pool por base de datos.
+# Los hilos toman prestada una conexión durante la petición y la devuelven al terminar,
+# evitando pagar en cada request el connect, el parseo del esquema y los PRAGMAs.
+
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 10))
+
+# Perfil de PRAGMAs aplicado UNA sola vez al abrir cada conexión del pool
+PRAGMAS_POOL = (
+    ("journal_mode", "WAL"),
+    ("synchronous", "NORMAL"),   # Seguro con WAL y evita un fsync por transacción
+    ("temp_store", "MEMORY"),
+    ("cache_size", -16000),      # ~16MB de caché de páginas (valor negativo = KiB)
+    ("mmap_size", 67108864),     # 64MB mapeados: la DB de precios entra completa
+    ("busy_timeout", 5000),
+)
+
+
+class ConnectionPool:
+    """
+    Pool acotado de conexiones SQLite reutilizables.
+    - Verifica la salud de la conexión al prestarla (SELECT 1) y descarta las rotas.
+    - Es seguro ante fork(): si cambia el PID, se olvidan las conexiones heredadas del padre.
+    - Expone contadores de hits (reutilizada), misses (nueva) y waits (pool agotado).
+    """
+
+    def __init__(self, db_path, size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT):
+        self.db_path = db_path
+        self.size = size
+        self.timeout = timeout
+        self._reiniciar()
+
+    def _reiniciar(self):
+        self._pid = os.getpid()
+        self._cond = threading.Condition(threading.Lock())
+        self._libres = []
+        self._propias = set()  # id() de las conexiones creadas por este proceso
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.descartadas = 0
+
+    def _crear_conexion(self):
+        # check_same_thread=False: la conexión puede pasar de un hilo a otro,
+        # pero el pool garantiza que solo un hilo la use a la vez.
+        conn = sqlite3.connect(self.db_path, timeout=5, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        for pragma, valor in PRAGMAS_POOL:
+            conn.execute(f"PRAGMA {pragma}={valor};")
+        return conn
+
+    @staticmethod
+    def _conexion_sana(conn):
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _descartar(self, conn):
+        """Cierra una conexión y libera su lugar (llamar con el lock tomado)."""
+        self._propias.discard(id(conn))
+        self.descartadas += 1
+        self._cond.notify()
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def adquirir(self):
+        """Presta una conexión. Espera hasta `timeout` segundos si el pool está agotado."""
+        if os.getpid() != self._pid:
+            # Estamos en un worker recién forkeado: las conexiones del padre no se tocan
+            self._reiniciar()
+
+        with self._cond:
+            limite = time.monotonic() + self.timeout
+            espero = False
+            while True:
+                while self._libres:
+                    conn = self._libres.pop()
+                    if self._conexion_sana(conn):
+                        self.hits += 1
+                        return conn
+                    self._descartar(conn)
+
+                if len(self._propias) < self.size:
+                    conn = self._crear_conexion()
+                    self._propias.add(id(conn))
+                    self.misses += 1
+                    return conn
+
+                if not espero:
+                    self.waits += 1
+                    espero = True
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    raise sqlite3.OperationalError(
+                        f"Pool agotado para {os.path.basename(self.db_path)} ({self.size} conexiones)"
+                    )
+                self._cond.wait(restante)
+
+    def liberar(self, conn):
+        """Devuelve la conexión al pool, descartando cualquier transacción pendiente."""
+        if conn is None:
+            return
+        with self._cond:
+            if id(conn) not in self._propias:
+                # Conexión ajena (p.ej. heredada antes de un fork): no la reciclamos
+                return
+            try:
+                if conn.in_transaction:
+                    conn.rollback()
+            except sqlite3.Error:
+                self._descartar(conn)
+                return
+            self._libres.append(conn)
+            self._cond.notify()
+
+    @contextmanager
+    def conexion(self):
+        """Uso: `with pool.conexion() as conn:` para fuera del ciclo de petición de Flask."""
+        conn = self.adquirir()
+        try:
+            yield conn
+        finally:
+            self.liberar(conn)
+
+    def cerrar(self):
+        """Cierra las conexiones ociosas (útil en tests o al apagar el worker)."""
+        with self._cond:
+            while self._libres:
+                self._descartar(self._libres.pop())
+
+    def estadisticas(self):
+        with self._cond:
+            return {
+                'db': os.path.basename(self.db_path),
+                'pid': self._pid,
+                'tamano': self.size,
+                'abiertas': len(self._propias),
+                'libres': len(self._libres),
+                'hits': self.hits,
+                'misses': self.misses,
+                'waits': self.waits,
+                'descartadas': self.descartadas,
+            }
+
+
+_POOLS = {}
+_POOLS_LOCK = threading.Lock()
+
+def get_pool(db_path=DB_PRECIOS_PATH):
+    """Devuelve (creándolo si hace falta) el pool del proceso actual para `db_path`."""
+    with _POOLS_LOCK:
+        pool = _POOLS.get(db_path)
+        if pool is None:
+            # Con generaciones, la web lee Precios de la generación publicada y no del archivo del escritor
+            clase = PoolGeneraciones if PRECIOS_GENERACIONES and db_path == DB_PRECIOS_PATH else ConnectionPool
+            pool = _POOLS[db_path] = clase(db_path)
+        return pool
+
+def get_pool_stats():
+    """Contadores de todos los pools del worker actual."""
+    return [pool.estadisticas() for pool in list(_POOLS.values())]
+
+def adquirir_conn_precios():
+    try:
+        return get_pool(DB_PRECIOS_PATH).adquirir()
+    except sqlite3.Error as e:
+        logger.critical(f"Error obteniendo conexión del pool de Precios: {e}")
+        return None
+
+def adquirir_conn_market():
+    try:
+        return get_pool(DB_MARKET_PATH).adquirir()
+    except sqlite3.Error as e:
+        logger.critical(f"Error obteniendo conexión del pool de Marketplace: {e}")
+        return None
+
+def liberar_conn_precios(conn):
+    get_pool(DB_PRECIOS_PATH).liberar(conn)
+
+def liberar_conn_market(conn):
+    get_pool(DB_MARKET_PATH).liberar(conn)
     
 # --- CREACIÓN DE TABLAS (SEPARADA) ---
 
@@ -63,43 +256,410 @@ def crear_tablas_precios(conn):
     """Crea tablas de Faena e Invernada en la DB de Precios."""
     try:
         cursor = conn.cursor()
+        fechas_deduplicadas = set()
+        if _esquema_precios(cursor) == 2:
+            fechas_deduplicadas = _crear_tablas_v2(cursor)
+            _crear_vistas_v2(cursor)
+        else:
+            fechas_deduplicadas = _crear_tablas_v1(cursor)
+        _crear_tabla_rollup(cursor, 'faena')
+        _crear_tabla_rollup(cursor, 'invernada')
         cursor.execute("""
-        CREATE TABLE IF NOT EXISTS faena (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            fecha_extraccion TIMESTAMP NOT NULL,
-            fecha_consulta TEXT NOT NULL,
-            tipo_hacienda TEXT,
-            categoria_original TEXT NOT NULL,
-            raza TEXT,
-            rango_peso TEXT,
-            precio_max_kg REAL,
-            precio_min_kg REAL,
-            precio_promedio_kg REAL,
-            cabezas INTEGER,
-            kilos_total INTEGER,
-            importe_total REAL,
-            UNIQUE(fecha_consulta, categoria_original, raza, rango_peso)
+        CREATE TABLE IF NOT EXISTS metadatos (
+            clave TEXT PRIMARY KEY,
+            valor TEXT
         );
         """)
+        cursor.execute("INSERT OR IGNORE INTO metadatos (clave, valor) VALUES ('version_datos', 1)")
+        cursor.execute("INSERT OR IGNORE INTO metadatos (clave, valor) VALUES ('version_actualizada', ?)",
+                       (datetime.now().isoformat(timespec='seconds'),))
+        _crear_seguimiento_cambios(cursor)
+        if fechas_deduplicadas:
+            # Se borraron filas repetidas: los derivados de esas fechas cambian
+            _recalcular_variacion_faena(cursor, desde=min(fechas_deduplicadas))
+            _actualizar_rollups(cursor, 'faena', fechas_deduplicadas)
+            _actualizar_catalogo(cursor)
+            _incrementar_version_datos(cursor)
+        cursor.execute("SELECT 1 FROM metadatos WHERE clave = 'catalogo_series'")
+        if cursor.fetchone() is None:
+            _actualizar_catalogo(cursor)
+        conn.commit()
+        # Primer arranque (o base restaurada): la web necesita el sello para responder 304
+        if _es_base_precios(conn) and not os.path.exists(ARCHIVO_VERSION_PRECIOS):
+            _publicar_version_datos(conn)
+    except sqlite3.Error as e:
+        logger.error(f"Error creando tablas de precios: {e}")
+
+def _crear_tablas_v1(cursor):
+    """
+    Esquema v1: faena / invernada como tablas con las claves de serie y las fechas en TEXT.
+    Devuelve las fechas de Faena de las que se eliminaron filas repetidas (ver idx_faena_clave).
+    """
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS faena (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        fecha_extraccion TIMESTAMP NOT NULL,
+        fecha_consulta TEXT NOT NULL,
+        tipo_hacienda TEXT,
+        categoria_original TEXT NOT NULL,
+        raza TEXT,
+        rango_peso TEXT,
+        precio_max_kg REAL,
+        precio_min_kg REAL,
+        precio_promedio_kg REAL,
+        cabezas INTEGER,
+        kilos_total INTEGER,
+        importe_total REAL,
+        variacion_semanal_precio REAL,
+        fecha_referencia_variacion TEXT,
+        version_cambio INTEGER NOT NULL DEFAULT 0,
+        UNIQUE(fecha_consulta, categoria_original, raza, rango_peso)
+    );
+    """)
+    # Bases creadas antes de materializar la variación semanal
+    _asegurar_columnas(cursor, 'faena', {
+        'variacion_semanal_precio': 'REAL',
+        'fecha_referencia_variacion': 'TEXT',
+        'version_cambio': 'INTEGER NOT NULL DEFAULT 0',
+    })
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS invernada (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        fecha_extraccion TIMESTAMP NOT NULL,
+        fecha_consulta_inicio TEXT,
+        fecha_consulta_fin TEXT,
+        tipo_hacienda TEXT,
+        categoria_original TEXT NOT NULL,
+        precio_promedio_kg REAL,
+        cabezas INTEGER,
+        variacion_semanal_precio REAL,
+        version_cambio INTEGER NOT NULL DEFAULT 0,
+        UNIQUE(fecha_consulta_fin, categoria_original)
+    );
+    """)
+    _asegurar_columnas(cursor, 'invernada', {'version_cambio': 'INTEGER NOT NULL DEFAULT 0'})
+    fechas_deduplicadas = _crear_clave_faena(cursor)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_faena_fecha ON faena (fecha_consulta)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_invernada_fecha ON invernada (fecha_consulta_fin)")
+
+    # Índices compuestos "cubrientes" diseñados sobre las consultas del Dashboard:
+    # - /api/faena: filtra por serie (categoria, raza, rango_peso) y ordena por fecha.
+    # - /api/subcategorias: DISTINCT raza / rango_peso WHERE categoria_original = ?
+    # - /api/categorias: DISTINCT categoria_original (recorre solo el índice, no la tabla)
+    # - Búsqueda "as-of" del precio de referencia para la variación semanal.
+    # Las columnas finales evitan volver a la tabla para leer precio, cabezas y variación.
+    cursor.execute("DROP INDEX IF EXISTS idx_faena_serie_fecha")
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS idx_faena_serie_cubriente ON faena (
+        categoria_original, raza, rango_peso, fecha_consulta,
+        precio_promedio_kg, cabezas, variacion_semanal_precio
+    )
+    """)
+    cursor.execute("""
+    CREATE INDEX IF NOT EXISTS idx_invernada_categoria_cubriente ON invernada (
+        categoria_original, fecha_consulta_fin,
+        fecha_consulta_inicio, precio_promedio_kg, variacion_semanal_precio, cabezas
+    )
+    """)
+    return fechas_deduplicadas
+
+# Clave de upsert de Faena. En el UNIQUE de la tabla los NULL son distintos entre sí, y CAC
+# envía raza / rango_peso en NULL: sus filas nunca entraban en conflicto y se duplicaban en
+# cada corrida. Como en los rollups, NULL y '' cuentan como el mismo valor.
+CLAVE_FAENA = "fecha_consulta, categoria_original, COALESCE(raza, ''), COALESCE(rango_peso, '')"
+
+def _crear_clave_faena(cursor):
+    """Crea idx_faena_clave; en bases previas antes borra las filas repetidas (queda la última cargada)."""
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_faena_clave'")
+    if cursor.fetchone():
+        return set()
+    repetidas = f"id NOT IN (SELECT MAX(id) FROM faena GROUP BY {CLAVE_FAENA})"
+    cursor.execute(f"SELECT DISTINCT fecha_consulta FROM faena WHERE {repetidas}")
+    fechas = {fila[0] for fila in cursor.fetchall()}
+    if fechas:
+        cursor.execute(f"DELETE FROM faena WHERE {repetidas}")
+        logger.info(f"Faena: {cursor.rowcount} filas repetidas eliminadas antes de crear idx_faena_clave.")
+    cursor.execute(f"CREATE UNIQUE INDEX idx_faena_clave ON faena ({CLAVE_FAENA})")
+    return fechas
+
+def _asegurar_columnas(cursor, tabla, columnas):
+    """Agrega (ALTER TABLE) las columnas que falten en una tabla ya existente."""
+    cursor.execute(f"PRAGMA table_info({tabla})")
+    existentes = {row[1] for row in cursor.fetchall()}
+    for nombre, tipo in columnas.items():
+        if nombre not in existentes:
+            cursor.execute(f"ALTER TABLE {tabla} ADD COLUMN {nombre} {tipo}")
+            logger.info(f"Columna '{nombre}' agregada a la tabla '{tabla}'.")
+
+
+# --- ESQUEMA V2 (COMPACTO) ---
+# Las claves de serie y el tipo de hacienda van a tablas de dimensión chicas; los datos
+# guardan un serie_id entero y las fechas como número de día (días desde 1970-01-01), en
+# tablas WITHOUT ROWID agrupadas físicamente por (serie_id, día): el rango de una serie
+# son páginas contiguas. `faena` e `invernada` pasan a ser vistas con las columnas de v1,
+# así que todas las lecturas siguen funcionando sin cambios. Los índices sobre la
+# expresión de fecha de las vistas (EXPRESION_FECHA_V2) hacen usables los filtros por
+# fecha ISO. Se migra con migrar_esquema_v2 (mantenimiento_precios.py migrar-v2).
+
+# Día entero -> fecha ISO. Las vistas y los índices usan exactamente esta expresión
+EXPRESION_FECHA_V2 = "date({col} * 86400, 'unixepoch')"
+# Fecha ISO (TEXT) -> día entero, para migrar los datos de v1
+EXPRESION_DIA_V1 = "CAST(julianday({col}) - 2440587.5 AS INTEGER)"
+_DIA_EPOCA = datetime(1970, 1, 1).toordinal()
+
+def _esquema_precios(cursor):
+    """2 si faena es la vista de compatibilidad del esquema v2; 1 si es la tabla original."""
+    cursor.execute("SELECT type FROM sqlite_master WHERE name = 'faena'")
+    fila = cursor.fetchone()
+    return 2 if fila and fila[0] == 'view' else 1
+
+def _crear_tablas_v2(cursor):
+    """
+    Dimensiones y tablas de datos del esquema v2 (sin las vistas).
+    Devuelve las fechas de Faena afectadas al unificar series repetidas (ver _crear_clave_serie_faena).
+    """
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS dim_serie_faena (
+        serie_id INTEGER PRIMARY KEY,
+        categoria_original TEXT NOT NULL,
+        raza TEXT,
+        rango_peso TEXT,
+        UNIQUE(categoria_original, raza, rango_peso)
+    );
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS dim_serie_invernada (
+        serie_id INTEGER PRIMARY KEY,
+        categoria_original TEXT NOT NULL UNIQUE
+    );
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS dim_tipo_hacienda (
+        tipo_id INTEGER PRIMARY KEY,
+        tipo_hacienda TEXT NOT NULL UNIQUE
+    );
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS faena_v2 (
+        serie_id INTEGER NOT NULL REFERENCES dim_serie_faena (serie_id),
+        dia INTEGER NOT NULL,
+        extraccion INTEGER NOT NULL,
+        tipo_id INTEGER REFERENCES dim_tipo_hacienda (tipo_id),
+        precio_max_kg REAL,
+        precio_min_kg REAL,
+        precio_promedio_kg REAL,
+        cabezas INTEGER,
+        kilos_total INTEGER,
+        importe_total REAL,
+        variacion_semanal_precio REAL,
+        dia_referencia_variacion INTEGER,
+        version_cambio INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (serie_id, dia)
+    ) WITHOUT ROWID;
+    """)
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS invernada_v2 (
+        serie_id INTEGER NOT NULL REFERENCES dim_serie_invernada (serie_id),
+        dia_fin INTEGER NOT NULL,
+        dia_inicio INTEGER,
+        extraccion INTEGER NOT NULL,
+        tipo_id INTEGER REFERENCES dim_tipo_hacienda (tipo_id),
+        precio_promedio_kg REAL,
+        cabezas INTEGER,
+        variacion_semanal_precio REAL,
+        version_cambio INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (serie_id, dia_fin)
+    ) WITHOUT ROWID;
+    """)
+    # Rango de una serie acotado por fecha, y rango de fechas de todas las series (rollups, "todas")
+    for tabla, columna in (('faena_v2', 'dia'), ('invernada_v2', 'dia_fin')):
+        fecha = EXPRESION_FECHA_V2.format(col=columna)
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{tabla}_serie_fecha ON {tabla} (serie_id, {fecha})")
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{tabla}_fecha ON {tabla} ({fecha})")
+    return _crear_clave_serie_faena(cursor)
+
+# Clave de serie de Faena en v2: la misma equivalencia NULL = '' que CLAVE_FAENA en v1
+CLAVE_SERIE_FAENA = "categoria_original, COALESCE(raza, ''), COALESCE(rango_peso, '')"
+
+def _crear_clave_serie_faena(cursor):
+    """
+    Crea idx_dim_serie_faena_clave. En bases v2 previas antes unifica las series que solo
+    difieren en NULL / '': sus filas pasan a la de menor serie_id y, a igual día, queda la
+    extraída más tarde. Devuelve las fechas ISO afectadas.
+    """
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_dim_serie_faena_clave'")
+    if cursor.fetchone():
+        return set()
+    cursor.execute(f"""
+        SELECT serie_id, MIN(serie_id) OVER (PARTITION BY {CLAVE_SERIE_FAENA}) FROM dim_serie_faena
+    """)
+    repetidas = [(serie_id, canonica) for serie_id, canonica in cursor.fetchall() if serie_id != canonica]
+    fechas = set()
+    for serie_id, canonica in repetidas:
+        cursor.execute(f"SELECT {EXPRESION_FECHA_V2.format(col='dia')} FROM faena_v2 WHERE serie_id = ?", (serie_id,))
+        fechas.update(fila[0] for fila in cursor.fetchall())
+        cursor.execute("""
+            DELETE FROM faena_v2 WHERE serie_id = ? AND EXISTS (
+                SELECT 1 FROM faena_v2 c
+                WHERE c.serie_id = ? AND c.dia = faena_v2.dia AND c.extraccion >= faena_v2.extraccion
+            )
+        """, (serie_id, canonica))
+        # Cambia la serie de la fila: cuenta como cambio para get_faena_cambios
+        cursor.execute("""
+            UPDATE OR REPLACE faena_v2 SET serie_id = ?,
+                version_cambio = (SELECT CAST(valor AS INTEGER) + 1 FROM metadatos WHERE clave = 'version_datos')
+            WHERE serie_id = ?
+        """, (canonica, serie_id))
+        cursor.execute("DELETE FROM dim_serie_faena WHERE serie_id = ?", (serie_id,))
+    if repetidas:
+        logger.info(f"Faena v2: {len(repetidas)} series repetidas (NULL / '') unificadas.")
+    cursor.execute(f"CREATE UNIQUE INDEX idx_dim_serie_faena_clave ON dim_serie_faena ({CLAVE_SERIE_FAENA})")
+    return fechas
+
+def _crear_vistas_v2(cursor):
+    """Vistas `faena` / `invernada` con las columnas (y el formato) del esquema v1."""
+    extraccion = "strftime('%Y-%m-%dT%H:%M:%S', {col}, 'unixepoch', 'localtime')"
+    cursor.execute(f"""
+    CREATE VIEW IF NOT EXISTS faena AS
+    SELECT
+        {extraccion.format(col='f.extraccion')} AS fecha_extraccion,
+        {EXPRESION_FECHA_V2.format(col='f.dia')} AS fecha_consulta,
+        t.tipo_hacienda, s.categoria_original, s.raza, s.rango_peso,
+        f.precio_max_kg, f.precio_min_kg, f.precio_promedio_kg, f.cabezas, f.kilos_total, f.importe_total,
+        f.variacion_semanal_precio,
+        {EXPRESION_FECHA_V2.format(col='f.dia_referencia_variacion')} AS fecha_referencia_variacion,
+        f.version_cambio
+    FROM faena_v2 f
+    JOIN dim_serie_faena s ON s.serie_id = f.serie_id
+    LEFT JOIN dim_tipo_hacienda t ON t.tipo_id = f.tipo_id;
+    """)
+    cursor.execute(f"""
+    CREATE VIEW IF NOT EXISTS invernada AS
+    SELECT
+        {extraccion.format(col='i.extraccion')} AS fecha_extraccion,
+        {EXPRESION_FECHA_V2.format(col='i.dia_inicio')} AS fecha_consulta_inicio,
+        {EXPRESION_FECHA_V2.format(col='i.dia_fin')} AS fecha_consulta_fin,
+        t.tipo_hacienda, s.categoria_original,
+        i.precio_promedio_kg, i.cabezas, i.variacion_semanal_precio, i.version_cambio
+    FROM invernada_v2 i
+    JOIN dim_serie_invernada s ON s.serie_id = i.serie_id
+    LEFT JOIN dim_tipo_hacienda t ON t.tipo_id = i.tipo_id;
+    """)
+    # Los backfill borran por la vista (DELETE FROM faena / invernada)
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_faena_vista_delete INSTEAD OF DELETE ON faena
+    BEGIN
+        DELETE FROM faena_v2
+        WHERE dia = {EXPRESION_DIA_V1.format(col='OLD.fecha_consulta')}
+          AND serie_id = (SELECT serie_id FROM dim_serie_faena
+                          WHERE categoria_original = OLD.categoria_original
+                            AND COALESCE(raza, '') = COALESCE(OLD.raza, '')
+                            AND COALESCE(rango_peso, '') = COALESCE(OLD.rango_peso, ''));
+    END;
+    """)
+    cursor.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS trg_invernada_vista_delete INSTEAD OF DELETE ON invernada
+    BEGIN
+        DELETE FROM invernada_v2
+        WHERE dia_fin = {EXPRESION_DIA_V1.format(col='OLD.fecha_consulta_fin')}
+          AND serie_id = (SELECT serie_id FROM dim_serie_invernada
+                          WHERE categoria_original = OLD.categoria_original);
+    END;
+    """)
+
+def migrar_esquema_v2(conn):
+    """
+    Convierte la base de Precios al esquema v2 en una sola transacción y la compacta (VACUUM).
+    Las filas que v2 no puede guardar (fecha inválida o vacía) se descartan. Una serie de Faena
+    cargada con raza / rango_peso en NULL y en '' queda como una sola (misma clave que en v1).
+    Devuelve {'faena': filas, 'invernada': filas, 'descartadas': n}; {} si ya era v2; None si falla.
+    """
+    cursor = conn.cursor()
+    try:
+        if _esquema_precios(cursor) == 2:
+            return {}
+        _iniciar_lote(conn)
+        cursor.execute("SELECT (SELECT COUNT(*) FROM faena) + (SELECT COUNT(*) FROM invernada)")
+        filas_v1 = cursor.fetchone()[0]
+        _crear_tablas_v2(cursor)
+
+        cursor.execute("""
+            INSERT INTO dim_tipo_hacienda (tipo_hacienda)
+            SELECT tipo_hacienda FROM faena WHERE tipo_hacienda IS NOT NULL
+            UNION SELECT tipo_hacienda FROM invernada WHERE tipo_hacienda IS NOT NULL
+        """)
         cursor.execute("""
-        CREATE TABLE IF NOT EXISTS invernada (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            fecha_extraccion TIMESTAMP NOT NULL,
-            fecha_consulta_inicio TEXT,
-            fecha_consulta_fin TEXT,
-            tipo_hacienda TEXT,
-            categoria_original TEXT NOT NULL,
-            precio_promedio_kg REAL,
-            cabezas INTEGER,
-            variacion_semanal_precio REAL,
-            UNIQUE(fecha_consulta_fin, categoria_original)
-        );
+            INSERT INTO dim_serie_faena (categoria_original, raza, rango_peso)
+            SELECT categoria_original, MAX(raza), MAX(rango_peso) FROM faena
+            GROUP BY categoria_original, COALESCE(raza, ''), COALESCE(rango_peso, '')
+            ORDER BY 1, 2, 3
         """)
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_faena_fecha ON faena (fecha_consulta)")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_invernada_fecha ON invernada (fecha_consulta_fin)")
+        cursor.execute("""
+            INSERT INTO dim_serie_invernada (categoria_original)
+            SELECT DISTINCT categoria_original FROM invernada ORDER BY 1
+        """)
+        # La fecha de extracción de v1 es hora local: 'utc' la pasa a epoch
+        extraccion = "COALESCE(CAST(strftime('%s', {col}, 'utc') AS INTEGER), 0)"
+        dia_faena = EXPRESION_DIA_V1.format(col='f.fecha_consulta')
+        cursor.execute(f"""
+            INSERT OR REPLACE INTO faena_v2 (
+                serie_id, dia, extraccion, tipo_id, precio_max_kg, precio_min_kg, precio_promedio_kg,
+                cabezas, kilos_total, importe_total, variacion_semanal_precio, dia_referencia_variacion, version_cambio
+            )
+            SELECT s.serie_id, {dia_faena}, {extraccion.format(col='f.fecha_extraccion')}, t.tipo_id,
+                   f.precio_max_kg, f.precio_min_kg, f.precio_promedio_kg, f.cabezas, f.kilos_total, f.importe_total,
+                   f.variacion_semanal_precio, {EXPRESION_DIA_V1.format(col='f.fecha_referencia_variacion')},
+                   f.version_cambio
+            FROM faena f
+            JOIN dim_serie_faena s ON s.categoria_original = f.categoria_original
+                                  AND COALESCE(s.raza, '') = COALESCE(f.raza, '')
+                                  AND COALESCE(s.rango_peso, '') = COALESCE(f.rango_peso, '')
+            LEFT JOIN dim_tipo_hacienda t ON t.tipo_hacienda = f.tipo_hacienda
+            WHERE {dia_faena} IS NOT NULL
+            ORDER BY f.id
+        """)
+        dia_fin = EXPRESION_DIA_V1.format(col='i.fecha_consulta_fin')
+        cursor.execute(f"""
+            INSERT OR REPLACE INTO invernada_v2 (
+                serie_id, dia_fin, dia_inicio, extraccion, tipo_id, precio_promedio_kg, cabezas,
+                variacion_semanal_precio, version_cambio
+            )
+            SELECT s.serie_id, {dia_fin}, {EXPRESION_DIA_V1.format(col='i.fecha_consulta_inicio')},
+                   {extraccion.format(col='i.fecha_extraccion')}, t.tipo_id,
+                   i.precio_promedio_kg, i.cabezas, i.variacion_semanal_precio, i.version_cambio
+            FROM invernada i
+            JOIN dim_serie_invernada s ON s.categoria_original = i.categoria_original
+            LEFT JOIN dim_tipo_hacienda t ON t.tipo_hacienda = i.tipo_hacienda
+            WHERE {dia_fin} IS NOT NULL
+            ORDER BY i.id
+        """)
+
+        # Las tablas v1 se reemplazan por las vistas (sus índices y triggers se van con ellas)
+        cursor.execute("DROP TABLE faena")
+        cursor.execute("DROP TABLE invernada")
+        _crear_vistas_v2(cursor)
+        _crear_seguimiento_cambios(cursor)
+        resultado = {}
+        for tabla in ('faena', 'invernada'):
+            cursor.execute(f"SELECT COUNT(*) FROM {tabla}_v2")
+            resultado[tabla] = cursor.fetchone()[0]
+        resultado['descartadas'] = filas_v1 - resultado['faena'] - resultado['invernada']
+        # El contenido visible no cambia, pero los derivados (generaciones, motor) se rehacen
+        _incrementar_version_datos(cursor)
         conn.commit()
     except sqlite3.Error as e:
-        logger.error(f"Error creando tablas de precios: {e}")
+        logger.error(f"Error migrando la base de Precios al esquema v2: {e}")
+        conn.rollback()
+        return None
+
+    _publicar_version_datos(conn)
+    try:
+        conn.execute("VACUUM")
+        conn.execute("ANALYZE")
+    except sqlite3.Error as e:
+        logger.error(f"Migración a v2 aplicada, pero falló la compactación: {e}")
+    logger.info(f"Base de Precios migrada al esquema v2: {resultado}")
+    return resultado
 
 def crear_tablas_market(conn):
     """Crea tablas de Usuarios y Publicaciones en la DB de Marketplace."""
@@ -167,6 +727,9 @@ def inicializar_bases_datos():
     conn_precios = get_conn_precios()
     if conn_precios:
         crear_tablas_precios(conn_precios)
+        if PRECIOS_GENERACIONES:
+            # Primer arranque o cambios de scripts one-shot: la web lee la generación publicada
+            publicar_generacion(conn_precios)
         conn_precios.close()
         
     # 2. Marketplace
@@ -176,14 +739,752 @@ def inicializar_bases_datos():
         conn_market.close()
 
 
+# --- VERSIÓN DE DATOS (PRECIOS) ---
+# Cada escritura sobre faena/invernada incrementa `version_datos` en la tabla metadatos,
+# dentro de la misma transacción. Tras el commit se publica un archivo sello junto a la
+# base: los workers web lo leen (un stat) para responder 304 sin abrir SQLite.
+
+ARCHIVO_VERSION_PRECIOS = DB_PRECIOS_PATH + '.version'
+
+def _incrementar_version_datos(cursor):
+    """Incrementa la versión de los datos de precios (no hace commit)."""
+    cursor.execute("""
+        INSERT INTO metadatos (clave, valor) VALUES ('version_datos', 1)
+        ON CONFLICT(clave) DO UPDATE SET valor = CAST(valor AS INTEGER) + 1
+    """)
+    ahora = datetime.now().isoformat(timespec='seconds')
+    cursor.execute("""
+        INSERT INTO metadatos (clave, valor) VALUES ('version_actualizada', ?)
+        ON CONFLICT(clave) DO UPDATE SET valor = excluded.valor
+    """, (ahora,))
+    # Historial para traducir un cursor de fecha (?since=YYYY-MM-DD) a versión
+    cursor.execute("""
+        INSERT OR REPLACE INTO historial_versiones (version, actualizada)
+        SELECT CAST(valor AS INTEGER), ? FROM metadatos WHERE clave = 'version_datos'
+    """, (ahora,))
+
+def _crear_seguimiento_cambios(cursor):
+    """
+    Cada fila de faena/invernada guarda en `version_cambio` la versión de datos en la que se
+    insertó o cambió por última vez (ver get_faena_cambios). Lo mantienen triggers: todas las
+    escrituras modifican las filas antes de _incrementar_version_datos en la misma transacción,
+    así que la versión que están escribiendo es la vigente + 1. El UPDATE del trigger solo toca
+    `version_cambio`, que no está en la lista OF: no se dispara a sí mismo.
+    """
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS historial_versiones (
+        version INTEGER PRIMARY KEY,
+        actualizada TEXT NOT NULL
+    );
+    """)
+    version_en_curso = "(SELECT CAST(valor AS INTEGER) + 1 FROM metadatos WHERE clave = 'version_datos')"
+    valores_faena = ('precio_max_kg', 'precio_min_kg', 'precio_promedio_kg', 'cabezas', 'kilos_total',
+                     'importe_total', 'variacion_semanal_precio')
+    if _esquema_precios(cursor) == 2:
+        # tabla física -> (clave de la fila, columnas de valor)
+        seguimiento = {
+            'faena_v2': ("serie_id = NEW.serie_id AND dia = NEW.dia", valores_faena),
+            'invernada_v2': ("serie_id = NEW.serie_id AND dia_fin = NEW.dia_fin",
+                             ('dia_inicio', 'precio_promedio_kg', 'cabezas', 'variacion_semanal_precio')),
+        }
+    else:
+        seguimiento = {
+            'faena': ("id = NEW.id", valores_faena),
+            'invernada': ("id = NEW.id", ('fecha_consulta_inicio', 'precio_promedio_kg', 'cabezas',
+                                          'variacion_semanal_precio')),
+        }
+    for tabla, (clave, columnas) in seguimiento.items():
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{tabla}_version_cambio ON {tabla} (version_cambio)")
+        cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{tabla}_cambio_insert AFTER INSERT ON {tabla}
+        BEGIN
+            UPDATE {tabla} SET version_cambio = {version_en_curso} WHERE {clave};
+        END;
+        """)
+        distintos = ' OR '.join(f"OLD.{c} IS NOT NEW.{c}" for c in columnas)
+        cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_{tabla}_cambio_update AFTER UPDATE OF {', '.join(columnas)} ON {tabla}
+        WHEN {distintos}
+        BEGIN
+            UPDATE {tabla} SET version_cambio = {version_en_curso} WHERE {clave};
+        END;
+        """)
+
+def _es_base_precios(conn):
+    """True si la conexión apunta al archivo canónico de precios (no a una base en memoria o de pruebas)."""
+    for fila in conn.execute("PRAGMA database_list"):
+        if fila[1] == 'main':
+            return bool(fila[2]) and os.path.abspath(fila[2]) == os.path.abspath(DB_PRECIOS_PATH)
+    return False
+
+def get_version_datos_db(conn):
+    """(version, datetime de actualización) leídos de la tabla metadatos."""
+    cursor = conn.cursor()
+    cursor.execute("SELECT clave, valor FROM metadatos WHERE clave IN ('version_datos', 'version_actualizada')")
+    valores = {r[0]: r[1] for r in cursor.fetchall()}
+    return int(valores.get('version_datos', 0)), datetime.fromisoformat(valores['version_actualizada'])
+
+def _publicar_version_datos(conn, generacion=False):
+    """
+    Escribe (de forma atómica) el archivo sello con la versión vigente de la base canónica.
+    Con generaciones, el sello describe lo que lee la web: solo lo escribe publicar_generacion.
+    """
+    if not _es_base_precios(conn) or (PRECIOS_GENERACIONES and not generacion):
+        return
+    try:
+        version, actualizada = get_version_datos_db(conn)
+        temporal = f"{ARCHIVO_VERSION_PRECIOS}.{os.getpid()}.tmp"
+        with open(temporal, 'w') as f:
+            f.write(f"{version} {actualizada.isoformat()}")
+        os.replace(temporal, ARCHIVO_VERSION_PRECIOS)
+    except (OSError, sqlite3.Error, KeyError, ValueError) as e:
+        logger.error(f"No se pudo publicar la versión de datos de precios: {e}")
+
+_version_leida = {'clave': None, 'valor': None}
+
+def get_version_datos(archivo=None):
+    """
+    (version, datetime de actualización) según el archivo sello, sin abrir SQLite.
+    Relee el archivo solo si cambió su mtime. Devuelve None si todavía no existe.
+    """
+    archivo = archivo or ARCHIVO_VERSION_PRECIOS
+    try:
+        estado = os.stat(archivo)
+        clave = (archivo, estado.st_mtime_ns, estado.st_size)
+        if _version_leida['clave'] != clave:
+            with open(archivo) as f:
+                version, actualizada = f.read().split()
+            _version_leida['valor'] = (int(version), datetime.fromisoformat(actualizada))
+            _version_leida['clave'] = clave
+        return _version_leida['valor']
+    except (OSError, ValueError):
+        return None
+
+
+# --- GENERACIONES DE LA BASE DE PRECIOS (PRECIOS_GENERACIONES=1) ---
+# El pipeline sigue escribiendo en precios_historicos.db (la base del escritor), pero la web
+# no la lee: al terminar la ingesta, publicar_generacion() copia la base compactada
+# (VACUUM INTO) a un archivo nuevo de GENERACIONES_DIR, le corre ANALYZE y la publica
+# reemplazando de forma atómica el puntero ARCHIVO_GENERACION_ACTUAL. Una generación
+# publicada no se modifica nunca: los workers la abren en solo lectura e `immutable`
+# (sin locks, sin WAL, sin checkpoints) y pasan a la siguiente entre peticiones.
+
+PRECIOS_GENERACIONES = os.environ.get('PRECIOS_GENERACIONES', '0') == '1'
+GENERACIONES_DIR = os.environ.get('PRECIOS_GENERACIONES_DIR', os.path.join(DATABASES_DIR, 'generaciones_precios'))
+ARCHIVO_GENERACION_ACTUAL = 'actual'
+# Generaciones que se conservan en disco (la vigente y las anteriores, que pueden tener lectores)
+GENERACIONES_CONSERVADAS = int(os.environ.get('PRECIOS_GENERACIONES_CONSERVADAS', 3))
+
+# PRAGMAs de las conexiones de solo lectura (journal_mode/synchronous no aplican)
+PRAGMAS_LECTURA = (
+    ("query_only", 1),
+    ("temp_store", "MEMORY"),
+    ("cache_size", -16000),
+    ("mmap_size", 67108864),
+)
+
+_generacion_leida = {'clave': None, 'valor': None}
+
+def get_generacion_actual(directorio=None):
+    """
+    Ruta de la generación publicada según el puntero (se relee solo si cambió su mtime).
+    None si todavía no se publicó ninguna.
+    """
+    directorio = directorio or GENERACIONES_DIR
+    puntero = os.path.join(directorio, ARCHIVO_GENERACION_ACTUAL)
+    try:
+        estado = os.stat(puntero)
+        clave = (puntero, estado.st_mtime_ns, estado.st_size)
+        if _generacion_leida['clave'] != clave:
+            with open(puntero) as f:
+                nombre = f.read().strip()
+            _generacion_leida['valor'] = os.path.join(directorio, nombre) if nombre else None
+            _generacion_leida['clave'] = clave
+        return _generacion_leida['valor']
+    except OSError:
+        return None
+
+def conectar_solo_lectura(ruta):
+    """Conexión `mode=ro&immutable=1` a una generación publicada (el archivo no cambia nunca)."""
+    conn = sqlite3.connect(f"file:{quote(os.path.abspath(ruta))}?mode=ro&immutable=1", uri=True,
+                           check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    for pragma, valor in PRAGMAS_LECTURA:
+        conn.execute(f"PRAGMA {pragma}={valor};")
+    return conn
+
+def _limpiar_generaciones(directorio, vigente):
+    """Borra las generaciones más viejas que las GENERACIONES_CONSERVADAS más recientes."""
+    nombres = sorted((n for n in os.listdir(directorio) if n.startswith('precios_v') and n.endswith('.db')),
+                     reverse=True)  # El nombre lleva la versión con ceros a la izquierda
+    borradas = 0
+    for nombre in nombres[GENERACIONES_CONSERVADAS:]:
+        if nombre != os.path.basename(vigente):
+            os.remove(os.path.join(directorio, nombre))
+            borradas += 1
+    return borradas
+
+def publicar_generacion(conn, directorio=None):
+    """
+    Publica como generación nueva el contenido actual de `conn` (la base del escritor):
+    VACUUM INTO a un archivo temporal, ANALYZE, renombre y reemplazo atómico del puntero.
+    Si la versión de datos ya está publicada no hace nada. Devuelve la ruta de la
+    generación vigente, o None si falla.
+    """
+    directorio = directorio or GENERACIONES_DIR
+    temporal = None
+    try:
+        os.makedirs(directorio, exist_ok=True)
+        version, _ = get_version_datos_db(conn)
+        ruta = os.path.join(directorio, f"precios_v{version:08d}.db")
+        if not os.path.exists(ruta):
+            temporal = f"{ruta}.{os.getpid()}.tmp"
+            if os.path.exists(temporal):
+                os.remove(temporal)
+            if conn.in_transaction:
+                conn.commit()  # VACUUM no corre dentro de una transacción
+            conn.execute("VACUUM INTO ?", (temporal,))
+            nueva = sqlite3.connect(temporal)
+            try:
+                # Archivo autocontenido: sin WAL, para poder abrirlo `immutable`
+                nueva.execute("PRAGMA journal_mode=DELETE;")
+                nueva.execute("ANALYZE;")
+                nueva.commit()
+            finally:
+                nueva.close()
+            os.replace(temporal, ruta)
+            temporal = None
+
+        if get_generacion_actual(directorio) != ruta:
+            puntero = os.path.join(directorio, ARCHIVO_GENERACION_ACTUAL)
+            with open(f"{puntero}.{os.getpid()}.tmp", 'w') as f:
+                f.write(os.path.basename(ruta))
+            os.replace(f"{puntero}.{os.getpid()}.tmp", puntero)
+            logger.info(f"Generación de precios publicada: {os.path.basename(ruta)} "
+                        f"({_limpiar_generaciones(directorio, ruta)} generaciones viejas borradas).")
+        # El sello va después del puntero: una versión nueva siempre encuentra su generación
+        _publicar_version_datos(conn, generacion=True)
+        return ruta
+    except (OSError, sqlite3.Error, KeyError, ValueError) as e:
+        logger.error(f"No se pudo publicar la generación de precios: {e}")
+        if temporal and os.path.exists(temporal):
+            os.remove(temporal)
+        return None
+
+
+class PoolGeneraciones(ConnectionPool):
+    """
+    Pool de solo lectura sobre la generación publicada de Precios.
+    - Cada préstamo revisa el puntero (un stat); si cambió, las conexiones ociosas de la
+      generación anterior se descartan y las prestadas se descartan al devolverse: cada
+      petición lee una sola generación de principio a fin.
+    - Sin generación publicada (primer arranque) lee el archivo del escritor como ConnectionPool.
+    """
+
+    def _reiniciar(self):
+        super()._reiniciar()
+        self._vigente = None
+        self._generacion = {}  # id(conn) -> ruta con la que se abrió
+        self.cambios_generacion = 0
+
+    def _crear_conexion(self):
+        if self._vigente == self.db_path:
+            conn = super()._crear_conexion()
+        else:
+            conn = conectar_solo_lectura(self._vigente)
+        self._generacion[id(conn)] = self._vigente
+        return conn
+
+    def _descartar(self, conn):
+        self._generacion.pop(id(conn), None)
+        super()._descartar(conn)
+
+    def adquirir(self):
+        if os.getpid() != self._pid:
+            self._reiniciar()
+        vigente = get_generacion_actual() or self.db_path
+        with self._cond:
+            if vigente != self._vigente:
+                if self._vigente is not None:
+                    self.cambios_generacion += 1
+                self._vigente = vigente
+                while self._libres:
+                    self._descartar(self._libres.pop())
+        return super().adquirir()
+
+    def liberar(self, conn):
+        with self._cond:
+            if conn is not None and id(conn) in self._propias and self._generacion.get(id(conn)) != self._vigente:
+                self._descartar(conn)
+                return
+        super().liberar(conn)
+
+    def estadisticas(self):
+        stats = super().estadisticas()
+        with self._cond:
+            stats['generacion'] = os.path.basename(self._vigente) if self._vigente else None
+            stats['cambios_generacion'] = self.cambios_generacion
+        return stats
+
+
+# --- CACHÉ DE LECTURAS DE PRECIOS (EN PROCESO) ---
+# Cada worker guarda los resultados de las lecturas más pedidas (LRU acotado por cantidad
+# y por memoria). Las entradas quedan atadas a la versión de datos del archivo sello: cuando
+# la ingesta escribe (en cualquier worker o en el cron), la versión cambia y todo se invalida.
+# Pasado el TTL, una entrada todavía se sirve durante la ventana stale-while-revalidate
+# mientras un hilo la recalcula en segundo plano.
+
+CACHE_LECTURAS_ENTRADAS = int(os.environ.get('CACHE_LECTURAS_ENTRADAS', 256))
+CACHE_LECTURAS_MB = float(os.environ.get('CACHE_LECTURAS_MB', 32))
+CACHE_LECTURAS_TTL = float(os.environ.get('CACHE_LECTURAS_TTL', 300))
+CACHE_LECTURAS_SWR = float(os.environ.get('CACHE_LECTURAS_SWR', 60))
+
+
+def _tamano_aproximado(valor):
+    """Bytes aproximados de un resultado (listas/dicts/tuplas de escalares)."""
+    if isinstance(valor, dict):
+        return sys.getsizeof(valor) + sum(_tamano_aproximado(k) + _tamano_aproximado(v) for k, v in valor.items())
+    if isinstance(valor, (list, tuple)):
+        return sys.getsizeof(valor) + sum(_tamano_aproximado(v) for v in valor)
+    return sys.getsizeof(valor)
+
+
+class CacheLecturas:
+    """
+    Caché LRU + TTL + stale-while-revalidate para resultados de lecturas de precios.
+    Los valores cacheados se comparten entre peticiones: quien los recibe no debe mutarlos.
+    """
+
+    def __init__(self, max_entradas=CACHE_LECTURAS_ENTRADAS, max_bytes=int(CACHE_LECTURAS_MB * 1024 * 1024),
+                 ttl=CACHE_LECTURAS_TTL, swr=CACHE_LECTURAS_SWR):
+        self.max_entradas = max_entradas
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.swr = swr
+        self._lock = threading.Lock()
+        self._reiniciar()
+
+    def _reiniciar(self):
+        self._pid = os.getpid()
+        self._entradas = OrderedDict()  # clave -> (valor, version, creado, tamano)
+        self._bytes = 0
+        self._version = None
+        self._refrescando = set()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.desalojos = 0
+        self.invalidaciones = 0
+
+    def _guardar(self, clave, valor, version):
+        """Inserta y desaloja por LRU hasta respetar los límites (llamar con el lock tomado)."""
+        if version != self._version:
+            return  # Los datos cambiaron mientras se calculaba: no guardar un resultado viejo
+        tamano = _tamano_aproximado(valor)
+        if tamano > self.max_bytes:
+            return
+        anterior = self._entradas.pop(clave, None)
+        if anterior:
+            self._bytes -= anterior[3]
+        self._entradas[clave] = (valor, version, time.monotonic(), tamano)
+        self._bytes += tamano
+        while len(self._entradas) > self.max_entradas or self._bytes > self.max_bytes:
+            _, (_, _, _, tamano_viejo) = self._entradas.popitem(last=False)
+            self._bytes -= tamano_viejo
+            self.desalojos += 1
+
+    def obtener(self, clave, calcular, calcular_en_segundo_plano=None):
+        """
+        Devuelve el valor de `clave`, usando `calcular()` si no está o está vencido.
+        `calcular_en_segundo_plano` (por defecto `calcular`) se usa para el refresco stale-while-revalidate.
+        """
+        if self.ttl <= 0:
+            return calcular()
+        version = get_version_datos()
+        if version is None:
+            # Sin sello no hay forma de enterarse de las escrituras de otros procesos
+            return calcular()
+        version = version[0]
+
+        with self._lock:
+            if os.getpid() != self._pid:
+                self._reiniciar()
+            if version != self._version:
+                if self._entradas:
+                    self.invalidaciones += 1
+                self._entradas.clear()
+                self._bytes = 0
+                self._version = version
+
+            entrada = self._entradas.get(clave)
+            if entrada:
+                valor, _, creado, _ = entrada
+                edad = time.monotonic() - creado
+                if edad < self.ttl:
+                    self._entradas.move_to_end(clave)
+                    self.hits += 1
+                    return valor
+                if edad < self.ttl + self.swr:
+                    self._entradas.move_to_end(clave)
+                    self.stale_hits += 1
+                    if clave not in self._refrescando:
+                        self._refrescando.add(clave)
+                        threading.Thread(target=self._refrescar, daemon=True,
+                                         args=(clave, calcular_en_segundo_plano or calcular, version)).start()
+                    return valor
+            self.misses += 1
+
+        valor = calcular()
+        with self._lock:
+            self._guardar(clave, valor, version)
+        return valor
+
+    def _refrescar(self, clave, calcular, version):
+        try:
+            valor = calcular()
+            with self._lock:
+                self._guardar(clave, valor, version)
+        except Exception as e:
+            logger.error(f"Error refrescando caché de lecturas: {e}")
+        finally:
+            with self._lock:
+                self._refrescando.discard(clave)
+
+    def limpiar(self):
+        with self._lock:
+            self._reiniciar()
+
+    def estadisticas(self):
+        with self._lock:
+            consultas = self.hits + self.stale_hits + self.misses
+            return {
+                'pid': self._pid,
+                'version_datos': self._version,
+                'entradas': len(self._entradas),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'hit_ratio': round((self.hits + self.stale_hits) / consultas, 4) if consultas else None,
+                'desalojos': self.desalojos,
+                'invalidaciones': self.invalidaciones,
+            }
+
+
+_CACHE_LECTURAS = CacheLecturas()
+
+
+# --- COALESCENCIA DE LECTURAS (SINGLE-FLIGHT) ---
+# Tras la ingesta de las 11:00 (y el mail del reporte) muchos clientes abren el Dashboard a la
+# vez con el mismo rango: todos son miss de la caché y ejecutarían la misma consulta en paralelo.
+# Dentro de un worker, la primera petición calcula y las idénticas que llegan mientras tanto
+# esperan ese mismo resultado. Si quien calcula falla, las que esperaban reciben el mismo error;
+# si tarda más de SINGLE_FLIGHT_ESPERA segundos, cada una sigue por su cuenta.
+
+SINGLE_FLIGHT_ESPERA = float(os.environ.get('SINGLE_FLIGHT_ESPERA', 30))
+
+
+class _Vuelo:
+    __slots__ = ('evento', 'valor', 'error', 'esperando')
+
+    def __init__(self):
+        self.evento = threading.Event()
+        self.valor = None
+        self.error = None
+        self.esperando = 0
+
+
+class LecturasEnVuelo:
+    """Un cálculo en curso por clave; los pedidos concurrentes de la misma clave comparten su resultado."""
+
+    def __init__(self, espera_max=SINGLE_FLIGHT_ESPERA):
+        self.espera_max = espera_max
+        self._lock = threading.Lock()
+        self._reiniciar()
+
+    def _reiniciar(self):
+        self._pid = os.getpid()
+        self._vuelos = {}
+        self.ejecutadas = 0
+        self.coalescidas = 0
+        self.max_esperando = 0
+        self.esperas_vencidas = 0
+        self.errores = 0
+
+    def ejecutar(self, clave, calcular):
+        with self._lock:
+            if os.getpid() != self._pid:
+                self._reiniciar()
+            vuelo = self._vuelos.get(clave)
+            lider = vuelo is None
+            if lider:
+                vuelo = self._vuelos[clave] = _Vuelo()
+                self.ejecutadas += 1
+            else:
+                vuelo.esperando += 1
+                self.coalescidas += 1
+                self.max_esperando = max(self.max_esperando, vuelo.esperando)
+
+        if not lider:
+            if vuelo.evento.wait(self.espera_max):
+                if vuelo.error is not None:
+                    raise vuelo.error
+                return vuelo.valor
+            with self._lock:
+                self.esperas_vencidas += 1
+            return calcular()
+
+        try:
+            vuelo.valor = calcular()
+            return vuelo.valor
+        except Exception as e:
+            vuelo.error = e
+            with self._lock:
+                self.errores += 1
+            raise
+        finally:
+            with self._lock:
+                self._vuelos.pop(clave, None)
+            vuelo.evento.set()
+
+    def limpiar(self):
+        with self._lock:
+            self._reiniciar()
+
+    def estadisticas(self):
+        with self._lock:
+            pedidos = self.ejecutadas + self.coalescidas
+            return {
+                'pid': self._pid,
+                'en_vuelo': len(self._vuelos),
+                'ejecutadas': self.ejecutadas,
+                'coalescidas': self.coalescidas,
+                'ratio_coalescidas': round(self.coalescidas / pedidos, 4) if pedidos else None,
+                'max_esperando': self.max_esperando,
+                'esperas_vencidas': self.esperas_vencidas,
+                'errores': self.errores,
+            }
+
+
+_LECTURAS_EN_VUELO = LecturasEnVuelo()
+
+def _normalizar(valor):
+    if isinstance(valor, str):
+        valor = valor.strip()
+        return valor or None
+    return valor
+
+def _clave_lectura(funcion, args, kwargs):
+    """Clave normalizada: '' y None son el mismo filtro; el orden de los kwargs no importa."""
+    nombre = getattr(funcion, '__qualname__', None) or repr(funcion)
+    return (
+        nombre,
+        tuple(_normalizar(a) for a in args),
+        tuple(sorted((k, _normalizar(v)) for k, v in kwargs.items())),
+    )
+
+def leer_precios_cacheado(funcion, *args, obtener_conn=None, **kwargs):
+    """
+    Ejecuta `funcion(conn, *args, **kwargs)` (una lectura de precios de este módulo) a través
+    de la caché del worker. En un miss se usa `obtener_conn()` (p.ej. la conexión de la
+    petición de Flask); el refresco en segundo plano siempre toma prestada una del pool.
+    Los miss idénticos concurrentes se resuelven con una sola consulta (single-flight).
+    """
+    clave = _clave_lectura(funcion, args, kwargs)
+
+    def calcular_con_pool():
+        with get_pool(DB_PRECIOS_PATH).conexion() as conn:
+            return funcion(conn, *args, **kwargs)
+
+    def calcular_directo():
+        if obtener_conn is None:
+            return calcular_con_pool()
+        return funcion(obtener_conn(), *args, **kwargs)
+
+    def calcular():
+        # La versión va en la clave: un pedido posterior a una ingesta no se suma a un cálculo anterior
+        version = get_version_datos()
+        return _LECTURAS_EN_VUELO.ejecutar((clave, version and version[0]), calcular_directo)
+
+    return _CACHE_LECTURAS.obtener(clave, calcular, calcular_con_pool)
+
+def get_cache_lecturas():
+    return _CACHE_LECTURAS
+
+def get_lecturas_en_vuelo():
+    return _LECTURAS_EN_VUELO
+
+def get_cache_stats():
+    """Contadores (hit ratio incluido) de la caché de lecturas del worker actual."""
+    return _CACHE_LECTURAS.estadisticas()
+
+
 # --- LÓGICA DE ESCRITURA (ENTRADA) ---
 # Convierte DD/MM/YYYY (del Scraper) -> YYYY-MM-DD (para la BD)
+# Las escrituras son upserts "diff-aware": una fila existente solo se reescribe si cambió
+# algún valor. La corrida de las 20:00 suele volver a traer lo mismo que la de las 11:00:
+# en ese caso no se escribe nada, no se toca la versión de datos y el WAL no crece.
+
+def _fechas_iso(valores):
+    """Traduce DD/MM/YYYY -> YYYY-MM-DD una vez por valor distinto. Los inválidos no figuran."""
+    traducidas = {}
+    for valor in set(valores):
+        try:
+            traducidas[valor] = datetime.strptime(valor, "%d/%m/%Y").strftime("%Y-%m-%d")
+        except (ValueError, TypeError):
+            pass
+    return traducidas
+
+def _ejecutar_upsert(cursor, tabla, sql, filas):
+    """Ejecuta el upsert del lote. Devuelve {'insertados', 'actualizados', 'sin_cambios'}."""
+    cursor.execute(f"SELECT COALESCE(MAX(id), 0) FROM {tabla}")
+    ultimo_id = cursor.fetchone()[0]
+    cursor.executemany(sql, filas)
+    escritas = cursor.rowcount  # Un DO UPDATE descartado por su WHERE no cuenta como cambio
+    # AUTOINCREMENT: las filas nuevas son las de id mayor al último previo
+    cursor.execute(f"SELECT COUNT(*) FROM {tabla} WHERE id > ?", (ultimo_id,))
+    insertados = cursor.fetchone()[0]
+    return {'insertados': insertados, 'actualizados': escritas - insertados, 'sin_cambios': len(filas) - escritas}
+
+def _fechas_escritas(cursor, tabla, columna_fecha):
+    """Fechas de las filas insertadas o cambiadas en la transacción en curso (ver _crear_seguimiento_cambios)."""
+    cursor.execute(f"""
+        SELECT DISTINCT {columna_fecha} FROM {tabla}
+        WHERE version_cambio = (SELECT CAST(valor AS INTEGER) + 1 FROM metadatos WHERE clave = 'version_datos')
+    """)
+    return {r[0] for r in cursor.fetchall()}
+
+_LOTE_VACIO = {'insertados': 0, 'actualizados': 0, 'sin_cambios': 0}
+
+def _resultado_lote(conteos, detalle):
+    """Filas escritas (insertadas + actualizadas) o, con `detalle`, los tres contadores."""
+    return dict(conteos) if detalle else conteos['insertados'] + conteos['actualizados']
+
+def _iniciar_lote(conn):
+    """Todo el lote en una transacción explícita, con el lock de escritura tomado desde el inicio."""
+    if not conn.in_transaction:
+        conn.execute("BEGIN IMMEDIATE")
+
+def _clave_dimension(clave):
+    """Clave de búsqueda en una dimensión v2: None y '' son el mismo valor (como CLAVE_FAENA)."""
+    return tuple('' if valor is None else valor for valor in clave)
+
+def _ids_dimension(cursor, tabla, columnas, claves):
+    """
+    {_clave_dimension(clave): id} de una tabla de dimensión v2, insertando las claves que falten
+    (con el primer valor recibido: None o '').
+    """
+    cursor.execute(f"SELECT {', '.join(columnas)}, rowid FROM {tabla}")
+    ids = {_clave_dimension(fila[:-1]): fila[-1] for fila in cursor.fetchall()}
+    for clave in claves:
+        if _clave_dimension(clave) not in ids:
+            cursor.execute(f"INSERT INTO {tabla} ({', '.join(columnas)}) VALUES ({', '.join('?' * len(columnas))})",
+                           clave)
+            ids[_clave_dimension(clave)] = cursor.lastrowid
+    return ids
+
+def _dias_v2(fechas_iso):
+    """Fecha ISO -> número de día (v2), una vez por valor distinto."""
+    return {f: datetime.strptime(f, "%Y-%m-%d").toordinal() - _DIA_EPOCA for f in set(fechas_iso) if f}
+
+def _upsert_v2(cursor, tabla, sql, filas):
+    """Como _ejecutar_upsert, para las tablas v2 (sin id: se cuentan las filas antes y después)."""
+    cursor.execute(f"SELECT COUNT(*) FROM {tabla}")
+    antes = cursor.fetchone()[0]
+    cursor.executemany(sql, filas)
+    escritas = cursor.rowcount
+    cursor.execute(f"SELECT COUNT(*) FROM {tabla}")
+    insertados = cursor.fetchone()[0] - antes
+    return {'insertados': insertados, 'actualizados': escritas - insertados, 'sin_cambios': len(filas) - escritas}
+
+SQL_UPSERT_FAENA_V2 = """
+    INSERT INTO faena_v2 (
+        serie_id, dia, extraccion, tipo_id, precio_max_kg, precio_min_kg, precio_promedio_kg,
+        cabezas, kilos_total, importe_total
+    ) VALUES (
+        :serie_id, :dia, :extraccion, :tipo_id, :precio_max_kg, :precio_min_kg, :precio_promedio_kg,
+        :cabezas, :kilos_total, :importe_total
+    )
+    ON CONFLICT(serie_id, dia) DO UPDATE SET
+        extraccion = excluded.extraccion,
+        tipo_id = excluded.tipo_id,
+        precio_max_kg = excluded.precio_max_kg,
+        precio_min_kg = excluded.precio_min_kg,
+        precio_promedio_kg = excluded.precio_promedio_kg,
+        cabezas = excluded.cabezas,
+        kilos_total = excluded.kilos_total,
+        importe_total = excluded.importe_total
+    WHERE faena_v2.tipo_id IS NOT excluded.tipo_id
+       OR faena_v2.precio_max_kg IS NOT excluded.precio_max_kg
+       OR faena_v2.precio_min_kg IS NOT excluded.precio_min_kg
+       OR faena_v2.precio_promedio_kg IS NOT excluded.precio_promedio_kg
+       OR faena_v2.cabezas IS NOT excluded.cabezas
+       OR faena_v2.kilos_total IS NOT excluded.kilos_total
+       OR faena_v2.importe_total IS NOT excluded.importe_total;
+"""
+
+SQL_UPSERT_INVERNADA_V2 = """
+    INSERT INTO invernada_v2 (
+        serie_id, dia_fin, dia_inicio, extraccion, tipo_id, precio_promedio_kg, cabezas, variacion_semanal_precio
+    ) VALUES (
+        :serie_id, :dia_fin, :dia_inicio, :extraccion, :tipo_id, :precio_promedio_kg, :cabezas,
+        :variacion_semanal_precio
+    )
+    ON CONFLICT(serie_id, dia_fin) DO UPDATE SET
+        dia_inicio = excluded.dia_inicio,
+        extraccion = excluded.extraccion,
+        tipo_id = excluded.tipo_id,
+        precio_promedio_kg = excluded.precio_promedio_kg,
+        cabezas = excluded.cabezas,
+        variacion_semanal_precio = excluded.variacion_semanal_precio
+    WHERE invernada_v2.dia_inicio IS NOT excluded.dia_inicio
+       OR invernada_v2.tipo_id IS NOT excluded.tipo_id
+       OR invernada_v2.precio_promedio_kg IS NOT excluded.precio_promedio_kg
+       OR invernada_v2.cabezas IS NOT excluded.cabezas
+       OR invernada_v2.variacion_semanal_precio IS NOT excluded.variacion_semanal_precio;
+"""
+
+def _tipos_hacienda_v2(cursor, filas):
+    tipos = _ids_dimension(cursor, 'dim_tipo_hacienda', ('tipo_hacienda',),
+                           {(f['tipo_hacienda'],) for f in filas if f['tipo_hacienda'] is not None})
+    return lambda tipo: None if tipo is None else tipos[(tipo,)]
 
-def insertar_datos_faena(conn, lista_datos_faena):
-    if not lista_datos_faena: return 0
+def _upsert_faena_v2(cursor, filas):
+    """Traduce las filas de insertar_datos_faena (claves TEXT, fechas ISO) a v2 y hace el upsert."""
+    claves = [(f['categoria_original'], f['raza'], f['rango_peso']) for f in filas]
+    series = _ids_dimension(cursor, 'dim_serie_faena', ('categoria_original', 'raza', 'rango_peso'),
+                            dict.fromkeys(claves))
+    tipo_id = _tipos_hacienda_v2(cursor, filas)
+    dias = _dias_v2(f['fecha_consulta'] for f in filas)
+    extraccion = int(datetime.now().timestamp())
+    filas_v2 = [dict(f, serie_id=series[_clave_dimension(clave)], dia=dias[f['fecha_consulta']],
+                     extraccion=extraccion, tipo_id=tipo_id(f['tipo_hacienda']))
+                for f, clave in zip(filas, claves)]
+    return _upsert_v2(cursor, 'faena_v2', SQL_UPSERT_FAENA_V2, filas_v2)
+
+def _upsert_invernada_v2(cursor, filas):
+    """Como _upsert_faena_v2 (insertar_datos_invernada ya descartó las filas sin fecha de fin)."""
+    series = _ids_dimension(cursor, 'dim_serie_invernada', ('categoria_original',),
+                            {(f['categoria_original'],) for f in filas})
+    tipo_id = _tipos_hacienda_v2(cursor, filas)
+    dias = _dias_v2([f['fecha_consulta_fin'] for f in filas] + [f['fecha_consulta_inicio'] for f in filas])
+    extraccion = int(datetime.now().timestamp())
+    filas_v2 = [dict(f, serie_id=series[(f['categoria_original'],)], dia_fin=dias[f['fecha_consulta_fin']],
+                     dia_inicio=dias.get(f['fecha_consulta_inicio']), extraccion=extraccion,
+                     tipo_id=tipo_id(f['tipo_hacienda']))
+                for f in filas]
+    return _upsert_v2(cursor, 'invernada_v2', SQL_UPSERT_INVERNADA_V2, filas_v2)
+
+def insertar_datos_faena(conn, lista_datos_faena, detalle=False):
+    """
+    Upsert de registros de Faena (fechas DD/MM/YYYY -> YYYY-MM-DD).
+    Devuelve la cantidad de filas insertadas o actualizadas; con `detalle`, el dict
+    {'insertados', 'actualizados', 'sin_cambios'}.
+    """
+    if not lista_datos_faena: return _resultado_lote(_LOTE_VACIO, detalle)
     
-    sql = """
-    INSERT OR REPLACE INTO faena(
+    sql = f"""
+    INSERT INTO faena(
         fecha_extraccion, fecha_consulta, tipo_hacienda, categoria_original, raza, 
         rango_peso, precio_max_kg, precio_min_kg, precio_promedio_kg, 
         cabezas, kilos_total, importe_total
@@ -191,19 +1492,35 @@ def insertar_datos_faena(conn, lista_datos_faena):
         :fecha_extraccion, :fecha_consulta, :tipo_hacienda, :categoria_original, :raza,
         :rango_peso, :precio_max_kg, :precio_min_kg, :precio_promedio_kg,
         :cabezas, :kilos_total, :importe_total
-    );
+    )
+    ON CONFLICT({CLAVE_FAENA}) DO UPDATE SET
+        fecha_extraccion = excluded.fecha_extraccion,
+        tipo_hacienda = excluded.tipo_hacienda,
+        precio_max_kg = excluded.precio_max_kg,
+        precio_min_kg = excluded.precio_min_kg,
+        precio_promedio_kg = excluded.precio_promedio_kg,
+        cabezas = excluded.cabezas,
+        kilos_total = excluded.kilos_total,
+        importe_total = excluded.importe_total
+    WHERE faena.tipo_hacienda IS NOT excluded.tipo_hacienda
+       OR faena.precio_max_kg IS NOT excluded.precio_max_kg
+       OR faena.precio_min_kg IS NOT excluded.precio_min_kg
+       OR faena.precio_promedio_kg IS NOT excluded.precio_promedio_kg
+       OR faena.cabezas IS NOT excluded.cabezas
+       OR faena.kilos_total IS NOT excluded.kilos_total
+       OR faena.importe_total IS NOT excluded.importe_total;
     """
     
     fecha_actual_str = datetime.now().isoformat()
+    fechas = _fechas_iso(item.get('fecha_consulta_inicio') for item in lista_datos_faena)
     datos_para_insertar = []
     
     for item in lista_datos_faena:
         fecha_raw = item.get('fecha_consulta_inicio') # Viene como 19/11/2025
         
         # TRADUCCIÓN AL ENTRAR: DD/MM/YYYY -> YYYY-MM-DD
-        try:
-            fecha_iso = datetime.strptime(fecha_raw, "%d/%m/%Y").strftime("%Y-%m-%d")
-        except (ValueError, TypeError):
+        fecha_iso = fechas.get(fecha_raw)
+        if fecha_iso is None:
             # Si falla, no insertamos basura
             print(f"Error de fecha en registro: {fecha_raw}")
             continue
@@ -224,35 +1541,164 @@ def insertar_datos_faena(conn, lista_datos_faena):
         }
         datos_para_insertar.append(item_dict)
 
+    if not datos_para_insertar: return _resultado_lote(_LOTE_VACIO, detalle)
+
     try:
+        _iniciar_lote(conn)
         cursor = conn.cursor()
-        cursor.executemany(sql, datos_para_insertar)
+        if _esquema_precios(cursor) == 2:
+            conteos = _upsert_faena_v2(cursor, datos_para_insertar)
+        else:
+            conteos = _ejecutar_upsert(cursor, 'faena', sql, datos_para_insertar)
+        escritas = conteos['insertados'] + conteos['actualizados']
+        if escritas:
+            # Variación, rollups, catálogo y versión en la misma transacción, solo por lo que cambió
+            fechas_escritas = _fechas_escritas(cursor, 'faena', 'fecha_consulta')
+            _recalcular_variacion_faena(conn.cursor(), desde=min(fechas_escritas))
+            _actualizar_rollups(conn.cursor(), 'faena', fechas_escritas)
+            _actualizar_catalogo(conn.cursor())
+            _incrementar_version_datos(conn.cursor())
         conn.commit()
-        return cursor.rowcount 
+        if escritas:
+            _publicar_version_datos(conn)
+        logger.info(f"Faena: {conteos['insertados']} insertados, {conteos['actualizados']} actualizados, "
+                    f"{conteos['sin_cambios']} sin cambios.")
+        return _resultado_lote(conteos, detalle)
     except sqlite3.Error as e:
         print(f"Error SQL insertando Faena: {e}")
         conn.rollback()
+        return _resultado_lote(_LOTE_VACIO, detalle)
+
+
+# --- VARIACIÓN SEMANAL DE FAENA (MATERIALIZADA) ---
+# Regla "as-of" única: se compara contra el último precio de la MISMA serie
+# (categoría, raza, rango de peso) con fecha <= fecha - 7 días. Así se cubren
+# fines de semana y feriados sin operación. La fecha usada queda guardada en
+# `fecha_referencia_variacion`.
+
+SQL_REFERENCIA_VARIACION = """
+    UPDATE faena SET fecha_referencia_variacion = (
+        SELECT MAX(ref.fecha_consulta) FROM faena ref
+        WHERE ref.categoria_original = faena.categoria_original
+          AND ref.raza IS faena.raza
+          AND ref.rango_peso IS faena.rango_peso
+          AND ref.fecha_consulta <= date(faena.fecha_consulta, '-7 days')
+    )
+    WHERE fecha_consulta >= ?
+"""
+
+SQL_VALOR_VARIACION = """
+    UPDATE faena SET variacion_semanal_precio = (
+        SELECT CASE
+            WHEN ref.precio_promedio_kg > 0
+            THEN ROUND(((faena.precio_promedio_kg - ref.precio_promedio_kg) / ref.precio_promedio_kg) * 100, 2)
+            ELSE NULL
+        END
+        FROM faena ref
+        WHERE ref.categoria_original = faena.categoria_original
+          AND ref.raza IS faena.raza
+          AND ref.rango_peso IS faena.rango_peso
+          AND ref.fecha_consulta = faena.fecha_referencia_variacion
+    )
+    WHERE fecha_consulta >= ?
+"""
+
+# En v2 la serie es un entero y la fecha de referencia se busca sobre la clave primaria (serie_id, dia);
+# el filtro por fecha usa la misma expresión que el índice idx_faena_v2_fecha.
+SQL_REFERENCIA_VARIACION_V2 = f"""
+    UPDATE faena_v2 SET dia_referencia_variacion = (
+        SELECT MAX(ref.dia) FROM faena_v2 ref
+        WHERE ref.serie_id = faena_v2.serie_id AND ref.dia <= faena_v2.dia - 7
+    )
+    WHERE {EXPRESION_FECHA_V2.format(col='dia')} >= ?
+"""
+
+SQL_VALOR_VARIACION_V2 = f"""
+    UPDATE faena_v2 SET variacion_semanal_precio = (
+        SELECT CASE
+            WHEN ref.precio_promedio_kg > 0
+            THEN ROUND(((faena_v2.precio_promedio_kg - ref.precio_promedio_kg) / ref.precio_promedio_kg) * 100, 2)
+            ELSE NULL
+        END
+        FROM faena_v2 ref
+        WHERE ref.serie_id = faena_v2.serie_id AND ref.dia = faena_v2.dia_referencia_variacion
+    )
+    WHERE {EXPRESION_FECHA_V2.format(col='dia')} >= ?
+"""
+
+def _recalcular_variacion_faena(cursor, desde='0000-00-00'):
+    """
+    Recalcula la variación de los registros con fecha >= `desde` (no hace commit).
+    Un dato nuevo solo puede cambiar la referencia de fechas posteriores, por eso
+    alcanza con recalcular desde la fecha más antigua del lote insertado.
+    """
+    if _esquema_precios(cursor) == 2:
+        cursor.execute(SQL_REFERENCIA_VARIACION_V2, (desde,))
+        cursor.execute(SQL_VALOR_VARIACION_V2, (desde,))
+    else:
+        cursor.execute(SQL_REFERENCIA_VARIACION, (desde,))
+        cursor.execute(SQL_VALOR_VARIACION, (desde,))
+    return cursor.rowcount
+
+def recalcular_variacion_faena(conn, desde=None):
+    """Recalcula (one-shot) la variación semanal de todo el histórico o desde una fecha ISO."""
+    try:
+        actualizados = _recalcular_variacion_faena(conn.cursor(), desde or '0000-00-00')
+        _incrementar_version_datos(conn.cursor())
+        conn.commit()
+        _publicar_version_datos(conn)
+        return actualizados
+    except sqlite3.Error as e:
+        logger.error(f"Error recalculando variación semanal de Faena: {e}")
+        conn.rollback()
         return 0
 
+def get_variacion_faena(conn, fecha_iso):
+    """
+    Devuelve la variación materializada de un día, indexada por serie:
+    {(categoria, raza, rango_peso): (variacion, fecha_referencia)}
+    """
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT categoria_original, raza, rango_peso, variacion_semanal_precio, fecha_referencia_variacion
+        FROM faena WHERE fecha_consulta = ?
+    """, (fecha_iso,))
+    return {(r[0], r[1], r[2]): (r[3], r[4]) for r in cursor.fetchall()}
 
-def insertar_datos_invernada(conn, lista_datos_invernada):
+
+def insertar_datos_invernada(conn, lista_datos_invernada, detalle=False):
     """
-    Inserta registros de Invernada convirtiendo fechas de DD/MM/YYYY a YYYY-MM-DD.
+    Upsert de registros de Invernada convirtiendo fechas de DD/MM/YYYY a YYYY-MM-DD.
+    Devuelve lo mismo que insertar_datos_faena.
     """
     if not lista_datos_invernada:
-        return 0
+        return _resultado_lote(_LOTE_VACIO, detalle)
 
     sql = """
-    INSERT OR REPLACE INTO invernada (
+    INSERT INTO invernada (
         fecha_extraccion, fecha_consulta_inicio, fecha_consulta_fin, tipo_hacienda, 
         categoria_original, precio_promedio_kg, cabezas, variacion_semanal_precio
     ) VALUES (
         :fecha_extraccion, :fecha_consulta_inicio, :fecha_consulta_fin, :tipo_hacienda,
         :categoria_original, :precio_promedio_kg, :cabezas, :variacion_semanal_precio
-    );
+    )
+    ON CONFLICT(fecha_consulta_fin, categoria_original) DO UPDATE SET
+        fecha_extraccion = excluded.fecha_extraccion,
+        fecha_consulta_inicio = excluded.fecha_consulta_inicio,
+        tipo_hacienda = excluded.tipo_hacienda,
+        precio_promedio_kg = excluded.precio_promedio_kg,
+        cabezas = excluded.cabezas,
+        variacion_semanal_precio = excluded.variacion_semanal_precio
+    WHERE invernada.fecha_consulta_inicio IS NOT excluded.fecha_consulta_inicio
+       OR invernada.tipo_hacienda IS NOT excluded.tipo_hacienda
+       OR invernada.precio_promedio_kg IS NOT excluded.precio_promedio_kg
+       OR invernada.cabezas IS NOT excluded.cabezas
+       OR invernada.variacion_semanal_precio IS NOT excluded.variacion_semanal_precio;
     """
     
     fecha_actual_str = datetime.now().isoformat()
+    fechas = _fechas_iso(fecha for item in lista_datos_invernada
+                         for fecha in (item.get('fecha_consulta_inicio'), item.get('fecha_consulta_fin')))
     datos_para_insertar = []
     
     for item in lista_datos_invernada:
@@ -261,17 +1707,15 @@ def insertar_datos_invernada(conn, lista_datos_invernada):
         fin_raw = item.get('fecha_consulta_fin')
         
         # 2. Conversión a ISO (YYYY-MM-DD)
-        try:
-            inicio_iso = datetime.strptime(inicio_raw, "%d/%m/%Y").strftime("%Y-%m-%d") if inicio_raw else None
-            fin_iso = datetime.strptime(fin_raw, "%d/%m/%Y").strftime("%Y-%m-%d") if fin_raw else None
-        except (ValueError, TypeError):
+        if (inicio_raw and inicio_raw not in fechas) or fin_raw not in fechas:
+            # Sin fecha de fin tampoco: es parte de la clave (un NULL nunca entra en conflicto)
             print(f"Error de fecha en registro Invernada: {inicio_raw} - {fin_raw}")
             continue # Saltamos registros con fechas rotas
 
         item_dict = {
             'fecha_extraccion': fecha_actual_str,
-            'fecha_consulta_inicio': inicio_iso, # <--- GUARDADO COMO ISO
-            'fecha_consulta_fin': fin_iso,       # <--- GUARDADO COMO ISO
+            'fecha_consulta_inicio': fechas.get(inicio_raw) if inicio_raw else None, # <--- GUARDADO COMO ISO
+            'fecha_consulta_fin': fechas[fin_raw],                                 # <--- GUARDADO COMO ISO
             'tipo_hacienda': item.get('tipo_hacienda'),
             'categoria_original': item.get('categoria_original'),
             'precio_promedio_kg': item.get('precio_promedio_kg'),
@@ -280,89 +1724,903 @@ def insertar_datos_invernada(conn, lista_datos_invernada):
         }
         datos_para_insertar.append(item_dict)
 
+    if not datos_para_insertar: return _resultado_lote(_LOTE_VACIO, detalle)
+
     try:
+        _iniciar_lote(conn)
         cursor = conn.cursor()
-        cursor.executemany(sql, datos_para_insertar)
+        if _esquema_precios(cursor) == 2:
+            conteos = _upsert_invernada_v2(cursor, datos_para_insertar)
+        else:
+            conteos = _ejecutar_upsert(cursor, 'invernada', sql, datos_para_insertar)
+        escritas = conteos['insertados'] + conteos['actualizados']
+        if escritas:
+            _actualizar_rollups(conn.cursor(), 'invernada', _fechas_escritas(cursor, 'invernada', 'fecha_consulta_fin'))
+            _actualizar_catalogo(conn.cursor())
+            _incrementar_version_datos(conn.cursor())
         conn.commit()
-        return cursor.rowcount
+        if escritas:
+            _publicar_version_datos(conn)
+        logger.info(f"Invernada: {conteos['insertados']} insertados, {conteos['actualizados']} actualizados, "
+                    f"{conteos['sin_cambios']} sin cambios.")
+        return _resultado_lote(conteos, detalle)
     except sqlite3.Error as e:
         print(f"Error SQL insertando Invernada: {e}")
         conn.rollback()
-        return 0
+        return _resultado_lote(_LOTE_VACIO, detalle)
+
+def _filtro_rango(columna_fecha, desde, hasta, serie):
+    """WHERE por rango de fechas + igualdad en las columnas de la serie que vengan informadas."""
+    where = f"{columna_fecha} BETWEEN ? AND ?"
+    params = [desde, hasta]
+    for columna, valor in serie.items():
+        if valor:
+            where += f" AND {columna} = ?"
+            params.append(valor)
+    return where, params
+
+def _serie_faena(categoria=None, raza=None, rango_peso=None):
+    return {'categoria_original': categoria, 'raza': raza, 'rango_peso': rango_peso}
 
-def get_faena_historico(conn, start_date, end_date, categoria=None, raza=None, rango_peso=None):
+def _serie_invernada(categoria=None):
+    return {'categoria_original': categoria}
+
+def _desde_version(where, params, desde_version):
+    """Agrega el filtro de filas cambiadas después de `desde_version` (None = sin filtro)."""
+    if desde_version is None:
+        return where, params
+    return f"{where} AND version_cambio > ?", params + [desde_version]
+
+def _filtros_faena(start_date, end_date, categoria=None, raza=None, rango_peso=None, desde_version=None):
+    """Cláusula WHERE (y parámetros) común a todas las lecturas de Faena."""
+    return _desde_version(*_filtro_rango('fecha_consulta', start_date, end_date,
+                                         _serie_faena(categoria, raza, rango_peso)), desde_version)
+
+def _filtros_invernada(start_date, end_date, categoria=None, desde_version=None):
+    """Cláusula WHERE (y parámetros) común a todas las lecturas de Invernada."""
+    return _desde_version(*_filtro_rango('fecha_consulta_fin', start_date, end_date,
+                                         _serie_invernada(categoria)), desde_version)
+
+def _sql_faena_historico(start_date, end_date, categoria=None, raza=None, rango_peso=None, desde_version=None):
+    where, params = _filtros_faena(start_date, end_date, categoria, raza, rango_peso, desde_version)
+    query = f"""
+        SELECT 
+            strftime('%d/%m/%Y', fecha_consulta) as fecha_consulta, 
+            precio_promedio_kg,
+            cabezas,
+            categoria_original,
+            raza,
+            rango_peso,
+            variacion_semanal_precio
+        FROM faena
+        WHERE {where}
+        ORDER BY faena.fecha_consulta ASC
+    """
+    return query, params
+
+def get_faena_historico(conn, start_date, end_date, categoria=None, raza=None, rango_peso=None, desde_version=None):
     """
     Devuelve los datos para el Dashboard incluyendo CABEZAS y VARIACIÓN SEMANAL.
-    La variación se calcula comparando con el precio de 7 días atrás.
+    La variación viene materializada desde la ingesta (ver _recalcular_variacion_faena),
+    por lo que la consulta es un simple recorrido por rango de fechas sobre el índice.
     """
-    # Query con LEFT JOIN para obtener el precio de 7 días atrás y calcular la variación
-    base_query = """
-        SELECT 
-            strftime('%d/%m/%Y', f.fecha_consulta) as fecha_consulta, 
-            f.precio_promedio_kg,
-            f.cabezas,
-            f.categoria_original,
-            f.raza,
-            f.rango_peso,
-            f_prev.precio_promedio_kg as precio_7dias_atras,
-            CASE 
-                WHEN f_prev.precio_promedio_kg IS NOT NULL AND f_prev.precio_promedio_kg > 0 
-                THEN ROUND(((f.precio_promedio_kg - f_prev.precio_promedio_kg) / f_prev.precio_promedio_kg) * 100, 2)
-                ELSE NULL 
-            END as variacion_semanal_precio
-        FROM faena f
-        LEFT JOIN faena f_prev ON f_prev.fecha_consulta = date(f.fecha_consulta, '-7 days')
-            AND f_prev.categoria_original = f.categoria_original
-            AND (f_prev.raza = f.raza OR (f_prev.raza IS NULL AND f.raza IS NULL))
-            AND (f_prev.rango_peso = f.rango_peso OR (f_prev.rango_peso IS NULL AND f.rango_peso IS NULL))
-        WHERE f.fecha_consulta BETWEEN ? AND ?
-    """
-    params = [start_date, end_date]
-
-    if categoria:
-        base_query += " AND f.categoria_original = ?"
-        params.append(categoria)
-    if raza:
-        base_query += " AND f.raza = ?"
-        params.append(raza)
-    if rango_peso:
-        base_query += " AND f.rango_peso = ?"
-        params.append(rango_peso)
-    
-    base_query += " ORDER BY f.fecha_consulta ASC"
-    
+    query, params = _sql_faena_historico(start_date, end_date, categoria, raza, rango_peso, desde_version)
     cursor = conn.cursor()
-    cursor.execute(base_query, tuple(params))
+    cursor.execute(query, tuple(params))
     rows = [dict(row) for row in cursor.fetchall()]
     return rows
 
-def get_invernada_historico(conn, start_date, end_date, categoria=None):
+def _sql_invernada_historico(start_date, end_date, categoria=None, desde_version=None):
+    where, params = _filtros_invernada(start_date, end_date, categoria, desde_version)
     # Se agrega 'cabezas' al SELECT
-    base_query = """
+    query = f"""
         SELECT 
             strftime('%d/%m/%Y', fecha_consulta_inicio) as fecha_consulta_inicio,
             strftime('%d/%m/%Y', fecha_consulta_fin) as fecha_consulta_fin,
             categoria_original,
             precio_promedio_kg,
             variacion_semanal_precio,
-            cabezas -- <--- ¡ESTO FALTABA!
+            cabezas
         FROM invernada 
-        WHERE fecha_consulta_fin BETWEEN ? AND ?
+        WHERE {where}
+        ORDER BY invernada.fecha_consulta_fin ASC
     """
-    params = [start_date, end_date]
+    return query, params
 
-    if categoria:
-        base_query += " AND categoria_original = ?"
-        params.append(categoria)
-    
-    base_query += " ORDER BY invernada.fecha_consulta_fin ASC"
-    
+def get_invernada_historico(conn, start_date, end_date, categoria=None, desde_version=None):
+    query, params = _sql_invernada_historico(start_date, end_date, categoria, desde_version)
     cursor = conn.cursor()
-    cursor.execute(base_query, tuple(params))
+    cursor.execute(query, tuple(params))
     rows = [dict(row) for row in cursor.fetchall()]
     return rows
 
 
+# --- LECTURA EN STREAMING (RANGOS GRANDES) ---
+# Para rangos de varios años no se arma la lista completa: las filas salen del cursor en
+# lotes (fetchmany) y se serializan a medida que se envían. En memoria hay a lo sumo un lote.
+
+TAMANO_LOTE_STREAM = 1000
+
+def _lotes_de_cursor(cursor, tamano_lote):
+    """Generador de lotes (listas de tuplas) de un cursor ya ejecutado; lo cierra al terminar."""
+    try:
+        while True:
+            filas = cursor.fetchmany(tamano_lote)
+            if not filas:
+                break
+            yield filas
+    finally:
+        cursor.close()
+
+def _iterar_lotes(conn, query, params, tamano_lote):
+    """Generador de lotes (listas de dicts) de a `tamano_lote` filas."""
+    cursor = conn.cursor()
+    cursor.row_factory = None  # Tuplas: el dict se arma una sola vez por fila
+    cursor.execute(query, tuple(params))
+    columnas = [d[0] for d in cursor.description]
+    for filas in _lotes_de_cursor(cursor, tamano_lote):
+        yield [dict(zip(columnas, fila)) for fila in filas]
+
+def iterar_faena_historico(conn, start_date, end_date, categoria=None, raza=None, rango_peso=None,
+                           tamano_lote=TAMANO_LOTE_STREAM):
+    """Mismas filas que get_faena_historico, entregadas por lotes."""
+    query, params = _sql_faena_historico(start_date, end_date, categoria, raza, rango_peso)
+    return _iterar_lotes(conn, query, params, tamano_lote)
+
+def iterar_invernada_historico(conn, start_date, end_date, categoria=None, tamano_lote=TAMANO_LOTE_STREAM):
+    """Mismas filas que get_invernada_historico, entregadas por lotes."""
+    query, params = _sql_invernada_historico(start_date, end_date, categoria)
+    return _iterar_lotes(conn, query, params, tamano_lote)
+
+
+# --- EXPORTACIÓN (CSV / NDJSON) ---
+# Volcado de las filas crudas (fechas ISO) para analistas, vía API o CLI.
+# Se ordena por la clave única de cada tabla, así el recorrido sigue su índice.
+
+COLUMNAS_EXPORTACION = {
+    'faena': ('fecha_consulta', 'tipo_hacienda', 'categoria_original', 'raza', 'rango_peso',
+              'precio_max_kg', 'precio_min_kg', 'precio_promedio_kg', 'cabezas', 'kilos_total',
+              'importe_total', 'variacion_semanal_precio', 'fecha_extraccion'),
+    'invernada': ('fecha_consulta_inicio', 'fecha_consulta_fin', 'tipo_hacienda', 'categoria_original',
+                  'precio_promedio_kg', 'cabezas', 'variacion_semanal_precio', 'fecha_extraccion'),
+}
+
+def exportar_precios(conn, tabla, start_date, end_date, categoria=None, raza=None, rango_peso=None,
+                     tamano_lote=TAMANO_LOTE_STREAM):
+    """
+    Devuelve (columnas, lotes) de `tabla` ('faena' | 'invernada') en el rango.
+    La consulta se ejecuta al llamar; `lotes` es un generador de listas de tuplas (fetchmany).
+    `raza` y `rango_peso` solo aplican a Faena. Lanza ValueError si la tabla no existe.
+    """
+    if tabla == 'faena':
+        where, params = _filtros_faena(start_date, end_date, categoria, raza, rango_peso)
+        orden = 'fecha_consulta, categoria_original, raza, rango_peso'
+    elif tabla == 'invernada':
+        where, params = _filtros_invernada(start_date, end_date, categoria)
+        orden = 'fecha_consulta_fin, categoria_original'
+    else:
+        raise ValueError(f"Tabla de exportación inválida: {tabla}")
+
+    columnas = COLUMNAS_EXPORTACION[tabla]
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    cursor.execute(f"SELECT {', '.join(columnas)} FROM {tabla} WHERE {where} ORDER BY {orden}", tuple(params))
+    return list(columnas), _lotes_de_cursor(cursor, tamano_lote)
+
+
+# --- AGRUPACIÓN TEMPORAL (BUCKETS) DEL HISTÓRICO ---
+# El Dashboard ya no descarga cada fila diaria para agruparla en JavaScript:
+# SQLite calcula los buckets y solo viaja un punto por período.
+
+AGRUPACIONES = ('diario', 'semanal', 'mensual', 'auto')
+
+# Expresión que lleva una fecha ISO al primer día de su período
+EXPRESION_PERIODO = {
+    'diario': "{col}",
+    'semanal': "date({col}, '-6 days', 'weekday 1')",  # Lunes de esa semana
+    'mensual': "strftime('%Y-%m-01', {col})",
+}
+
+# Umbrales de la agrupación automática (los mismos que usaba el Dashboard)
+UMBRAL_AUTO_SEMANAL = 60
+UMBRAL_AUTO_MENSUAL = 300
+
+def _resolver_agrupacion(conn, tabla, columna_fecha, where, params, agrupacion):
+    """Traduce 'auto' a diario/semanal/mensual según la cantidad de fechas del rango."""
+    if agrupacion != 'auto':
+        return agrupacion
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT COUNT(DISTINCT {columna_fecha}) FROM {tabla} WHERE {where}", tuple(params))
+    fechas = cursor.fetchone()[0] or 0
+    if fechas > UMBRAL_AUTO_MENSUAL:
+        return 'mensual'
+    if fechas > UMBRAL_AUTO_SEMANAL:
+        return 'semanal'
+    return 'diario'
+
+def _metricas_agrupado(spec, clave_fecha, formato_fecha):
+    """
+    Columnas del SELECT externo sobre los componentes de cada período.
+    Los componentes son aditivos: se combinan rollups, bordes crudos y distintas series
+    del mismo período. precio_ponderado_kg: promedio ponderado por cabezas.
+    """
+    expresion_fecha = _expresion_fecha('periodo', formato_fecha) if formato_fecha else "strftime('%d/%m/%Y', periodo)"
+    return f"""
+            {expresion_fecha} AS {clave_fecha},
+            SUM(suma_precio) * 1.0 / SUM(registros_con_precio) AS precio_promedio_kg,
+            SUM(suma_precio_x_cabezas) * 1.0 / SUM(cabezas_con_precio) AS precio_ponderado_kg,
+            {spec['metricas_extra']}
+            SUM(cabezas) AS cabezas,
+            MIN(precio_min) AS precio_promedio_min,
+            MAX(precio_max) AS precio_promedio_max,
+            SUM(registros) AS registros"""
+
+def _get_agrupado(conn, tabla, clave_fecha, start_date, end_date, serie, agrupacion, formato_fecha=None):
+    """
+    Buckets de la serie. Para semanal/mensual, los períodos completamente incluidos en el
+    rango se leen de los rollups y solo los bordes parciales se agregan desde las filas crudas.
+    Con `formato_fecha` ('iso' | 'epoch_day') las filas se devuelven en formato columnar.
+    """
+    if agrupacion not in AGRUPACIONES:
+        raise ValueError(f"Agrupación inválida: {agrupacion}")
+    spec = ROLLUPS[tabla]
+    where, params = _filtro_rango(spec['columna_fecha'], start_date, end_date, serie)
+    agrupacion = _resolver_agrupacion(conn, tabla, spec['columna_fecha'], where, params, agrupacion)
+    partes, params = _partes_componentes(tabla, start_date, end_date, serie, agrupacion)
+
+    query = f"""
+        SELECT {_metricas_agrupado(spec, clave_fecha, formato_fecha)}
+        FROM ({" UNION ALL ".join(partes)})
+        GROUP BY periodo
+        ORDER BY periodo ASC
+    """
+    cursor = conn.cursor()
+    if formato_fecha:
+        cursor.row_factory = None
+        cursor.execute(query, tuple(params))
+        return agrupacion, _leer_columnar(cursor)
+    cursor.execute(query, tuple(params))
+    return agrupacion, [dict(row) for row in cursor.fetchall()]
+
+def _partes_componentes(tabla, start_date, end_date, serie, agrupacion):
+    """
+    Subconsultas (para UNION ALL) con los componentes aditivos de cada período de la serie:
+    los períodos completos salen de los rollups y los bordes parciales de las filas crudas.
+    Devuelve (partes, params).
+    """
+    spec = ROLLUPS[tabla]
+    columna_fecha = spec['columna_fecha']
+    periodo = EXPRESION_PERIODO[agrupacion].format(col=columna_fecha)
+    componentes = COMPONENTES_ROLLUP + spec['componentes_extra']
+
+    partes, params = [], []
+    rangos_crudos = [(start_date, end_date)]
+    completos = _periodos_completos(agrupacion, start_date, end_date) if agrupacion in TIPOS_ROLLUP else None
+    if completos:
+        primer_periodo, ultimo_periodo, fin_completos = completos
+        where_rollup, params_rollup = _filtro_rango('periodo', primer_periodo, ultimo_periodo, serie)
+        partes.append(f"""
+            SELECT periodo, {', '.join(spec['columnas_componentes'])}
+            FROM {spec['tabla_rollup']}
+            WHERE tipo_periodo = ? AND {where_rollup}
+        """)
+        params += [agrupacion] + params_rollup
+        rangos_crudos = []
+        if primer_periodo > start_date:
+            rangos_crudos.append((start_date, _dia_anterior(primer_periodo)))
+        if fin_completos < end_date:
+            rangos_crudos.append((_dia_siguiente(fin_completos), end_date))
+
+    for desde, hasta in rangos_crudos:
+        where_crudo, params_crudo = _filtro_rango(columna_fecha, desde, hasta, serie)
+        partes.append(f"""
+            SELECT {periodo} AS periodo, {componentes}
+            FROM {tabla}
+            WHERE {where_crudo}
+            GROUP BY 1
+        """)
+        params += params_crudo
+    return partes, params
+
+def get_faena_agrupado(conn, start_date, end_date, categoria=None, raza=None, rango_peso=None, agrupacion='auto',
+                       formato_fecha=None):
+    """
+    Serie de Faena agrupada por período: precio promedio, precio ponderado por cabezas y por
+    kilos (importe_total / kilos_total), suma de cabezas y mínimo/máximo del período.
+    Devuelve (agrupacion_aplicada, filas); 'auto' se resuelve según el tamaño del rango.
+    Con `formato_fecha`, `filas` es un dict columnar (ver _leer_columnar).
+    """
+    return _get_agrupado(conn, 'faena', 'fecha_consulta', start_date, end_date,
+                         _serie_faena(categoria, raza, rango_peso), agrupacion, formato_fecha)
+
+def get_invernada_agrupado(conn, start_date, end_date, categoria=None, agrupacion='auto', formato_fecha=None):
+    """Igual que get_faena_agrupado, para Invernada (agrupa por fecha_consulta_fin)."""
+    return _get_agrupado(conn, 'invernada', 'fecha_consulta_fin', start_date, end_date,
+                         _serie_invernada(categoria), agrupacion, formato_fecha)
+
+
+# --- RESUMEN (KPIs) ---
+# Los KPIs del Dashboard no necesitan la serie: salen de agregados sobre los componentes
+# mensuales (rollups + bordes crudos) y de búsquedas puntuales por índice para las fechas
+# de los extremos y el último precio.
+
+def _agregados_rango(cursor, tabla, start_date, end_date, serie):
+    partes, params = _partes_componentes(tabla, start_date, end_date, serie, 'mensual')
+    cursor.execute(f"""
+        SELECT
+            SUM(registros) AS registros,
+            SUM(cabezas) AS cabezas_total,
+            SUM(suma_precio) * 1.0 / SUM(registros_con_precio) AS precio_promedio,
+            SUM(suma_precio_x_cabezas) * 1.0 / SUM(cabezas_con_precio) AS precio_ponderado,
+            MIN(precio_min) AS precio_min,
+            MAX(precio_max) AS precio_max
+        FROM ({" UNION ALL ".join(partes)})
+    """, tuple(params))
+    return dict(zip([d[0] for d in cursor.description], cursor.fetchone()))
+
+def _get_resumen(conn, tabla, start_date, end_date, serie):
+    """
+    KPIs de la serie en el rango: registros, cabezas, precio promedio / ponderado, máximo y
+    mínimo (con la fecha más reciente en que se dieron), último precio y la variación del
+    promedio contra el período anterior de igual duración. Fechas ISO.
+    """
+    columna_fecha = ROLLUPS[tabla]['columna_fecha']
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    resumen = _agregados_rango(cursor, tabla, start_date, end_date, serie)
+    resumen['cabezas_total'] = resumen['cabezas_total'] or 0
+    resumen['registros'] = resumen['registros'] or 0
+
+    where, params = _filtro_rango(columna_fecha, start_date, end_date, serie)
+    for extremo in ('max', 'min'):
+        resumen[f'fecha_{extremo}'] = None
+        if resumen[f'precio_{extremo}'] is not None:
+            cursor.execute(f"""
+                SELECT {columna_fecha} FROM {tabla}
+                WHERE {where} AND precio_promedio_kg = ?
+                ORDER BY {columna_fecha} DESC LIMIT 1
+            """, tuple(params) + (resumen[f'precio_{extremo}'],))
+            resumen[f'fecha_{extremo}'] = cursor.fetchone()[0]
+
+    # Último día con precio (si la serie es parcial, promedio de las filas de ese día)
+    cursor.execute(f"""
+        SELECT {columna_fecha}, AVG(precio_promedio_kg) FROM {tabla}
+        WHERE {where} AND precio_promedio_kg IS NOT NULL
+        GROUP BY {columna_fecha}
+        ORDER BY {columna_fecha} DESC LIMIT 1
+    """, tuple(params))
+    resumen['fecha_ultimo'], resumen['precio_ultimo'] = cursor.fetchone() or (None, None)
+
+    # Período anterior de igual duración, inmediatamente antes de start_date
+    inicio = datetime.strptime(start_date, '%Y-%m-%d').date()
+    dias = (datetime.strptime(end_date, '%Y-%m-%d').date() - inicio).days + 1
+    anterior = _agregados_rango(cursor, tabla, (inicio - timedelta(days=dias)).isoformat(),
+                                (inicio - timedelta(days=1)).isoformat(), serie)
+    resumen['precio_promedio_anterior'] = anterior['precio_promedio']
+    resumen['variacion_periodo'] = None
+    if anterior['precio_promedio'] and resumen['precio_promedio'] is not None:
+        resumen['variacion_periodo'] = round(
+            (resumen['precio_promedio'] - anterior['precio_promedio']) / anterior['precio_promedio'] * 100, 2)
+    return resumen
+
+def get_faena_resumen(conn, start_date, end_date, categoria=None, raza=None, rango_peso=None):
+    """KPIs de una serie de Faena (ver _get_resumen)."""
+    return _get_resumen(conn, 'faena', start_date, end_date, _serie_faena(categoria, raza, rango_peso))
+
+def get_invernada_resumen(conn, start_date, end_date, categoria=None):
+    """KPIs de una categoría de Invernada (ver _get_resumen)."""
+    return _get_resumen(conn, 'invernada', start_date, end_date, _serie_invernada(categoria))
+
+
+# --- COMPARACIÓN DE VARIAS SERIES ---
+# Para superponer N series en el Dashboard con un solo pedido: todas se agregan en una
+# única consulta. Las claves se agrupan según qué columnas de serie traen informadas y
+# cada grupo se une por igualdad con una tabla VALUES, así cada serie recorre su prefijo
+# del índice compuesto (o de la PK del rollup) en vez de repetir la consulta por serie.
+
+MAX_SERIES_MULTI = 12
+
+def _get_agrupado_series(conn, tabla, clave_fecha, start_date, end_date, series, agrupacion, formato_fecha=None):
+    """
+    Buckets de varias series. `series` es una lista de tuplas con los valores de las columnas
+    de serie de la tabla (vacío/None = todas). El período es común a todas: 'auto' se
+    resuelve sobre el rango completo. Devuelve (agrupacion, [filas de cada serie, en orden]).
+    """
+    if agrupacion not in AGRUPACIONES:
+        raise ValueError(f"Agrupación inválida: {agrupacion}")
+    if not series or len(series) > MAX_SERIES_MULTI:
+        raise ValueError(f"Se esperan entre 1 y {MAX_SERIES_MULTI} series")
+    spec = ROLLUPS[tabla]
+    columna_fecha = spec['columna_fecha']
+    where, params = _filtro_rango(columna_fecha, start_date, end_date, {})
+    agrupacion = _resolver_agrupacion(conn, tabla, columna_fecha, where, params, agrupacion)
+    periodo = EXPRESION_PERIODO[agrupacion].format(col=columna_fecha)
+    componentes = COMPONENTES_ROLLUP + spec['componentes_extra']
+
+    # forma (columnas informadas) -> [(índice, valores...)]
+    formas = {}
+    for indice, clave in enumerate(series):
+        informadas = [(col, valor) for col, valor in zip(spec['serie'], clave) if valor]
+        formas.setdefault(tuple(col for col, _ in informadas), []).append(
+            (indice,) + tuple(valor for _, valor in informadas))
+
+    rangos_crudos = [(start_date, end_date)]
+    completos = _periodos_completos(agrupacion, start_date, end_date) if agrupacion in TIPOS_ROLLUP else None
+    if completos:
+        primer_periodo, ultimo_periodo, fin_completos = completos
+        rangos_crudos = []
+        if primer_periodo > start_date:
+            rangos_crudos.append((start_date, _dia_anterior(primer_periodo)))
+        if fin_completos < end_date:
+            rangos_crudos.append((_dia_siguiente(fin_completos), end_date))
+
+    partes, params = [], []
+    for columnas, claves in formas.items():
+        valores = ", ".join("(" + ", ".join("?" * len(claves[0])) + ")" for _ in claves)
+        valores_params = [v for clave in claves for v in clave]
+        union = " AND ".join(f"t.{col} = claves.column{i + 2}" for i, col in enumerate(columnas)) or "1"
+        if completos:
+            partes.append(f"""
+                SELECT claves.column1 AS serie, periodo, {', '.join(spec['columnas_componentes'])}
+                FROM {spec['tabla_rollup']} t JOIN (VALUES {valores}) claves ON {union}
+                WHERE t.tipo_periodo = ? AND t.periodo BETWEEN ? AND ?
+            """)
+            params += valores_params + [agrupacion, primer_periodo, ultimo_periodo]
+        for desde, hasta in rangos_crudos:
+            partes.append(f"""
+                SELECT claves.column1 AS serie, {periodo} AS periodo, {componentes}
+                FROM {tabla} t JOIN (VALUES {valores}) claves ON {union}
+                WHERE t.{columna_fecha} BETWEEN ? AND ?
+                GROUP BY 1, 2
+            """)
+            params += valores_params + [desde, hasta]
+
+    query = f"""
+        SELECT serie, {_metricas_agrupado(spec, clave_fecha, formato_fecha)}
+        FROM ({" UNION ALL ".join(partes)})
+        GROUP BY serie, periodo
+        ORDER BY serie, periodo ASC
+    """
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    cursor.execute(query, tuple(params))
+    nombres = [d[0] for d in cursor.description][1:]
+    por_serie = [[] for _ in series]
+    for fila in cursor.fetchall():
+        por_serie[fila[0]].append(fila[1:])
+
+    if formato_fecha:
+        return agrupacion, [_a_columnar(nombres, filas) for filas in por_serie]
+    return agrupacion, [[dict(zip(nombres, fila)) for fila in filas] for filas in por_serie]
+
+def get_faena_agrupado_multi(conn, start_date, end_date, series, agrupacion='auto', formato_fecha=None):
+    """
+    Varias series de Faena agrupadas por período en una sola consulta.
+    `series`: lista de (categoria, raza, rango_peso); raza y rango_peso vacíos = todas.
+    Devuelve (agrupacion_aplicada, [filas de cada serie]) con las métricas de get_faena_agrupado.
+    """
+    return _get_agrupado_series(conn, 'faena', 'fecha_consulta', start_date, end_date,
+                                [tuple(clave) for clave in series], agrupacion, formato_fecha)
+
+def get_invernada_agrupado_multi(conn, start_date, end_date, categorias, agrupacion='auto', formato_fecha=None):
+    """Igual que get_faena_agrupado_multi, para una lista de categorías de Invernada."""
+    return _get_agrupado_series(conn, 'invernada', 'fecha_consulta_fin', start_date, end_date,
+                                [(categoria,) for categoria in categorias], agrupacion, formato_fecha)
+
+
+# --- FORMATO COLUMNAR ---
+# Para los gráficos: un arreglo por columna en lugar de un dict por fila. Las dimensiones
+# que no varían en la serie (categoría, raza, rango de peso) se informan una sola vez en
+# `constantes`, y las fechas viajan en ISO o como días desde 1970-01-01 (epoch_day).
+
+FORMATOS_FECHA = ('iso', 'epoch_day')
+
+def _expresion_fecha(columna, formato_fecha):
+    if formato_fecha == 'iso':
+        return columna
+    if formato_fecha == 'epoch_day':
+        return f"CAST(julianday({columna}) - 2440587.5 AS INTEGER)"
+    raise ValueError(f"Formato de fecha inválido: {formato_fecha}")
+
+def _leer_columnar(cursor, dimensiones=()):
+    """
+    Transpone las tuplas del cursor (sin row_factory) a {'n', 'constantes', 'columnas'}.
+    Las `dimensiones` con un único valor en toda la serie pasan a `constantes`.
+    """
+    return _a_columnar([d[0] for d in cursor.description], cursor.fetchall(), dimensiones)
+
+def _a_columnar(nombres, filas, dimensiones=()):
+    """Transpone una lista de tuplas (ver _leer_columnar)."""
+    if not filas:
+        return {'n': 0, 'constantes': {}, 'columnas': {nombre: [] for nombre in nombres}}
+
+    columnas = dict(zip(nombres, map(list, zip(*filas))))
+    constantes = {}
+    for dimension in dimensiones:
+        valores = columnas[dimension]
+        if valores.count(valores[0]) == len(valores):
+            constantes[dimension] = valores[0]
+            del columnas[dimension]
+    return {'n': len(filas), 'constantes': constantes, 'columnas': columnas}
+
+def get_faena_columnar(conn, start_date, end_date, categoria=None, raza=None, rango_peso=None, formato_fecha='iso',
+                       desde_version=None):
+    """Mismas filas que get_faena_historico, en formato columnar."""
+    where, params = _filtros_faena(start_date, end_date, categoria, raza, rango_peso, desde_version)
+    query = f"""
+        SELECT
+            {_expresion_fecha('fecha_consulta', formato_fecha)} AS fecha_consulta,
+            precio_promedio_kg,
+            cabezas,
+            variacion_semanal_precio,
+            categoria_original,
+            raza,
+            rango_peso
+        FROM faena
+        WHERE {where}
+        ORDER BY faena.fecha_consulta ASC
+    """
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    cursor.execute(query, tuple(params))
+    return _leer_columnar(cursor, ('categoria_original', 'raza', 'rango_peso'))
+
+def get_invernada_columnar(conn, start_date, end_date, categoria=None, formato_fecha='iso', desde_version=None):
+    """Mismas filas que get_invernada_historico, en formato columnar."""
+    where, params = _filtros_invernada(start_date, end_date, categoria, desde_version)
+    query = f"""
+        SELECT
+            {_expresion_fecha('fecha_consulta_inicio', formato_fecha)} AS fecha_consulta_inicio,
+            {_expresion_fecha('fecha_consulta_fin', formato_fecha)} AS fecha_consulta_fin,
+            precio_promedio_kg,
+            variacion_semanal_precio,
+            cabezas,
+            categoria_original
+        FROM invernada
+        WHERE {where}
+        ORDER BY invernada.fecha_consulta_fin ASC
+    """
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    cursor.execute(query, tuple(params))
+    return _leer_columnar(cursor, ('categoria_original',))
+
+
+# --- LECTURA INCREMENTAL (DELTA) ---
+# El Dashboard ya tiene cargada parte de una serie: con un cursor (versión de datos o fecha)
+# pide solo las filas insertadas o modificadas después, y recibe el cursor nuevo.
+# La versión se lee ANTES que las filas: si una escritura entra en medio, sus filas pueden
+# volver a enviarse en el próximo delta (el merge del cliente es idempotente), pero no se pierden.
+# Los borrados no se informan: la ingesta solo agrega o reemplaza filas.
+
+def resolver_cursor(conn, desde):
+    """
+    Versión a partir de la cual hay que enviar cambios. `desde` es una versión (entero) o una
+    fecha/fecha-hora ISO (se toma la versión vigente en ese momento). Devuelve None si la fecha es
+    anterior al historial de versiones: hay que enviar todo. Lanza ValueError si es inválido.
+    """
+    if isinstance(desde, int) or str(desde).isdigit():
+        return int(desde)
+    momento = datetime.fromisoformat(str(desde)).isoformat(timespec='seconds')
+    cursor = conn.cursor()
+    cursor.execute("SELECT MAX(version) FROM historial_versiones WHERE actualizada <= ?", (momento,))
+    return cursor.fetchone()[0]
+
+def _get_cambios(conn, leer, desde, formato_fecha):
+    version, _ = get_version_datos_db(conn)
+    desde_version = resolver_cursor(conn, desde)
+    filas = leer(desde_version)
+    if formato_fecha:
+        return dict(filas, cursor=version, desde_version=desde_version)
+    return {'cursor': version, 'desde_version': desde_version, 'datos': filas}
+
+def get_faena_cambios(conn, start_date, end_date, categoria=None, raza=None, rango_peso=None, desde=0,
+                      formato_fecha=None):
+    """
+    Filas de Faena del rango cambiadas después del cursor `desde`, con el cursor nuevo:
+    {'cursor', 'desde_version', 'datos': [...]} o, con `formato_fecha`, el formato columnar más esas claves.
+    """
+    def leer(desde_version):
+        if formato_fecha:
+            return get_faena_columnar(conn, start_date, end_date, categoria, raza, rango_peso,
+                                      formato_fecha=formato_fecha, desde_version=desde_version)
+        return get_faena_historico(conn, start_date, end_date, categoria, raza, rango_peso, desde_version=desde_version)
+    return _get_cambios(conn, leer, desde, formato_fecha)
+
+def get_invernada_cambios(conn, start_date, end_date, categoria=None, desde=0, formato_fecha=None):
+    """Como get_faena_cambios, para Invernada."""
+    def leer(desde_version):
+        if formato_fecha:
+            return get_invernada_columnar(conn, start_date, end_date, categoria,
+                                          formato_fecha=formato_fecha, desde_version=desde_version)
+        return get_invernada_historico(conn, start_date, end_date, categoria, desde_version=desde_version)
+    return _get_cambios(conn, leer, desde, formato_fecha)
+
+
+# --- ROLLUPS SEMANALES / MENSUALES ---
+# Tablas faena_rollup / invernada_rollup: una fila por (tipo de período, serie, período).
+# Guardan componentes aditivos (sumas, conteos, mín/máx) en vez de promedios, para poder
+# combinar varias series o períodos sin perder exactitud. La ingesta recalcula solo los
+# períodos tocados dentro de su misma transacción.
+
+TIPOS_ROLLUP = ('semanal', 'mensual')
+
+COMPONENTES_ROLLUP = """
+    COUNT(*) AS registros,
+    COUNT(precio_promedio_kg) AS registros_con_precio,
+    SUM(precio_promedio_kg) AS suma_precio,
+    SUM(precio_promedio_kg * cabezas) AS suma_precio_x_cabezas,
+    SUM(CASE WHEN precio_promedio_kg IS NOT NULL THEN cabezas END) AS cabezas_con_precio,
+    SUM(cabezas) AS cabezas,
+    MIN(precio_promedio_kg) AS precio_min,
+    MAX(precio_promedio_kg) AS precio_max"""
+
+_COLUMNAS_COMPONENTES = ['registros', 'registros_con_precio', 'suma_precio', 'suma_precio_x_cabezas',
+                         'cabezas_con_precio', 'cabezas', 'precio_min', 'precio_max']
+
+ROLLUPS = {
+    'faena': {
+        'tabla_rollup': 'faena_rollup',
+        'columna_fecha': 'fecha_consulta',
+        'serie': ['categoria_original', 'raza', 'rango_peso'],
+        # Precio ponderado por kilos: solo filas con importe y kilos informados
+        'componentes_extra': """,
+    SUM(CASE WHEN kilos_total > 0 THEN importe_total END) AS importe_total,
+    SUM(CASE WHEN importe_total IS NOT NULL THEN kilos_total END) AS kilos_total""",
+        'columnas_componentes': _COLUMNAS_COMPONENTES + ['importe_total', 'kilos_total'],
+        'metricas_extra': "SUM(importe_total) * 1.0 / SUM(kilos_total) AS precio_ponderado_kilos,",
+    },
+    'invernada': {
+        'tabla_rollup': 'invernada_rollup',
+        'columna_fecha': 'fecha_consulta_fin',
+        'serie': ['categoria_original'],
+        'componentes_extra': "",
+        'columnas_componentes': _COLUMNAS_COMPONENTES,
+        'metricas_extra': "",
+    },
+}
+
+def _crear_tabla_rollup(cursor, tabla):
+    """Crea la tabla de rollup; si no existía y hay datos crudos, la puebla (bases existentes)."""
+    spec = ROLLUPS[tabla]
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (spec['tabla_rollup'],))
+    existia = cursor.fetchone() is not None
+
+    # raza / rango_peso se guardan como '' en lugar de NULL para que formen parte de la PK
+    columnas_serie = ",\n".join(
+        f"{col} TEXT NOT NULL" + ("" if col == 'categoria_original' else " DEFAULT ''") for col in spec['serie']
+    )
+    columnas_extra = "importe_total REAL,\n kilos_total REAL," if tabla == 'faena' else ""
+    cursor.execute(f"""
+    CREATE TABLE IF NOT EXISTS {spec['tabla_rollup']} (
+        tipo_periodo TEXT NOT NULL,
+        {columnas_serie},
+        periodo TEXT NOT NULL,
+        registros INTEGER NOT NULL,
+        registros_con_precio INTEGER NOT NULL,
+        suma_precio REAL,
+        suma_precio_x_cabezas REAL,
+        cabezas_con_precio INTEGER,
+        cabezas INTEGER,
+        precio_min REAL,
+        precio_max REAL,
+        {columnas_extra}
+        PRIMARY KEY (tipo_periodo, {', '.join(spec['serie'])}, periodo)
+    ) WITHOUT ROWID
+    """)
+    if not existia:
+        for tipo in TIPOS_ROLLUP:
+            _reconstruir_rollup(cursor, tabla, tipo)
+
+def _reconstruir_rollup(cursor, tabla, tipo, desde=None, hasta=None):
+    """
+    Recalcula (DELETE + INSERT ... SELECT) los períodos de `tipo` entre `desde` y `hasta`,
+    fechas ISO alineadas a inicio/fin de período. Sin rango, reconstruye todo. No hace commit.
+    """
+    spec = ROLLUPS[tabla]
+    columna_fecha = spec['columna_fecha']
+    periodo = EXPRESION_PERIODO[tipo].format(col=columna_fecha)
+    serie_sql = ", ".join(f"COALESCE({col}, '')" if col != 'categoria_original' else col for col in spec['serie'])
+
+    if desde is None:
+        cursor.execute(f"DELETE FROM {spec['tabla_rollup']} WHERE tipo_periodo = ?", (tipo,))
+        where, params = f"{columna_fecha} IS NOT NULL", []
+    else:
+        cursor.execute(f"DELETE FROM {spec['tabla_rollup']} WHERE tipo_periodo = ? AND periodo BETWEEN ? AND ?",
+                       (tipo, desde, hasta))
+        where, params = f"{columna_fecha} BETWEEN ? AND ?", [desde, hasta]
+
+    cursor.execute(f"""
+        INSERT INTO {spec['tabla_rollup']} (
+            tipo_periodo, {', '.join(spec['serie'])}, periodo, {', '.join(spec['columnas_componentes'])}
+        )
+        SELECT ?, {serie_sql}, {periodo}, {COMPONENTES_ROLLUP + spec['componentes_extra']}
+        FROM {tabla}
+        WHERE {where}
+        GROUP BY {serie_sql}, {periodo}
+    """, tuple([tipo] + params))
+
+def _actualizar_rollups(cursor, tabla, fechas_iso):
+    """Recalcula solo los períodos (semanas y meses) que contienen alguna de las fechas insertadas."""
+    for tipo in TIPOS_ROLLUP:
+        inicios = {_inicio_periodo(tipo, datetime.strptime(f, "%Y-%m-%d")) for f in fechas_iso if f}
+        for inicio in sorted(inicios):
+            _reconstruir_rollup(cursor, tabla, tipo,
+                                inicio.strftime("%Y-%m-%d"), _fin_periodo(tipo, inicio).strftime("%Y-%m-%d"))
+
+def reconstruir_rollups(conn):
+    """Reconstruye (one-shot) todos los rollups desde las tablas crudas. Devuelve filas por tabla."""
+    try:
+        cursor = conn.cursor()
+        resultado = {}
+        for tabla, spec in ROLLUPS.items():
+            for tipo in TIPOS_ROLLUP:
+                _reconstruir_rollup(cursor, tabla, tipo)
+            cursor.execute(f"SELECT COUNT(*) FROM {spec['tabla_rollup']}")
+            resultado[spec['tabla_rollup']] = cursor.fetchone()[0]
+        _incrementar_version_datos(cursor)
+        conn.commit()
+        _publicar_version_datos(conn)
+        return resultado
+    except sqlite3.Error as e:
+        logger.error(f"Error reconstruyendo rollups de precios: {e}")
+        conn.rollback()
+        return {}
+
+def _inicio_periodo(tipo, fecha):
+    """Misma regla que EXPRESION_PERIODO: lunes de la semana o día 1 del mes."""
+    if tipo == 'semanal':
+        return fecha - timedelta(days=fecha.weekday())
+    return fecha.replace(day=1)
+
+def _fin_periodo(tipo, inicio):
+    if tipo == 'semanal':
+        return inicio + timedelta(days=6)
+    return (inicio.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+
+def _periodos_completos(tipo, start_date, end_date):
+    """
+    Períodos de `tipo` enteramente contenidos en [start_date, end_date]:
+    (inicio del primero, inicio del último, fin del último) en ISO, o None si no hay ninguno.
+    """
+    try:
+        inicio = datetime.strptime(start_date, "%Y-%m-%d")
+        fin = datetime.strptime(end_date, "%Y-%m-%d")
+    except (ValueError, TypeError):
+        return None
+
+    primero = _inicio_periodo(tipo, inicio)
+    if primero < inicio:
+        primero = _fin_periodo(tipo, primero) + timedelta(days=1)
+    ultimo = _inicio_periodo(tipo, fin)
+    if _fin_periodo(tipo, ultimo) > fin:
+        ultimo = _inicio_periodo(tipo, ultimo - timedelta(days=1))
+    if primero > ultimo:
+        return None
+    return (primero.strftime("%Y-%m-%d"), ultimo.strftime("%Y-%m-%d"),
+            _fin_periodo(tipo, ultimo).strftime("%Y-%m-%d"))
+
+def _dia_anterior(fecha_iso):
+    return (datetime.strptime(fecha_iso, "%Y-%m-%d") - timedelta(days=1)).strftime("%Y-%m-%d")
+
+def _dia_siguiente(fecha_iso):
+    return (datetime.strptime(fecha_iso, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d")
+
+def get_categorias_precios(conn):
+    """Listas crudas (sin filtrar) de categorías de Faena e Invernada."""
+    cursor = conn.cursor()
+    
+    cursor.execute("SELECT DISTINCT categoria_original FROM faena ORDER BY categoria_original")
+    categorias_faena = [r[0] for r in cursor.fetchall()]
+    
+    cursor.execute("SELECT DISTINCT categoria_original FROM invernada ORDER BY categoria_original")
+    categorias_invernada = [r[0] for r in cursor.fetchall()]
+    
+    return categorias_faena, categorias_invernada
+
+def get_subcategorias_faena(conn, categoria, raza=None):
+    """Razas y rangos de peso disponibles para una categoría de Faena (opcionalmente acotado a una raza)."""
+    cursor = conn.cursor()
+    
+    cursor.execute("SELECT DISTINCT raza FROM faena WHERE categoria_original = ? AND raza != '' ORDER BY raza", (categoria,))
+    razas = [r[0] for r in cursor.fetchall()]
+    
+    query_peso = "SELECT DISTINCT rango_peso FROM faena WHERE categoria_original = ? AND rango_peso != ''"
+    params_peso = [categoria]
+    if raza:
+        query_peso += " AND raza = ?"
+        params_peso.append(raza)
+    query_peso += " ORDER BY rango_peso"
+    
+    cursor.execute(query_peso, tuple(params_peso))
+    pesos = [r[0] for r in cursor.fetchall()]
+    
+    return razas, pesos
+
+
+# --- ÁRBOL DE CATEGORÍAS (CATÁLOGO DE SERIES) ---
+# La ingesta arma el árbol categoría -> raza -> rango de peso (Faena) y la lista de
+# categorías (Invernada), ya filtrados, con el rango de fechas disponible en cada nivel.
+# Se guarda como JSON en la tabla metadatos: el Dashboard lo recibe entero en una sola
+# lectura por clave, sin DISTINCT sobre las tablas crudas.
+
+# --- LISTA NEGRA (Filtros Visuales) ---
+CATEGORIAS_EXCLUIDAS = ["Ternera Holando", "Vacas CUT con cría", "TERNERAS", "NOVILLOS + CRUZA CEBU", "NOVILLOS + CRUZA EUROPEA"]
+_EXCLUIDAS_MINUSCULAS = {c.lower() for c in CATEGORIAS_EXCLUIDAS}
+
+def categoria_visible(tipo, categoria):
+    """Lista negra del Dashboard; en Faena además se descartan las cruzas."""
+    nombre = (categoria or '').lower()
+    if nombre in _EXCLUIDAS_MINUSCULAS:
+        return False
+    return not (tipo == 'faena' and 'cruza' in nombre)
+
+def _rango(nodos):
+    return min(n['desde'] for n in nodos), max(n['hasta'] for n in nodos)
+
+def _construir_catalogo(cursor):
+    """Arma el árbol filtrado a partir de las tablas crudas (un GROUP BY por tabla)."""
+    cursor.execute("""
+        SELECT categoria_original, COALESCE(raza, ''), COALESCE(rango_peso, ''),
+               MIN(fecha_consulta), MAX(fecha_consulta), COUNT(*)
+        FROM faena
+        GROUP BY categoria_original, COALESCE(raza, ''), COALESCE(rango_peso, '')
+        ORDER BY 1, 2, 3
+    """)
+    faena = {}
+    for categoria, raza, rango_peso, desde, hasta, registros in cursor.fetchall():
+        if categoria_visible('faena', categoria):
+            razas = faena.setdefault(categoria, {})
+            razas.setdefault(raza, []).append(
+                {'rango_peso': rango_peso, 'desde': desde, 'hasta': hasta, 'registros': registros}
+            )
+
+    arbol_faena = []
+    for categoria, razas in faena.items():
+        nodos_raza = []
+        for raza, pesos in razas.items():
+            desde, hasta = _rango(pesos)
+            nodos_raza.append({'raza': raza, 'desde': desde, 'hasta': hasta, 'pesos': pesos})
+        desde, hasta = _rango(nodos_raza)
+        arbol_faena.append({'categoria': categoria, 'desde': desde, 'hasta': hasta, 'razas': nodos_raza})
+
+    cursor.execute("""
+        SELECT categoria_original, MIN(fecha_consulta_fin), MAX(fecha_consulta_fin), COUNT(*)
+        FROM invernada
+        WHERE fecha_consulta_fin IS NOT NULL
+        GROUP BY categoria_original
+        ORDER BY 1
+    """)
+    invernada = [
+        {'categoria': categoria, 'desde': desde, 'hasta': hasta, 'registros': registros}
+        for categoria, desde, hasta, registros in cursor.fetchall()
+        if categoria_visible('invernada', categoria)
+    ]
+    return {'faena': arbol_faena, 'invernada': invernada}
+
+def _actualizar_catalogo(cursor):
+    """Recalcula y guarda el catálogo (no hace commit)."""
+    catalogo = _construir_catalogo(cursor)
+    cursor.execute("""
+        INSERT INTO metadatos (clave, valor) VALUES ('catalogo_series', ?)
+        ON CONFLICT(clave) DO UPDATE SET valor = excluded.valor
+    """, (json.dumps(catalogo, ensure_ascii=False),))
+    return catalogo
+
+def get_catalogo_series(conn):
+    """
+    Árbol de series para el Dashboard:
+    {'faena': [{categoria, desde, hasta, razas: [{raza, desde, hasta, pesos: [{rango_peso, desde, hasta, registros}]}]}],
+     'invernada': [{categoria, desde, hasta, registros}]}
+    Fechas ISO. Si todavía no se guardó (base previa a esta versión), se calcula en el momento.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT valor FROM metadatos WHERE clave = 'catalogo_series'")
+    fila = cursor.fetchone()
+    if fila:
+        return json.loads(fila[0])
+    return _construir_catalogo(cursor)
+
 # --- MÉTODOS DE MARKETPLACE (Nuevos) ---
 
 def get_usuario_por_email(conn, email):
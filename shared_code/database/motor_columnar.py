@@ -0,0 +1,530 @@
+"""
+Motor de lectura columnar en memoria (NumPy) para las series de precios.
+
+precios_historicos.db pesa unos pocos MB: entra entera en la memoria de cada worker. El motor
+la carga una vez como arreglos por serie, ordenados por fecha:
+    fechas   -> int32, días desde 1970-01-01
+    precios, variación, kilos, importe -> float64 (NaN = NULL)
+    cabezas  -> int32 con máscara de nulos
+y responde rangos, buckets, variación y resúmenes con searchsorted y reducciones vectorizadas,
+sin SQL, sin sqlite3.Row y sin dicts intermedios.
+
+- Se recarga cuando cambia la versión de datos de la base (ver db_manager.get_version_datos_db).
+- get_faena_historico, get_faena_agrupado, get_faena_resumen (y los de Invernada) tienen la
+  firma de los de db_manager y devuelven los mismos resultados: son un backend intercambiable,
+  que la web elige con MOTOR_PRECIOS=numpy. Si el motor no puede responder (base sin cargar,
+  fechas que no son ISO, lecturas incrementales) delegan en la consulta SQL.
+- Los promedios se suman en otro orden que en SQLite: pueden diferir en el último decimal.
+"""
+import os
+import sys
+import sqlite3
+import threading
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+# --- LOGGING SETUP ---
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(os.path.dirname(current_dir))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from shared_code.logger_config import setup_logger
+from shared_code.database import db_manager
+logger = setup_logger('Motor_Columnar')
+
+# Backend de lectura de las series en la web: 'sqlite' (consultas) o 'numpy' (este motor)
+MOTOR_PRECIOS = os.environ.get('MOTOR_PRECIOS', 'sqlite')
+
+EPOCA = date(1970, 1, 1)
+SIN_FECHA = np.iinfo(np.int32).min  # fecha_consulta_inicio NULL (Invernada)
+
+# Columnas cargadas por tabla: dimensiones de la serie, fecha del eje y valores reales
+ESPECIFICACION = {
+    'faena': {
+        'dimensiones': ('categoria_original', 'raza', 'rango_peso'),
+        'columna_fecha': 'fecha_consulta',
+        'reales': ('precio_promedio_kg', 'variacion_semanal_precio', 'kilos_total', 'importe_total'),
+        'fecha_extra': None,
+    },
+    'invernada': {
+        'dimensiones': ('categoria_original',),
+        'columna_fecha': 'fecha_consulta_fin',
+        'reales': ('precio_promedio_kg', 'variacion_semanal_precio'),
+        'fecha_extra': 'fecha_consulta_inicio',
+    },
+}
+
+
+def _dia(fecha_iso):
+    """'YYYY-MM-DD' -> días desde 1970-01-01. Lanza ValueError si no es una fecha ISO completa."""
+    if not isinstance(fecha_iso, str) or len(fecha_iso) != 10:
+        raise ValueError(f"Fecha no ISO: {fecha_iso!r}")
+    return (datetime.strptime(fecha_iso, '%Y-%m-%d').date() - EPOCA).days
+
+
+def _lista(valores, nulos=None):
+    """Arreglo -> lista de Python; NaN (o `nulos`) -> None, como devuelve sqlite3 para NULL."""
+    if nulos is None:
+        nulos = np.isnan(valores) if valores.dtype.kind == 'f' else np.zeros(len(valores), dtype=bool)
+    if not nulos.any():
+        return valores.tolist()
+    objetos = valores.astype(object)
+    objetos[nulos] = None
+    return objetos.tolist()
+
+
+def _periodo(dias, agrupacion):
+    """Primer día del período de cada fecha (misma regla que db_manager.EXPRESION_PERIODO)."""
+    if agrupacion == 'diario':
+        return dias
+    if agrupacion == 'semanal':
+        return dias - (dias + 3) % 7  # 1970-01-01 fue jueves: lunes de la semana
+    return dias.astype('datetime64[D]').astype('datetime64[M]').astype('datetime64[D]').astype(np.int32)
+
+
+class Serie:
+    """Columnas de una serie (una combinación de dimensiones), ordenadas por fecha."""
+    __slots__ = ('clave', 'dias', 'columnas', 'cabezas', 'cabezas_nulas')
+
+    def __init__(self, clave, dias, columnas, cabezas, cabezas_nulas):
+        self.clave = clave
+        self.dias = dias
+        self.columnas = columnas
+        self.cabezas = cabezas
+        self.cabezas_nulas = cabezas_nulas
+
+
+class Recorte:
+    """Filas de una o varias series dentro de un rango, ordenadas por fecha."""
+    __slots__ = ('claves', 'indice', 'dias', 'columnas', 'cabezas', 'cabezas_nulas')
+
+    def __len__(self):
+        return len(self.dias)
+
+
+class MotorColumnar:
+    def __init__(self, series, version=None):
+        self.version = version
+        self._series = series
+        self._por_categoria = {
+            tabla: self._indexar(por_clave) for tabla, por_clave in series.items()
+        }
+        self._preparar_textos()
+
+    @staticmethod
+    def _indexar(por_clave):
+        indice = {}
+        for clave, serie in por_clave.items():
+            indice.setdefault(clave[0], []).append(serie)
+        return indice
+
+    # --- CARGA ---
+
+    @classmethod
+    def cargar(cls, conn, version=None):
+        return cls({tabla: cls._cargar_tabla(conn, tabla) for tabla in ESPECIFICACION}, version)
+
+    @staticmethod
+    def _cargar_tabla(conn, tabla):
+        """Una consulta ordenada por serie y fecha; cada serie es un tramo contiguo de los arreglos."""
+        spec = ESPECIFICACION[tabla]
+        dimensiones = spec['dimensiones']
+        columna_fecha = spec['columna_fecha']
+        seleccion = list(dimensiones) + [
+            db_manager._expresion_fecha(columna_fecha, 'epoch_day'),
+            db_manager._expresion_fecha(spec['fecha_extra'], 'epoch_day') if spec['fecha_extra'] else 'NULL',
+            'cabezas',
+        ] + list(spec['reales'])
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        cursor.execute(f"""
+            SELECT {', '.join(seleccion)} FROM {tabla}
+            WHERE {columna_fecha} IS NOT NULL
+            ORDER BY {', '.join(dimensiones)}, {columna_fecha}
+        """)
+        filas = cursor.fetchall()
+        if not filas:
+            return {}
+
+        n = len(dimensiones)
+        valores = list(zip(*filas))
+        dias = np.array(valores[n], dtype=np.int32)
+        extra = np.array(valores[n + 1], dtype=np.float64)
+        extra = np.where(np.isnan(extra), SIN_FECHA, extra).astype(np.int32)
+        cabezas = np.array(valores[n + 2], dtype=np.float64)
+        cabezas_nulas = np.isnan(cabezas)
+        cabezas = np.where(cabezas_nulas, 0, cabezas).astype(np.int32)
+        reales = {nombre: np.array(valores[n + 3 + i], dtype=np.float64) for i, nombre in enumerate(spec['reales'])}
+        if spec['fecha_extra']:
+            reales[spec['fecha_extra']] = extra
+
+        claves = list(zip(*valores[:n]))
+        cortes = [0] + [i for i in range(1, len(claves)) if claves[i] != claves[i - 1]] + [len(claves)]
+        series = {}
+        for inicio, fin in zip(cortes, cortes[1:]):
+            tramo = slice(inicio, fin)
+            series[claves[inicio]] = Serie(
+                claves[inicio], dias[tramo], {nombre: arreglo[tramo] for nombre, arreglo in reales.items()},
+                cabezas[tramo], cabezas_nulas[tramo],
+            )
+        return series
+
+    def _preparar_textos(self):
+        """Tablas de texto por día (ISO y DD/MM/YYYY) que cubren todas las fechas y sus períodos."""
+        extremos = [s.dias[[0, -1]] for por_clave in self._series.values() for s in por_clave.values()]
+        if extremos:
+            todos = np.concatenate(extremos)
+            self._base = int(todos.min()) - 31  # Margen: el inicio de semana/mes puede ser anterior al dato
+            tope = int(todos.max()) + 1
+        else:
+            self._base, tope = 0, 0
+        for serie in (s for por_clave in self._series.values() for s in por_clave.values()):
+            inicio = serie.columnas.get('fecha_consulta_inicio')
+            if inicio is not None and (inicio != SIN_FECHA).any():
+                validos = inicio[inicio != SIN_FECHA]
+                self._base = min(self._base, int(validos.min()))
+                tope = max(tope, int(validos.max()) + 1)
+        iso = np.datetime_as_string(np.arange(self._base, max(tope, self._base)).astype('datetime64[D]'))
+        self._iso = iso.astype(object)
+        self._dmy = np.array([f"{t[8:10]}/{t[5:7]}/{t[:4]}" for t in iso.tolist()], dtype=object)
+
+    def _textos(self, dias, formato_fecha):
+        """Días -> lista de fechas en el formato pedido (None = DD/MM/YYYY, como strftime en SQL)."""
+        if formato_fecha == 'epoch_day':
+            return _lista(dias, dias == SIN_FECHA)
+        if formato_fecha not in (None, 'iso'):
+            raise ValueError(f"Formato de fecha inválido: {formato_fecha}")
+        tabla = self._iso if formato_fecha == 'iso' else self._dmy
+        nulos = dias == SIN_FECHA
+        textos = tabla[np.where(nulos, self._base, dias) - self._base]
+        if nulos.any():
+            textos[nulos] = None
+        return textos.tolist()
+
+    # --- SELECCIÓN POR RANGO ---
+
+    def _seleccionar(self, tabla, filtros):
+        """Series que cumplen los filtros informados (mismo criterio que db_manager._filtro_rango)."""
+        categoria = filtros[0]
+        candidatas = self._por_categoria[tabla].get(categoria, []) if categoria else self._series[tabla].values()
+        return [s for s in candidatas if all(not valor or s.clave[i] == valor for i, valor in enumerate(filtros))]
+
+    def recortar(self, tabla, start_date, end_date, filtros):
+        """Filas de las series seleccionadas con fecha en [start_date, end_date], ordenadas por fecha."""
+        inicio, fin = _dia(start_date), _dia(end_date)
+        partes = []
+        for serie in self._seleccionar(tabla, filtros):
+            a = np.searchsorted(serie.dias, inicio, side='left')
+            b = np.searchsorted(serie.dias, fin, side='right')
+            if b > a:
+                partes.append((serie, slice(a, b)))
+
+        recorte = Recorte()
+        recorte.claves = [serie.clave for serie, _ in partes]
+        if len(partes) == 1:
+            serie, tramo = partes[0]
+            recorte.indice = np.zeros(tramo.stop - tramo.start, dtype=np.int32)
+            recorte.dias = serie.dias[tramo]
+            recorte.columnas = {nombre: arreglo[tramo] for nombre, arreglo in serie.columnas.items()}
+            recorte.cabezas, recorte.cabezas_nulas = serie.cabezas[tramo], serie.cabezas_nulas[tramo]
+            return recorte
+
+        # Varias series: se concatenan y se ordenan por fecha (estable: a igual fecha, orden de serie)
+        nombres = list(ESPECIFICACION[tabla]['reales']) + (
+            [ESPECIFICACION[tabla]['fecha_extra']] if ESPECIFICACION[tabla]['fecha_extra'] else [])
+        if partes:
+            dias = np.concatenate([serie.dias[tramo] for serie, tramo in partes])
+            orden = np.argsort(dias, kind='stable')
+            unir = lambda extraer: np.concatenate([extraer(serie)[tramo] for serie, tramo in partes])[orden]
+            recorte.indice = np.repeat(np.arange(len(partes), dtype=np.int32),
+                                       [tramo.stop - tramo.start for _, tramo in partes])[orden]
+            recorte.dias = dias[orden]
+            recorte.columnas = {nombre: unir(lambda s: s.columnas[nombre]) for nombre in nombres}
+            recorte.cabezas = unir(lambda s: s.cabezas)
+            recorte.cabezas_nulas = unir(lambda s: s.cabezas_nulas)
+        else:
+            recorte.indice = np.zeros(0, dtype=np.int32)
+            recorte.dias = np.zeros(0, dtype=np.int32)
+            recorte.columnas = {nombre: np.zeros(0, dtype=np.int32 if nombre.startswith('fecha') else np.float64)
+                                for nombre in nombres}
+            recorte.cabezas = np.zeros(0, dtype=np.int32)
+            recorte.cabezas_nulas = np.zeros(0, dtype=bool)
+        return recorte
+
+    # --- HISTÓRICO (FILAS) ---
+
+    def faena_historico(self, start_date, end_date, categoria=None, raza=None, rango_peso=None):
+        """Mismas filas que db_manager.get_faena_historico."""
+        r = self.recortar('faena', start_date, end_date, (categoria, raza, rango_peso))
+        claves = [r.claves[i] for i in r.indice.tolist()]
+        return [
+            {'fecha_consulta': fecha, 'precio_promedio_kg': precio, 'cabezas': cabezas,
+             'categoria_original': clave[0], 'raza': clave[1], 'rango_peso': clave[2],
+             'variacion_semanal_precio': variacion}
+            for fecha, precio, cabezas, clave, variacion in zip(
+                self._textos(r.dias, None), _lista(r.columnas['precio_promedio_kg']),
+                _lista(r.cabezas, r.cabezas_nulas), claves, _lista(r.columnas['variacion_semanal_precio']))
+        ]
+
+    def invernada_historico(self, start_date, end_date, categoria=None):
+        """Mismas filas que db_manager.get_invernada_historico."""
+        r = self.recortar('invernada', start_date, end_date, (categoria,))
+        claves = [r.claves[i] for i in r.indice.tolist()]
+        return [
+            {'fecha_consulta_inicio': inicio, 'fecha_consulta_fin': fin, 'categoria_original': clave[0],
+             'precio_promedio_kg': precio, 'variacion_semanal_precio': variacion, 'cabezas': cabezas}
+            for inicio, fin, clave, precio, variacion, cabezas in zip(
+                self._textos(r.columnas['fecha_consulta_inicio'], None), self._textos(r.dias, None), claves,
+                _lista(r.columnas['precio_promedio_kg']), _lista(r.columnas['variacion_semanal_precio']),
+                _lista(r.cabezas, r.cabezas_nulas))
+        ]
+
+    # --- BUCKETS ---
+
+    @staticmethod
+    def _componentes(r, tramos):
+        """
+        Componentes aditivos por tramo (los de db_manager.COMPONENTES_ROLLUP) con reduceat.
+        `tramos` son los índices de inicio de cada grupo en el recorte ya ordenado por grupo.
+        """
+        precio = r.columnas['precio_promedio_kg']
+        cabezas = np.where(r.cabezas_nulas, np.nan, r.cabezas.astype(np.float64))
+        con_precio = ~np.isnan(precio)
+        par = con_precio & ~r.cabezas_nulas
+        suma = lambda valores: np.add.reduceat(valores, tramos)
+        componentes = {
+            'registros': np.diff(np.append(tramos, len(r))),
+            'registros_con_precio': suma(con_precio.astype(np.int64)),
+            'suma_precio': suma(np.where(con_precio, precio, 0.0)),
+            'suma_precio_x_cabezas': suma(np.where(par, precio * cabezas, 0.0)),
+            'cabezas_con_precio': suma(np.where(par, cabezas, 0.0)),
+            'registros_con_cabezas': suma((~r.cabezas_nulas).astype(np.int64)),
+            'cabezas': suma(np.where(r.cabezas_nulas, 0, r.cabezas).astype(np.int64)),
+            'precio_min': np.fmin.reduceat(precio, tramos),
+            'precio_max': np.fmax.reduceat(precio, tramos),
+        }
+        if 'importe_total' in r.columnas:
+            importe, kilos = r.columnas['importe_total'], r.columnas['kilos_total']
+            con_importe = ~np.isnan(importe)
+            con_kilos = con_importe & (kilos > 0)
+            componentes['importe_total'] = suma(np.where(con_kilos, importe, 0.0))
+            componentes['registros_importe'] = suma(con_kilos.astype(np.int64))
+            componentes['kilos_total'] = suma(np.where(con_importe & ~np.isnan(kilos), kilos, 0.0))
+        return componentes
+
+    @staticmethod
+    def _cociente(numerador, denominador, validos=None):
+        """numerador / denominador; NaN si el denominador es 0 (SQLite devuelve NULL)."""
+        validos = denominador != 0 if validos is None else validos & (denominador != 0)
+        return np.where(validos, numerador / np.where(denominador != 0, denominador, 1), np.nan)
+
+    def agrupado(self, tabla, start_date, end_date, filtros, agrupacion='auto', formato_fecha=None):
+        """Mismo resultado que db_manager.get_*_agrupado: (agrupacion_aplicada, filas o dict columnar)."""
+        if agrupacion not in db_manager.AGRUPACIONES:
+            raise ValueError(f"Agrupación inválida: {agrupacion}")
+        r = self.recortar(tabla, start_date, end_date, filtros)
+        if agrupacion == 'auto':
+            fechas = len(np.unique(r.dias))
+            agrupacion = ('mensual' if fechas > db_manager.UMBRAL_AUTO_MENSUAL
+                          else 'semanal' if fechas > db_manager.UMBRAL_AUTO_SEMANAL else 'diario')
+
+        periodo = _periodo(r.dias, agrupacion)
+        orden = np.argsort(periodo, kind='stable')
+        periodo = periodo[orden]
+        ordenado = Recorte()
+        ordenado.dias = r.dias[orden]
+        ordenado.columnas = {nombre: arreglo[orden] for nombre, arreglo in r.columnas.items()}
+        ordenado.cabezas, ordenado.cabezas_nulas = r.cabezas[orden], r.cabezas_nulas[orden]
+        tramos = np.flatnonzero(np.append(True, periodo[1:] != periodo[:-1])) if len(periodo) else np.zeros(0, int)
+
+        clave_fecha = ESPECIFICACION[tabla]['columna_fecha']
+        columnas = {clave_fecha: self._textos(periodo[tramos], formato_fecha)}
+        if len(tramos):
+            c = self._componentes(ordenado, tramos)
+            columnas['precio_promedio_kg'] = _lista(self._cociente(c['suma_precio'], c['registros_con_precio']))
+            columnas['precio_ponderado_kg'] = _lista(self._cociente(c['suma_precio_x_cabezas'], c['cabezas_con_precio']))
+            if tabla == 'faena':
+                columnas['precio_ponderado_kilos'] = _lista(
+                    self._cociente(c['importe_total'], c['kilos_total'], c['registros_importe'] > 0))
+            columnas['cabezas'] = _lista(c['cabezas'], c['registros_con_cabezas'] == 0)
+            columnas['precio_promedio_min'] = _lista(c['precio_min'])
+            columnas['precio_promedio_max'] = _lista(c['precio_max'])
+            columnas['registros'] = c['registros'].tolist()
+        else:
+            nombres = ['precio_promedio_kg', 'precio_ponderado_kg'] + (['precio_ponderado_kilos'] if tabla == 'faena' else []) \
+                + ['cabezas', 'precio_promedio_min', 'precio_promedio_max', 'registros']
+            columnas.update({nombre: [] for nombre in nombres})
+
+        if formato_fecha:
+            return agrupacion, {'n': len(tramos), 'constantes': {}, 'columnas': columnas}
+        return agrupacion, [dict(zip(columnas, fila)) for fila in zip(*columnas.values())]
+
+    # --- VARIACIÓN SEMANAL ---
+
+    def variacion_semanal_faena(self, categoria, raza=None, rango_peso=None):
+        """
+        Variación semanal de una serie de Faena con la regla "as-of" de la ingesta (último precio
+        de la misma serie con fecha <= fecha - 7 días), calculada sobre los arreglos.
+        Devuelve {fecha_consulta, variacion_semanal_precio, fecha_referencia_variacion} (fechas ISO).
+        """
+        serie = self._series['faena'].get((categoria, raza, rango_peso))
+        if serie is None:
+            return {'fecha_consulta': [], 'variacion_semanal_precio': [], 'fecha_referencia_variacion': []}
+        referencia = np.searchsorted(serie.dias, serie.dias - 7, side='right') - 1
+        con_referencia = referencia >= 0
+        referencia = np.maximum(referencia, 0)
+        precio = serie.columnas['precio_promedio_kg']
+        precio_ref = np.where(con_referencia, precio[referencia], np.nan)
+        variacion = np.round(self._cociente(precio - precio_ref, precio_ref, precio_ref > 0) * 100, 2)
+        dias_ref = np.where(con_referencia, serie.dias[referencia], SIN_FECHA)
+        return {
+            'fecha_consulta': self._textos(serie.dias, 'iso'),
+            'variacion_semanal_precio': _lista(variacion),
+            'fecha_referencia_variacion': self._textos(dias_ref, 'iso'),
+        }
+
+    # --- RESUMEN (KPIs) ---
+
+    def _agregados(self, tabla, start_date, end_date, filtros):
+        r = self.recortar(tabla, start_date, end_date, filtros)
+        if not len(r):
+            return r, {'registros': None, 'cabezas_total': None, 'precio_promedio': None, 'precio_ponderado': None,
+                       'precio_min': None, 'precio_max': None}
+        c = self._componentes(r, np.zeros(1, dtype=np.intp))
+        valor = lambda arreglo: _lista(arreglo)[0]
+        return r, {
+            'registros': int(c['registros'][0]),
+            'cabezas_total': int(c['cabezas'][0]) if c['registros_con_cabezas'][0] else None,
+            'precio_promedio': valor(self._cociente(c['suma_precio'], c['registros_con_precio'])),
+            'precio_ponderado': valor(self._cociente(c['suma_precio_x_cabezas'], c['cabezas_con_precio'])),
+            'precio_min': valor(c['precio_min']),
+            'precio_max': valor(c['precio_max']),
+        }
+
+    def resumen(self, tabla, start_date, end_date, filtros):
+        """Mismo resultado que db_manager.get_*_resumen."""
+        r, resumen = self._agregados(tabla, start_date, end_date, filtros)
+        resumen['cabezas_total'] = resumen['cabezas_total'] or 0
+        resumen['registros'] = resumen['registros'] or 0
+
+        precio = r.columnas['precio_promedio_kg'] if len(r) else np.zeros(0)
+        for extremo in ('max', 'min'):
+            resumen[f'fecha_{extremo}'] = None
+            if resumen[f'precio_{extremo}'] is not None:
+                # La fecha más reciente en que se dio el extremo
+                resumen[f'fecha_{extremo}'] = self._textos(r.dias[precio == resumen[f'precio_{extremo}']][-1:], 'iso')[0]
+
+        resumen['fecha_ultimo'], resumen['precio_ultimo'] = None, None
+        con_precio = np.flatnonzero(~np.isnan(precio))
+        if len(con_precio):
+            ultimo_dia = r.dias[con_precio[-1]]
+            del_dia = (r.dias == ultimo_dia) & ~np.isnan(precio)
+            resumen['fecha_ultimo'] = self._textos(r.dias[con_precio[-1:]], 'iso')[0]
+            resumen['precio_ultimo'] = float(precio[del_dia].sum() / del_dia.sum())
+
+        inicio = datetime.strptime(start_date, '%Y-%m-%d').date()
+        dias = (datetime.strptime(end_date, '%Y-%m-%d').date() - inicio).days + 1
+        _, anterior = self._agregados(tabla, (inicio - timedelta(days=dias)).isoformat(),
+                                      (inicio - timedelta(days=1)).isoformat(), filtros)
+        resumen['precio_promedio_anterior'] = anterior['precio_promedio']
+        resumen['variacion_periodo'] = None
+        if anterior['precio_promedio'] and resumen['precio_promedio'] is not None:
+            resumen['variacion_periodo'] = round(
+                (resumen['precio_promedio'] - anterior['precio_promedio']) / anterior['precio_promedio'] * 100, 2)
+        return resumen
+
+
+# --- MOTOR DEL WORKER ---
+# Un motor por proceso, atado a (base, versión de datos). Leer la versión es una consulta por
+# clave sobre metadatos; la recarga completa ocurre una vez por versión y la hace un solo hilo.
+
+_motor = {'clave': None, 'valor': None}
+_motor_lock = threading.Lock()
+
+def _origen(conn):
+    for fila in conn.execute("PRAGMA database_list"):
+        if fila[1] == 'main':
+            return fila[2] or id(conn)  # Base en memoria: la identifica la conexión
+    return id(conn)
+
+def get_motor(conn):
+    """Motor con la versión vigente de la base de `conn` (lo recarga si cambió). None si no se puede cargar."""
+    try:
+        clave = (_origen(conn), db_manager.get_version_datos_db(conn)[0])
+        if _motor['clave'] == clave:
+            return _motor['valor']
+        with _motor_lock:
+            if _motor['clave'] != clave:
+                inicio = datetime.now()
+                _motor['valor'] = MotorColumnar.cargar(conn, version=clave[1])
+                _motor['clave'] = clave
+                logger.info(f"Motor columnar cargado (versión {clave[1]}) en "
+                            f"{(datetime.now() - inicio).total_seconds():.2f}s")
+            return _motor['valor']
+    except (sqlite3.Error, KeyError, ValueError, TypeError) as e:
+        logger.error(f"No se pudo cargar el motor columnar: {e}")
+        return None
+
+def precargar():
+    """Carga el motor al iniciar el worker (en un hilo aparte) para que el primer pedido no lo pague."""
+    with db_manager.get_pool(db_manager.DB_PRECIOS_PATH).conexion() as conn:
+        get_motor(conn)
+
+def _con_motor(conn, consulta, respaldo):
+    """Resuelve con el motor; si no está disponible o la consulta no es representable, con SQL."""
+    motor = get_motor(conn)
+    if motor is not None:
+        try:
+            return consulta(motor)
+        except ValueError:
+            pass  # Fechas que no son ISO: SQLite las compara como texto; se respeta ese resultado
+    return respaldo()
+
+
+# --- BACKEND INTERCAMBIABLE (MISMAS FIRMAS QUE DB_MANAGER) ---
+
+def get_faena_historico(conn, start_date, end_date, categoria=None, raza=None, rango_peso=None, desde_version=None):
+    respaldo = lambda: db_manager.get_faena_historico(conn, start_date, end_date, categoria, raza, rango_peso,
+                                                      desde_version)
+    if desde_version is not None:
+        return respaldo()  # Lectura incremental: necesita version_cambio, que el motor no carga
+    return _con_motor(conn, lambda m: m.faena_historico(start_date, end_date, categoria, raza, rango_peso), respaldo)
+
+def get_invernada_historico(conn, start_date, end_date, categoria=None, desde_version=None):
+    respaldo = lambda: db_manager.get_invernada_historico(conn, start_date, end_date, categoria, desde_version)
+    if desde_version is not None:
+        return respaldo()
+    return _con_motor(conn, lambda m: m.invernada_historico(start_date, end_date, categoria), respaldo)
+
+def get_faena_agrupado(conn, start_date, end_date, categoria=None, raza=None, rango_peso=None, agrupacion='auto',
+                       formato_fecha=None):
+    return _con_motor(
+        conn,
+        lambda m: m.agrupado('faena', start_date, end_date, (categoria, raza, rango_peso), agrupacion, formato_fecha),
+        lambda: db_manager.get_faena_agrupado(conn, start_date, end_date, categoria, raza, rango_peso,
+                                              agrupacion=agrupacion, formato_fecha=formato_fecha),
+    )
+
+def get_invernada_agrupado(conn, start_date, end_date, categoria=None, agrupacion='auto', formato_fecha=None):
+    return _con_motor(
+        conn,
+        lambda m: m.agrupado('invernada', start_date, end_date, (categoria,), agrupacion, formato_fecha),
+        lambda: db_manager.get_invernada_agrupado(conn, start_date, end_date, categoria,
+                                                  agrupacion=agrupacion, formato_fecha=formato_fecha),
+    )
+
+def get_faena_resumen(conn, start_date, end_date, categoria=None, raza=None, rango_peso=None):
+    return _con_motor(
+        conn,
+        lambda m: m.resumen('faena', start_date, end_date, (categoria, raza, rango_peso)),
+        lambda: db_manager.get_faena_resumen(conn, start_date, end_date, categoria, raza, rango_peso),
+    )
+
+def get_invernada_resumen(conn, start_date, end_date, categoria=None):
+    return _con_motor(
+        conn,
+        lambda m: m.resumen('invernada', start_date, end_date, (categoria,)),
+        lambda: db_manager.get_invernada_resumen(conn, start_date, end_date, categoria),
+    )
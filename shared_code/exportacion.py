@@ -0,0 +1,43 @@
+"""
+Serialización por lotes de las exportaciones de precios (CSV / NDJSON).
+La usan la API (/api/export/*) y el CLI data_pipeline/exportar.py: cada lote de filas se
+convierte en un trozo de texto y se descarta, nunca se arma el archivo completo en memoria.
+"""
+import io
+import csv
+import json
+
+FORMATOS_EXPORTACION = ('csv', 'ndjson')
+
+TIPOS_CONTENIDO = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def csv_en_lotes(columnas, lotes):
+    """Encabezado + un trozo de CSV por lote."""
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer, lineterminator='\n')
+    escritor.writerow(columnas)
+    for lote in lotes:
+        escritor.writerows(lote)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()  # Sin filas: solo el encabezado
+
+
+def ndjson_en_lotes(columnas, lotes):
+    """Un objeto JSON por línea."""
+    for lote in lotes:
+        yield ''.join(json.dumps(dict(zip(columnas, fila)), ensure_ascii=False) + '\n' for fila in lote)
+
+
+def serializar(formato, columnas, lotes):
+    if formato == 'csv':
+        return csv_en_lotes(columnas, lotes)
+    if formato == 'ndjson':
+        return ndjson_en_lotes(columnas, lotes)
+    raise ValueError(f"Formato de exportación inválido: {formato}")
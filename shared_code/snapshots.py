@@ -0,0 +1,210 @@
+"""
+Snapshots estáticos de las series del Dashboard, publicados por el pipeline.
+
+Los precios solo cambian en las corridas programadas. Al final de cada corrida,
+publicar_snapshots() escribe en el volumen persistente, por cada serie del catálogo y cada
+rango estándar (RANGOS_SNAPSHOT), el mismo JSON columnar que devolvería
+/api/{faena,invernada}?agrupacion=...&format=columnar&fechas=iso, ya comprimido, más un
+manifest que los indexa. La web los sirve como archivos (send_file, GET condicional):
+las vistas más comunes del Dashboard no ejecutan consultas.
+
+- Cada archivo se nombra con el hash de su contenido: es inmutable y se cachea sin límite.
+  Una serie que no cambió entre corridas reutiliza el archivo existente.
+- El manifest se reemplaza de forma atómica (os.replace) y registra la versión de datos con
+  la que se generó: si la base cambia después (backfill, mantenimiento), la web lo ignora
+  hasta la próxima publicación.
+- Se conservan los archivos del manifest anterior: un cliente que lo leyó recién puede
+  seguir pidiéndolos.
+"""
+import os
+import sys
+import json
+import gzip
+import hashlib
+import sqlite3
+from datetime import date, datetime, timedelta
+
+try:
+    import brotli
+except ImportError:  # Dependencia opcional: sin ella solo se publica la variante gzip
+    brotli = None
+
+# --- LOGGING SETUP ---
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.dirname(current_dir)
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from shared_code.logger_config import setup_logger
+from shared_code.database import db_manager
+logger = setup_logger('Snapshots')
+
+SNAPSHOTS_DIR = os.environ.get('SNAPSHOTS_DIR', os.path.join(db_manager.DATABASES_DIR, 'snapshots'))
+ARCHIVO_MANIFEST = 'manifest.json'
+SUBDIR_SERIES = 'series'
+
+# nombre -> (días hacia atrás desde hoy, o None = desde el primer dato de la serie; agrupación pedida)
+RANGOS_SNAPSHOT = {
+    '90d': (90, 'auto'),
+    '1y': (365, 'auto'),
+    'todo': (None, 'auto'),
+    'todo_mensual': (None, 'mensual'),
+}
+
+# Variantes precomprimidas, en orden de preferencia del servidor
+EXTENSIONES = {'br': '.br', 'gzip': '.gz'}
+
+LECTURAS = {
+    'faena': db_manager.get_faena_agrupado,
+    'invernada': db_manager.get_invernada_agrupado,
+}
+
+
+def clave_serie(tabla, start, end, categoria=None, raza=None, rango_peso=None, agrupacion='auto'):
+    """Clave del manifest: la consulta que resuelve el snapshot (filtro vacío = todas)."""
+    return '|'.join((tabla, start, end, agrupacion, categoria or '', raza or '', rango_peso or ''))
+
+
+def _series_catalogo(catalogo):
+    """(tabla, filtros, primer dato) de cada serie que se puede elegir en el Dashboard."""
+    for nodo in catalogo.get('faena', []):
+        yield 'faena', (nodo['categoria'], None, None), nodo['desde']
+        for nodo_raza in nodo['razas']:
+            if not nodo_raza['raza']:
+                continue
+            yield 'faena', (nodo['categoria'], nodo_raza['raza'], None), nodo_raza['desde']
+            for nodo_peso in nodo_raza['pesos']:
+                if nodo_peso['rango_peso']:
+                    yield 'faena', (nodo['categoria'], nodo_raza['raza'], nodo_peso['rango_peso']), nodo_peso['desde']
+    for nodo in catalogo.get('invernada', []):
+        yield 'invernada', (nodo['categoria'],), nodo['desde']
+
+
+def _json_bytes(valor):
+    return json.dumps(valor, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def _comprimir(datos, codificacion):
+    if codificacion == 'br':
+        return brotli.compress(datos, quality=11) if brotli else None
+    return gzip.compress(datos, 9, mtime=0)  # Se comprime una vez: nivel máximo
+
+
+def _escribir_atomico(ruta, datos):
+    temporal = f"{ruta}.{os.getpid()}.tmp"
+    with open(temporal, 'wb') as f:
+        f.write(datos)
+    os.replace(temporal, ruta)
+
+
+def _guardar_archivo(directorio, cuerpo):
+    """
+    Escribe el JSON y sus variantes comprimidas con nombre por hash; si ya existe no se reescribe.
+    Devuelve (ruta relativa al directorio, codificaciones disponibles).
+    """
+    relativa = f"{SUBDIR_SERIES}/{hashlib.sha256(cuerpo).hexdigest()[:24]}.json"
+    ruta = os.path.join(directorio, relativa)
+    if not os.path.exists(ruta):
+        # Primero las variantes: si el archivo base existe, las variantes también
+        for codificacion, extension in EXTENSIONES.items():
+            comprimido = _comprimir(cuerpo, codificacion)
+            if comprimido is not None and len(comprimido) < len(cuerpo):
+                _escribir_atomico(ruta + extension, comprimido)
+        _escribir_atomico(ruta, cuerpo)
+    codificaciones = [c for c, extension in EXTENSIONES.items() if os.path.exists(ruta + extension)]
+    return relativa, codificaciones
+
+
+def _leer_json(ruta):
+    try:
+        with open(ruta, 'rb') as f:
+            return json.loads(f.read())
+    except (OSError, ValueError):
+        return None
+
+
+def _limpiar_huerfanos(directorio, *manifests):
+    """Borra los archivos de series que no figuran en ninguno de los manifests."""
+    vigentes = {os.path.basename(entrada['archivo'])
+                for manifest in manifests if manifest for entrada in manifest['series'].values()}
+    carpeta = os.path.join(directorio, SUBDIR_SERIES)
+    borrados = 0
+    for nombre in os.listdir(carpeta):
+        base = nombre
+        for extension in EXTENSIONES.values():
+            if base.endswith(extension):
+                base = base[:-len(extension)]
+        if base not in vigentes and not nombre.endswith('.tmp'):
+            os.remove(os.path.join(carpeta, nombre))
+            borrados += 1
+    return borrados
+
+
+def publicar_snapshots(conn, directorio=None, hoy=None):
+    """
+    Genera los snapshots de todas las series del catálogo (rangos de RANGOS_SNAPSHOT hasta `hoy`)
+    y reemplaza el manifest. Devuelve la cantidad de snapshots publicados (0 si falla).
+    """
+    directorio = directorio or SNAPSHOTS_DIR
+    hoy = hoy or date.today()
+    fin = hoy.isoformat()
+    try:
+        os.makedirs(os.path.join(directorio, SUBDIR_SERIES), exist_ok=True)
+        version, _ = db_manager.get_version_datos_db(conn)
+        series = {}
+        for tabla, filtros, primer_dato in _series_catalogo(db_manager.get_catalogo_series(conn)):
+            for dias, agrupacion in RANGOS_SNAPSHOT.values():
+                inicio = primer_dato if dias is None else (hoy - timedelta(days=dias)).isoformat()
+                clave = clave_serie(tabla, inicio, fin, *filtros, agrupacion=agrupacion)
+                if clave in series:
+                    continue  # Serie más corta que el rango: "1y" y "todo" son la misma consulta
+                aplicada, data = LECTURAS[tabla](conn, inicio, fin, *filtros, agrupacion=agrupacion,
+                                                 formato_fecha='iso')
+                archivo, codificaciones = _guardar_archivo(directorio, _json_bytes(data))
+                series[clave] = {'archivo': archivo, 'agrupacion': aplicada, 'codificaciones': codificaciones}
+
+        ruta_manifest = os.path.join(directorio, ARCHIVO_MANIFEST)
+        anterior = _leer_json(ruta_manifest)
+        manifest = {
+            'version_datos': version,
+            'generado': datetime.now().isoformat(timespec='seconds'),
+            'hasta': fin,
+            'series': series,
+        }
+        _escribir_atomico(ruta_manifest, _json_bytes(manifest))
+        borrados = _limpiar_huerfanos(directorio, manifest, anterior)
+        logger.info(f"Snapshots publicados: {len(series)} (versión de datos {version}, {borrados} archivos viejos borrados).")
+        return len(series)
+    except (OSError, sqlite3.Error, KeyError, ValueError) as e:
+        logger.error(f"No se pudieron publicar los snapshots: {e}")
+        return 0
+
+
+# --- LECTURA (WEB) ---
+
+_manifest_leido = {'clave': None, 'valor': None}
+
+def get_manifest(directorio=None):
+    """Manifest vigente; se relee solo si cambió su mtime. None si todavía no se publicó ninguno."""
+    ruta = os.path.join(directorio or SNAPSHOTS_DIR, ARCHIVO_MANIFEST)
+    try:
+        estado = os.stat(ruta)
+    except OSError:
+        return None
+    clave = (ruta, estado.st_mtime_ns, estado.st_size)
+    if _manifest_leido['clave'] != clave:
+        _manifest_leido['valor'] = _leer_json(ruta)
+        _manifest_leido['clave'] = clave
+    return _manifest_leido['valor']
+
+
+def buscar_snapshot(tabla, start, end, categoria=None, raza=None, rango_peso=None, agrupacion='auto',
+                    version=None, directorio=None):
+    """
+    Entrada del manifest ({archivo, agrupacion, codificaciones}) que resuelve esa consulta, o None
+    si no se publicó o si se generó con otra versión de datos que `version`.
+    """
+    manifest = get_manifest(directorio)
+    if not manifest or manifest.get('version_datos') != version:
+        return None
+    return manifest['series'].get(clave_serie(tabla, start, end, categoria, raza, rango_peso, agrupacion))
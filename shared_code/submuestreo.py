@@ -0,0 +1,96 @@
+"""
+Submuestreo de series de precios para gráficos (Largest-Triangle-Three-Buckets).
+
+A diferencia de agrupar por semana/mes, LTTB conserva los picos y valles de la serie:
+en cada bucket elige el punto que forma el triángulo de mayor área con el punto
+elegido en el bucket anterior y el promedio del bucket siguiente.
+"""
+import numpy as np
+
+
+def lttb_indices(x, y, max_puntos):
+    """
+    Devuelve los índices (ordenados) de los puntos a conservar.
+    `x` debe venir ordenado de forma ascendente. Siempre conserva el primer y el último punto.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if max_puntos >= n or max_puntos < 3:
+        return np.arange(n)
+
+    # Buckets intermedios sobre los índices 1..n-2 (bordes estrictamente crecientes)
+    k = max_puntos - 2
+    bordes = np.floor(np.linspace(1, n - 1, k + 1)).astype(np.int64)
+
+    # Promedio (x, y) de cada bucket con sumas acumuladas: sin bucles en Python
+    acum_x = np.concatenate(([0.0], np.cumsum(x)))
+    acum_y = np.concatenate(([0.0], np.cumsum(y)))
+    tamanos = bordes[1:] - bordes[:-1]
+    prom_x = (acum_x[bordes[1:]] - acum_x[bordes[:-1]]) / tamanos
+    prom_y = (acum_y[bordes[1:]] - acum_y[bordes[:-1]]) / tamanos
+    # El "bucket siguiente" del último bucket es el punto final
+    prom_x = np.append(prom_x[1:], x[-1])
+    prom_y = np.append(prom_y[1:], y[-1])
+
+    elegidos = np.empty(max_puntos, dtype=np.int64)
+    elegidos[0] = 0
+    elegidos[-1] = n - 1
+    a = 0
+    for i in range(k):
+        lo, hi = bordes[i], bordes[i + 1]
+        # Área (x2) del triángulo entre el punto elegido, cada candidato y el promedio siguiente
+        areas = np.abs(
+            (x[a] - prom_x[i]) * (y[lo:hi] - y[a])
+            - (x[a] - x[lo:hi]) * (prom_y[i] - y[a])
+        )
+        a = lo + int(np.argmax(areas))
+        elegidos[i + 1] = a
+    return elegidos
+
+
+def _dias_desde_fechas(fechas_dmy):
+    """'dd/mm/YYYY' -> número de día (int64) usando datetime64 de NumPy."""
+    iso = np.array([f"{f[6:10]}-{f[3:5]}-{f[0:2]}" for f in fechas_dmy], dtype='datetime64[D]')
+    return iso.astype(np.int64)
+
+
+def _dias_desde_columna(fechas, formato_fecha):
+    """Columna de fechas del formato columnar ('iso' o 'epoch_day') -> número de día (int64)."""
+    if formato_fecha == 'epoch_day':
+        return np.asarray(fechas, dtype=np.int64)
+    return np.array(fechas, dtype='datetime64[D]').astype(np.int64)
+
+
+def reducir_filas(filas, max_puntos, clave_fecha, clave_valor='precio_promedio_kg'):
+    """
+    Aplica LTTB sobre filas del histórico (dicts con fecha 'dd/mm/YYYY').
+    Las filas sin precio no participan del gráfico y se descartan.
+    """
+    if len(filas) <= max_puntos:
+        return filas
+    con_valor = [f for f in filas if f.get(clave_valor) is not None]
+    if len(con_valor) <= max_puntos:
+        return con_valor
+
+    x = _dias_desde_fechas([f[clave_fecha] for f in con_valor])
+    y = np.fromiter((f[clave_valor] for f in con_valor), dtype=np.float64, count=len(con_valor))
+    return [con_valor[i] for i in lttb_indices(x, y, max_puntos)]
+
+
+def reducir_columnar(serie, max_puntos, clave_fecha, formato_fecha='iso', clave_valor='precio_promedio_kg'):
+    """Igual que reducir_filas, sobre una serie en formato columnar: recorta todas las columnas."""
+    columnas = serie['columnas']
+    if serie['n'] <= max_puntos:
+        return serie
+    valores = columnas[clave_valor]
+    con_valor = [i for i, v in enumerate(valores) if v is not None]
+    if len(con_valor) > max_puntos:
+        x = _dias_desde_columna([columnas[clave_fecha][i] for i in con_valor], formato_fecha)
+        y = np.fromiter((valores[i] for i in con_valor), dtype=np.float64, count=len(con_valor))
+        con_valor = [con_valor[i] for i in lttb_indices(x, y, max_puntos)]
+    return {
+        'n': len(con_valor),
+        'constantes': serie['constantes'],
+        'columnas': {nombre: [col[i] for i in con_valor] for nombre, col in columnas.items()},
+    }
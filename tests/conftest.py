@@ -17,9 +17,13 @@ if project_root not in sys.path:
 os.environ['TESTING'] = 'true'
 os.environ['SECRET_KEY'] = 'test-secret-key-for-testing-only'
 os.environ['CLIENT_EMAILS'] = 'test@example.com'
+# La caché de respuestas compartida entre workers usa un archivo temporal, no el de la app
+os.environ['CACHE_COMPARTIDO_PATH'] = os.path.join(tempfile.mkdtemp(), 'cache_respuestas.db')
 
 from web_app.app import app as flask_app, User
 from shared_code.database import db_manager
+from shared_code.database.cache_compartido import get_cache_compartido
+from web_app.utils.compresion import get_cache_variantes
 
 
 # =============================================================================
@@ -60,6 +64,20 @@ def app_context(app):
         yield app
 
 
+@pytest.fixture(autouse=True)
+def cache_lecturas_limpia():
+    """Las cachés son globales al proceso: cada test arranca sin resultados previos."""
+    db_manager.get_cache_lecturas().limpiar()
+    db_manager.get_lecturas_en_vuelo().limpiar()
+    get_cache_compartido().limpiar()
+    get_cache_variantes().limpiar()
+    yield
+    db_manager.get_cache_lecturas().limpiar()
+    db_manager.get_lecturas_en_vuelo().limpiar()
+    get_cache_compartido().limpiar()
+    get_cache_variantes().limpiar()
+
+
 # =============================================================================
 # FIXTURES DE BASE DE DATOS
 # =============================================================================
@@ -74,6 +92,13 @@ def db_precios():
     conn.close()
 
 
+def fila_faena(fecha, precio, categoria='NOVILLOS', raza='Angus', rango_peso='300-400 kg', cabezas=10):
+    """Fila de Faena como la entrega el scraper; kilos e importe se derivan de cabezas (400 kg por cabeza)."""
+    return {'fecha_consulta_inicio': fecha, 'categoria_original': categoria, 'raza': raza,
+            'rango_peso': rango_peso, 'precio_promedio_kg': precio, 'cabezas': cabezas,
+            'kilos_total': cabezas and cabezas * 400, 'importe_total': precio and cabezas and precio * cabezas * 400}
+
+
 @pytest.fixture(scope="function")
 def db_market():
     """Crea una base de datos de marketplace en memoria para cada test."""
@@ -7,6 +7,8 @@ import pytest
 import sys
 import os
 import json
+import gzip
+from datetime import datetime
 
 project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 if project_root not in sys.path:
@@ -17,6 +19,7 @@ os.environ['SECRET_KEY'] = 'test-secret'
 
 from web_app.app import app, User
 from shared_code.database import db_manager
+from shared_code.database.cache_compartido import get_cache_compartido
 import sqlite3
 
 
@@ -71,6 +74,450 @@ def test_api_categorias(client, mocker):
     assert 'invernada' in data
     assert "NOVILLOS" in data['faena']
 
+def test_api_dashboard_bootstrap(client, mocker):
+    """Un único pedido entrega el árbol completo de filtros del Dashboard."""
+    mocker.patch('web_app.app.get_db_precios', return_value=mocker.Mock())
+    catalogo = {
+        'faena': [{'categoria': 'NOVILLOS', 'desde': '2025-01-02', 'hasta': '2025-11-20',
+                   'razas': [{'raza': 'Angus', 'desde': '2025-01-02', 'hasta': '2025-11-20',
+                              'pesos': [{'rango_peso': '300-400 kg', 'desde': '2025-01-02',
+                                         'hasta': '2025-11-20', 'registros': 200}]}]}],
+        'invernada': [{'categoria': 'Terneros 160-180 kg', 'desde': '2025-01-03', 'hasta': '2025-11-21', 'registros': 45}],
+    }
+    mocker.patch('web_app.app.db_manager.get_catalogo_series', return_value=catalogo)
+
+    response = client.get('/api/dashboard/bootstrap')
+    assert response.status_code == 200
+    assert json.loads(response.data) == catalogo
+    assert 'ETag' in response.headers
+
+def test_api_faena_agrupada(client, mocker):
+    """Con ?agrupacion= la serie se agrupa en el servidor e informa el período aplicado."""
+    mocker.patch('web_app.app.get_db_precios', return_value=mocker.Mock())
+    mock_agrupado = mocker.patch('web_app.app.db_manager.get_faena_agrupado',
+                                 return_value=('mensual', [{'fecha_consulta': '01/11/2025', 'precio_promedio_kg': 1000.0}]))
+
+    response = client.get('/api/faena?start=2025-01-01&end=2025-12-31&categoria=NOVILLOS&agrupacion=auto')
+    assert response.status_code == 200
+    assert response.headers['X-Agrupacion'] == 'mensual'
+    assert json.loads(response.data)[0]['fecha_consulta'] == '01/11/2025'
+    assert mock_agrupado.call_args.kwargs['agrupacion'] == 'auto'
+
+def test_api_faena_agrupacion_invalida(client):
+    response = client.get('/api/faena?start=2025-01-01&end=2025-12-31&agrupacion=anual')
+    assert response.status_code == 400
+
+def test_api_faena_max_points(client, mocker):
+    """Con ?max_points= la serie se reduce y se informa cuántos puntos tenía originalmente."""
+    serie = [{'fecha_consulta': f"{dia:02d}/11/2025", 'precio_promedio_kg': 1000.0 + dia, 'cabezas': 10}
+             for dia in range(1, 31)]
+    mocker.patch('web_app.app.get_db_precios', return_value=mocker.Mock())
+    mocker.patch('web_app.app.db_manager.get_faena_historico', return_value=serie)
+
+    response = client.get('/api/faena?start=2025-11-01&end=2025-11-30&categoria=NOVILLOS&max_points=10')
+    assert response.status_code == 200
+    cuerpo = json.loads(response.data)
+    assert cuerpo['total_original'] == 30
+    assert cuerpo['total'] == len(cuerpo['datos']) == 10
+    assert cuerpo['cabezas_total'] == 300
+    assert cuerpo['precio_max'] == 1030.0
+
+@pytest.mark.parametrize("valor", ["abc", "2"])
+def test_api_faena_max_points_invalido(client, valor):
+    response = client.get(f'/api/faena?start=2025-01-01&end=2025-12-31&max_points={valor}')
+    assert response.status_code == 400
+
+def test_api_faena_columnar(client, mocker):
+    """?format=columnar devuelve un arreglo por columna con las dimensiones constantes aparte."""
+    serie = {'n': 2, 'constantes': {'categoria_original': 'NOVILLOS'},
+             'columnas': {'fecha_consulta': [20395, 20396], 'precio_promedio_kg': [1000.0, 1100.0]}}
+    mocker.patch('web_app.app.get_db_precios', return_value=mocker.Mock())
+    mock_columnar = mocker.patch('web_app.app.db_manager.get_faena_columnar', return_value=serie)
+
+    response = client.get('/api/faena?start=2025-11-01&end=2025-11-30&categoria=NOVILLOS&format=columnar&fechas=epoch_day')
+    assert response.status_code == 200
+    assert json.loads(response.data) == serie
+    assert mock_columnar.call_args.kwargs['formato_fecha'] == 'epoch_day'
+
+@pytest.mark.parametrize("query", ["format=filas", "format=columnar&fechas=unix"])
+def test_api_faena_formato_invalido(client, query):
+    response = client.get(f'/api/faena?start=2025-01-01&end=2025-12-31&{query}')
+    assert response.status_code == 400
+
+def test_api_faena_arrow_y_msgpack_segun_accept(client, mocker):
+    """Accept binario: columnas tipadas (date32 / float64 / int32) y otra entrada de caché y ETag que el JSON."""
+    pa = pytest.importorskip('pyarrow')
+    msgpack = pytest.importorskip('msgpack')
+    mocker.patch('web_app.app.db_manager.get_version_datos', return_value=(7, datetime(2025, 11, 20, 11, 5)))
+    mocker.patch('web_app.app.get_db_precios', return_value=mocker.Mock())
+    serie = {'n': 3, 'constantes': {'categoria_original': 'NOVILLOS'},
+             'columnas': {'fecha_consulta': [20395, 20396, 20397], 'precio_promedio_kg': [1000.0, None, 1100.5],
+                          'cabezas': [10, 20, None]}}
+    mock_columnar = mocker.patch('web_app.app.db_manager.get_faena_columnar', return_value=serie)
+    mocker.patch('web_app.app.db_manager.get_faena_historico', return_value=[])
+
+    url = '/api/faena?start=2025-11-01&end=2025-11-30&categoria=NOVILLOS'
+    arrow = client.get(url, headers={'Accept': 'application/vnd.apache.arrow.stream'})
+    assert arrow.status_code == 200
+    assert arrow.mimetype == 'application/vnd.apache.arrow.stream'
+    assert 'Accept' in arrow.headers['Vary']
+    assert mock_columnar.call_args.kwargs['formato_fecha'] == 'epoch_day'
+
+    tabla = pa.ipc.open_stream(arrow.data).read_all()
+    assert tabla.schema.field('fecha_consulta').type == pa.date32()
+    assert tabla.schema.field('precio_promedio_kg').type == pa.float64()
+    assert tabla.schema.field('cabezas').type == pa.int32()
+    assert tabla.column('precio_promedio_kg').to_pylist() == [1000.0, None, 1100.5]
+    assert tabla.column('cabezas').to_pylist() == [10, 20, None]
+    assert json.loads(tabla.schema.metadata[b'serie'])['constantes'] == {'categoria_original': 'NOVILLOS'}
+
+    empaquetada = client.get(url, headers={'Accept': 'application/msgpack'})
+    cuerpo = msgpack.unpackb(empaquetada.data)
+    assert empaquetada.mimetype == 'application/msgpack'
+    assert cuerpo['n'] == 3
+    fechas = cuerpo['columnas']['fecha_consulta']
+    assert fechas['tipo'] == 'date32' and list(memoryview(fechas['datos']).cast('i')) == [20395, 20396, 20397]
+    assert cuerpo['columnas']['cabezas']['nulos'] == bytes([0b100])
+
+    plana = client.get(url)
+    assert plana.mimetype == 'application/json'
+    assert len({arrow.headers['ETag'], empaquetada.headers['ETag'], plana.headers['ETag']}) == 3
+
+def test_api_faena_binario_no_disponible_406(client, mocker):
+    mocker.patch('web_app.utils.formatos_binarios.msgpack', None)
+    response = client.get('/api/faena?start=2025-11-01&end=2025-11-30', headers={'Accept': 'application/msgpack'})
+    assert response.status_code == 406
+
+def test_api_faena_since_devuelve_solo_cambios(client, mocker):
+    mocker.patch('web_app.app.db_manager.get_version_datos', return_value=(9, datetime(2025, 11, 20, 11, 5)))
+    mocker.patch('web_app.app.get_db_precios', return_value=mocker.Mock())
+    cambios = {'cursor': 9, 'desde_version': 7, 'datos': [{'fecha_consulta': '20/11/2025', 'precio_promedio_kg': 1.0}]}
+    mock_cambios = mocker.patch('web_app.app.db_manager.get_faena_cambios', return_value=cambios)
+
+    response = client.get('/api/faena?start=2025-11-01&end=2025-11-30&categoria=NOVILLOS&since=7')
+    assert response.status_code == 200
+    assert json.loads(response.data) == cambios
+    assert response.headers['X-Version-Datos'] == '9'
+    assert mock_cambios.call_args.kwargs == {'desde': '7', 'formato_fecha': None}
+
+@pytest.mark.parametrize("query", ["since=ayer", "since=7&agrupacion=semanal", "since=7&max_points=100"])
+def test_api_faena_since_invalido(client, query):
+    response = client.get(f'/api/faena?start=2025-11-01&end=2025-11-30&{query}')
+    assert response.status_code == 400
+
+def test_api_respuesta_condicional_304(client, mocker):
+    """Con la versión de datos vigente en If-None-Match, responde 304 sin abrir la base."""
+    mocker.patch('web_app.app.db_manager.get_version_datos', return_value=(7, datetime(2025, 11, 20, 11, 5)))
+    mock_db = mocker.patch('web_app.app.get_db_precios', return_value=mocker.Mock())
+    mocker.patch('web_app.app.db_manager.get_faena_historico', return_value=[])
+
+    url = '/api/faena?start=2025-11-01&end=2025-11-30&categoria=NOVILLOS'
+    primera = client.get(url)
+    assert primera.status_code == 200
+    etag = primera.headers['ETag']
+    assert etag.startswith('"v7-')
+    assert 'Last-Modified' in primera.headers
+    assert 'must-revalidate' in primera.headers['Cache-Control']
+
+    mock_db.reset_mock()
+    segunda = client.get(url, headers={'If-None-Match': etag})
+    assert segunda.status_code == 304
+    assert segunda.headers['ETag'] == etag
+    mock_db.assert_not_called()
+
+    # Otra URL u otra versión de datos: nuevo ETag
+    assert client.get(url + '&raza=Angus', headers={'If-None-Match': etag}).status_code == 200
+    mocker.patch('web_app.app.db_manager.get_version_datos', return_value=(8, datetime(2025, 11, 20, 20, 5)))
+    assert client.get(url, headers={'If-None-Match': etag}).status_code == 200
+
+def test_api_etag_distinto_si_un_valor_contiene_separadores(client, mocker):
+    """Dos consultas que solo coinciden al unir k=v sin escapar no comparten ETag, 304 ni variante comprimida."""
+    mocker.patch('web_app.app.db_manager.get_version_datos', return_value=(7, datetime(2025, 11, 20, 11, 5)))
+    mocker.patch('web_app.app.get_db_precios', return_value=mocker.Mock())
+    mocker.patch('web_app.app.db_manager.get_faena_historico',
+                 side_effect=lambda conn, start, end, categoria=None, raza=None, *a, **k: [{'end': end, 'raza': raza}] * 50)
+    mocker.patch('web_app.utils.compresion.brotli', None)
+
+    gzip_ok = {'Accept-Encoding': 'gzip'}
+    maliciosa = client.get('/api/faena?start=2025-01-01&end=2025-01-31%26raza%3DCruza&categoria=NOVILLOS', headers=gzip_ok)
+    url = '/api/faena?start=2025-01-01&end=2025-01-31&raza=Cruza&categoria=NOVILLOS'
+    assert client.get(url, headers={'If-None-Match': maliciosa.headers['ETag']}).status_code == 200
+
+    legitima = client.get(url, headers=gzip_ok)
+    assert legitima.headers['ETag'] != maliciosa.headers['ETag']
+    assert json.loads(gzip.decompress(legitima.data))[0] == {'end': '2025-01-31', 'raza': 'Cruza'}
+
+def test_api_respuesta_condicional_if_modified_since(client, mocker):
+    mocker.patch('web_app.app.db_manager.get_version_datos', return_value=(7, datetime(2025, 11, 20, 11, 5)))
+    mocker.patch('web_app.app.get_db_precios', return_value=mocker.Mock())
+    mocker.patch('web_app.app.db_manager.get_categorias_precios', return_value=([], []))
+
+    primera = client.get('/api/categorias')
+    respuesta = client.get('/api/categorias', headers={'If-Modified-Since': primera.headers['Last-Modified']})
+    assert respuesta.status_code == 304
+
+def test_api_usa_cache_de_lecturas(client, mocker):
+    """La segunda petición idéntica (con filtros equivalentes) no vuelve a consultar la base."""
+    mocker.patch('web_app.app.db_manager.get_version_datos', return_value=(7, datetime(2025, 11, 20, 11, 5)))
+    mocker.patch('web_app.app.get_db_precios', return_value=mocker.Mock())
+    mock_historico = mocker.patch('web_app.app.db_manager.get_faena_historico', return_value=[])
+
+    client.get('/api/faena?start=2025-11-01&end=2025-11-30&categoria=NOVILLOS')
+    client.get('/api/faena?start=2025-11-01&end=2025-11-30&categoria=NOVILLOS&raza=')
+    assert mock_historico.call_count == 1
+
+def test_api_cache_compartido_entre_workers(client, mocker):
+    """Una respuesta publicada en la caché compartida se sirve sin recalcular (aunque la caché del worker esté vacía)."""
+    mocker.patch('web_app.app.db_manager.get_version_datos', return_value=(7, datetime(2025, 11, 20, 11, 5)))
+    mocker.patch('web_app.app.get_db_precios', return_value=mocker.Mock())
+    mock_agrupado = mocker.patch('web_app.app.db_manager.get_faena_agrupado',
+                                 return_value=('semanal', [{'fecha_consulta': '03/11/2025', 'precio_promedio_kg': 1.0}]))
+
+    url = '/api/faena?start=2025-11-01&end=2025-11-30&agrupacion=semanal'
+    primera = client.get(url)
+    db_manager.get_cache_lecturas().limpiar()  # Simula otro worker
+    segunda = client.get(url)
+
+    assert mock_agrupado.call_count == 1
+    assert segunda.data == primera.data
+    assert segunda.headers['X-Agrupacion'] == 'semanal'
+    assert segunda.headers['ETag'] == primera.headers['ETag']
+
+def test_api_cache_compartido_no_confunde_valores_con_separadores(client, mocker):
+    """Un '&' codificado dentro de un valor no puede ocupar la entrada de caché de otra consulta."""
+    mocker.patch('web_app.app.db_manager.get_version_datos', return_value=(7, datetime(2025, 11, 20, 11, 5)))
+    mocker.patch('web_app.app.get_db_precios', return_value=mocker.Mock())
+    mocker.patch('web_app.app.db_manager.get_faena_historico',
+                 side_effect=lambda conn, start, end, categoria=None, raza=None, *a, **k: [{'end': end, 'raza': raza}])
+
+    maliciosa = client.get('/api/faena?start=2025-01-01&end=2025-01-31%26raza%3DCruza&categoria=NOVILLOS')
+    db_manager.get_cache_lecturas().limpiar()  # Simula otro worker
+    legitima = client.get('/api/faena?start=2025-01-01&end=2025-01-31&raza=Cruza&categoria=NOVILLOS')
+
+    assert legitima.status_code == 200
+    assert json.loads(legitima.data) == [{'end': '2025-01-31', 'raza': 'Cruza'}]
+    assert legitima.data != maliciosa.data
+
+def test_api_comprimida_segun_accept_encoding(client, mocker):
+    """La serie se comprime con gzip si el cliente lo acepta; el ETag de la variante sirve para el 304."""
+    mocker.patch('web_app.app.db_manager.get_version_datos', return_value=(7, datetime(2025, 11, 20, 11, 5)))
+    mocker.patch('web_app.app.get_db_precios', return_value=mocker.Mock())
+    filas = [{'fecha_consulta': f'{d:02d}/11/2025', 'precio_promedio_kg': 1000.0 + d} for d in range(1, 29)] * 5
+    mocker.patch('web_app.app.db_manager.get_faena_historico', return_value=filas)
+    mocker.patch('web_app.utils.compresion.brotli', None)
+
+    url = '/api/faena?start=2025-11-01&end=2025-11-30&categoria=NOVILLOS'
+    plana = client.get(url)
+    comprimida = client.get(url, headers={'Accept-Encoding': 'br;q=1.0, gzip;q=0.8'})
+
+    assert 'Content-Encoding' not in plana.headers
+    assert comprimida.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in comprimida.headers['Vary']
+    assert gzip.decompress(comprimida.data) == plana.data
+    assert comprimida.headers['ETag'] == plana.headers['ETag'][:-1] + '-gzip"'
+
+    revalidada = client.get(url, headers={'Accept-Encoding': 'gzip', 'If-None-Match': comprimida.headers['ETag']})
+    assert revalidada.status_code == 304
+    assert revalidada.headers['ETag'] == comprimida.headers['ETag']
+
+def test_respuesta_chica_no_se_comprime(client, mocker):
+    mocker.patch('web_app.app.get_db_precios', return_value=mocker.Mock())
+    mocker.patch('web_app.app.db_manager.get_subcategorias_faena', return_value=([], []))
+
+    response = client.get('/api/subcategorias?categoria=NOVILLOS', headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert 'Content-Encoding' not in response.headers
+
+def test_api_faena_stream_rango_largo(client, mocker, db_precios):
+    """Un rango de varios años se envía en streaming con el mismo JSON que la lista completa."""
+    db_manager.insertar_datos_faena(db_precios, [
+        {'fecha_consulta_inicio': f'{d:02d}/{m:02d}/2024', 'categoria_original': 'NOVILLOS', 'raza': 'Angus',
+         'rango_peso': '300-400 kg', 'precio_promedio_kg': 1000.0 + d, 'cabezas': 10}
+        for m in range(1, 13) for d in range(1, 29)
+    ])
+    mocker.patch('web_app.app.get_db_precios', return_value=db_precios)
+    mocker.patch('web_app.app.db_manager.TAMANO_LOTE_STREAM', 50)
+
+    url = '/api/faena?start=2023-01-01&end=2025-12-31&categoria=NOVILLOS'
+    en_stream = client.get(url)
+    completa = client.get(url + '&stream=0')
+
+    assert 'Content-Length' not in en_stream.headers and 'Content-Length' in completa.headers
+    assert json.loads(en_stream.data) == json.loads(completa.data)
+    assert len(json.loads(en_stream.data)) == 12 * 28
+
+def _cargar_faena_export(db_precios):
+    db_manager.insertar_datos_faena(db_precios, [
+        {'fecha_consulta_inicio': f'{d:02d}/11/2025', 'categoria_original': 'NOVILLOS', 'raza': 'Angus',
+         'rango_peso': '300-400 kg', 'precio_promedio_kg': 1000.0 + d, 'cabezas': 10}
+        for d in range(1, 21)
+    ])
+
+def test_api_export_faena_csv_y_ndjson(client, mocker, db_precios):
+    _cargar_faena_export(db_precios)
+    mocker.patch('web_app.app.get_db_precios', return_value=db_precios)
+
+    url = '/api/export/faena?start=2025-11-01&end=2025-11-30&categoria=NOVILLOS'
+    respuesta_csv = client.get(url)
+    assert respuesta_csv.status_code == 200
+    assert respuesta_csv.mimetype == 'text/csv'
+    assert 'faena_2025-11-01_2025-11-30.csv' in respuesta_csv.headers['Content-Disposition']
+    lineas = respuesta_csv.data.decode().splitlines()
+    assert lineas[0].startswith('fecha_consulta,tipo_hacienda,categoria_original')
+    assert len(lineas) == 21
+
+    respuesta_ndjson = client.get(url + '&format=ndjson')
+    registros = [json.loads(l) for l in respuesta_ndjson.data.decode().splitlines()]
+    assert respuesta_ndjson.mimetype == 'application/x-ndjson'
+    assert registros[0]['fecha_consulta'] == '2025-11-01' and registros[-1]['precio_promedio_kg'] == 1020.0
+
+def test_api_export_gzip(client, mocker, db_precios):
+    _cargar_faena_export(db_precios)
+    mocker.patch('web_app.app.get_db_precios', return_value=db_precios)
+
+    response = client.get('/api/export/faena?start=2025-11-01&end=2025-11-30&compresion=gzip')
+    assert response.mimetype == 'application/gzip'
+    assert response.headers['Content-Disposition'].endswith('.csv.gz"')
+    assert 'Content-Encoding' not in response.headers
+    assert len(gzip.decompress(response.data).decode().splitlines()) == 21
+
+@pytest.mark.parametrize("query", ["start=2025-11-01", "start=2025-11-01&end=ayer",
+                                   "start=2025-11-01&end=2025-11-30&format=xlsx",
+                                   "start=2025-11-01&end=2025-11-30&compresion=zip"])
+def test_api_export_parametros_invalidos(client, query):
+    assert client.get(f'/api/export/invernada?{query}').status_code == 400
+
+def test_api_faena_multi(client, mocker):
+    """Varias series en un pedido: se resuelven en una llamada y se devuelven agrupadas por serie."""
+    mocker.patch('web_app.app.get_db_precios', return_value=mocker.Mock())
+    mock_multi = mocker.patch('web_app.app.db_manager.get_faena_agrupado_multi', return_value=(
+        'semanal', [[{'fecha_consulta': '03/11/2025', 'precio_promedio_kg': 1000.0}], []]))
+
+    response = client.get('/api/faena/multi?start=2025-11-01&end=2025-11-30&agrupacion=semanal'
+                          '&serie=NOVILLOS|Angus|300-400 kg&serie=VAQUILLONAS')
+    assert response.status_code == 200
+    assert response.headers['X-Agrupacion'] == 'semanal'
+    data = json.loads(response.data)
+    assert data['series'][0]['clave'] == {'categoria': 'NOVILLOS', 'raza': 'Angus', 'rango_peso': '300-400 kg'}
+    assert data['series'][1]['clave'] == {'categoria': 'VAQUILLONAS', 'raza': None, 'rango_peso': None}
+    assert data['series'][0]['datos'][0]['precio_promedio_kg'] == 1000.0
+    assert mock_multi.call_count == 1
+    assert mock_multi.call_args.args[3] == (('NOVILLOS', 'Angus', '300-400 kg'), ('VAQUILLONAS', None, None))
+
+def test_api_invernada_multi_pasa_categorias(client, mocker):
+    mocker.patch('web_app.app.get_db_precios', return_value=mocker.Mock())
+    mock_multi = mocker.patch('web_app.app.db_manager.get_invernada_agrupado_multi', return_value=('mensual', [[], []]))
+
+    response = client.get('/api/invernada/multi?start=2025-01-01&end=2025-11-30&serie=Terneros&serie=Vaquillonas')
+    assert response.status_code == 200
+    assert mock_multi.call_args.args[3] == ('Terneros', 'Vaquillonas')
+
+@pytest.mark.parametrize("query", ["serie=NOVILLOS", "start=2025-11-01&end=2025-11-30",
+                                   "start=2025-11-01&end=2025-11-30&serie=|Angus",
+                                   "start=2025-11-01&end=2025-11-30&serie=A|B|C|D",
+                                   "start=2025-11-01&end=2025-11-30&serie=NOVILLOS&agrupacion=anual",
+                                   "start=2025-11-01&end=2025-11-30&" + "&".join(["serie=NOVILLOS"] * 13)])
+def test_api_faena_multi_parametros_invalidos(client, query):
+    assert client.get(f'/api/faena/multi?{query}').status_code == 400
+
+def test_api_faena_resumen(client, mocker):
+    mocker.patch('web_app.app.get_db_precios', return_value=mocker.Mock())
+    resumen = {'registros': 20, 'cabezas_total': 4000, 'precio_max': 1500.0, 'fecha_max': '2025-11-10',
+               'precio_ultimo': 1100.0, 'fecha_ultimo': '2025-11-24', 'variacion_periodo': 3.5}
+    mock_resumen = mocker.patch('web_app.app.db_manager.get_faena_resumen', return_value=resumen)
+
+    response = client.get('/api/faena/resumen?start=2025-11-01&end=2025-11-30&categoria=NOVILLOS&raza=Angus')
+    assert response.status_code == 200
+    assert json.loads(response.data) == resumen
+    assert mock_resumen.call_args.args[1:] == ('2025-11-01', '2025-11-30', 'NOVILLOS', 'Angus', None)
+
+@pytest.mark.parametrize("query", ["start=2025-11-01", "start=2025-11-01&end=30/11/2025"])
+def test_api_invernada_resumen_fechas_invalidas(client, query):
+    assert client.get(f'/api/invernada/resumen?{query}').status_code == 400
+
+def test_dashboard_embebe_datos_iniciales(client, mocker):
+    """/precios trae el catálogo y la serie de la categoría de Faena más vista."""
+    import re
+    mocker.patch('web_app.app.get_db_precios', return_value=mocker.Mock())
+    catalogo = {'faena': [{'categoria': 'NOVILLOS'}, {'categoria': 'VACAS'}], 'invernada': []}
+    mocker.patch('web_app.app.db_manager.get_catalogo_series', return_value=catalogo)
+    mocker.patch('web_app.app.db_manager.get_faena_historico', return_value=[])
+    mocker.patch('web_app.app.db_manager.get_faena_resumen', return_value={'registros': 0})
+    mock_agrupado = mocker.patch('web_app.app.db_manager.get_faena_agrupado',
+                                 return_value=('semanal', {'n': 0, 'columnas': {}}))
+
+    # Pedidos de datos no son vistas; solo las elecciones de categoría que informa el Dashboard
+    for _ in range(3):
+        client.get('/api/faena?start=2025-11-01&end=2025-11-30&categoria=NOVILLOS')
+    for _ in range(2):
+        assert client.post('/api/dashboard/vista', json={'categoria': 'VACAS'}).status_code == 204
+    assert client.post('/api/dashboard/vista', json={'categoria': 'OTRA'}).status_code == 400
+
+    response = client.get('/precios')
+    assert response.status_code == 200
+    bloque = re.search(rb'<script type="application/json" id="datos-iniciales">(.*?)</script>', response.data, re.S)
+    datos = json.loads(bloque.group(1))
+    assert datos['catalogo'] == catalogo
+    assert datos['serie']['categoria'] == 'VACAS'
+    assert datos['serie']['agrupacion_aplicada'] == 'semanal'
+    assert mock_agrupado.call_args.args[3] == 'VACAS'
+    # El primer render también cuenta como vista (en la caché compartida, la ven todos los workers)
+    assert get_cache_compartido().ranking('vistas_categoria_faena', dias=90) == [('VACAS', 3)]
+
+def test_api_faena_sirve_snapshot_publicado(client, mocker, db_precios, tmp_path):
+    """Una vista publicada por el pipeline se envía como archivo precomprimido, sin consultar la base."""
+    from datetime import date
+    from shared_code import snapshots
+    db_manager.insertar_datos_faena(db_precios, [
+        {'fecha_consulta_inicio': f'{d:02d}/11/2025', 'categoria_original': 'NOVILLOS', 'raza': 'Angus',
+         'rango_peso': '300-400 kg', 'precio_promedio_kg': 1000.0 + d, 'cabezas': 10} for d in range(3, 28)
+    ])
+    snapshots.publicar_snapshots(db_precios, str(tmp_path), hoy=date(2025, 11, 30))
+    _, esperado = db_manager.get_faena_agrupado(db_precios, '2025-09-01', '2025-11-30', 'NOVILLOS', formato_fecha='iso')
+    version = db_manager.get_version_datos_db(db_precios)[0]
+
+    mocker.patch.object(snapshots, 'SNAPSHOTS_DIR', str(tmp_path))
+    mocker.patch('web_app.app.db_manager.get_version_datos', return_value=(version, datetime(2025, 11, 30, 11, 0)))
+    mock_agrupado = mocker.patch('web_app.app.db_manager.get_faena_agrupado')
+
+    response = client.get('/api/faena?start=2025-09-01&end=2025-11-30&categoria=NOVILLOS&agrupacion=auto'
+                          '&format=columnar&fechas=iso', headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['X-Agrupacion'] == 'diario'
+    assert response.get_etag()[0].endswith('-gzip')
+    response.direct_passthrough = False
+    assert json.loads(gzip.decompress(response.get_data())) == esperado
+    mock_agrupado.assert_not_called()
+
+    # Un pedido de cambios (?since=) nunca recibe el snapshot completo
+    con_since = client.get('/api/faena?start=2025-09-01&end=2025-11-30&categoria=NOVILLOS&agrupacion=auto'
+                           f'&format=columnar&fechas=iso&since={version}')
+    assert con_since.status_code == 400
+    assert 'since' in json.loads(con_since.data)['error']
+
+    # Los archivos también se sirven directo, inmutables; fuera de series/ no se expone nada
+    archivo = next(iter(snapshots.get_manifest(str(tmp_path))['series'].values()))['archivo']
+    directo = client.get(f'/datos/{archivo}')
+    assert directo.status_code == 200
+    assert 'immutable' in directo.headers['Cache-Control']
+    assert client.get('/datos/manifest.json').status_code == 200
+    assert client.get('/datos/../precios_historicos.db').status_code == 404
+
+def test_pagina_mercado_cacheada_para_anonimos(client, mocker):
+    mocker.patch('web_app.app.get_db_market', return_value=mocker.Mock())
+    mock_publicaciones = mocker.patch('web_app.app.db_manager.obtener_publicaciones', return_value=[])
+
+    assert client.get('/mercado').status_code == 200
+    assert client.get('/mercado').status_code == 200
+    assert mock_publicaciones.call_count == 1
+
+    # Un POST exitoso (p.ej. publicar o borrar un lote) invalida las páginas cacheadas
+    mocker.patch('web_app.app.db_manager.get_usuario_por_email', return_value=None)
+    assert client.post('/login', data={'email': 'x@example.com', 'password': 'x'}).status_code < 400
+    client.get('/mercado')
+    assert mock_publicaciones.call_count == 2
+
 def test_api_subcategorias_sin_params(client):
     """Verifica el error 400 si olvidas el parámetro 'categoria'."""
     response = client.get('/api/subcategorias')
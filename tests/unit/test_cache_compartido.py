@@ -0,0 +1,97 @@
+import sys
+import os
+import pytest
+
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from shared_code.database import cache_compartido
+from shared_code.database.cache_compartido import CacheCompartido
+
+
+@pytest.fixture
+def ruta_cache(tmp_path):
+    return str(tmp_path / 'cache_respuestas.db')
+
+
+def test_lo_publicado_por_un_worker_lo_sirve_otro(ruta_cache):
+    """Dos instancias sobre el mismo archivo simulan dos workers de gunicorn."""
+    worker_a, worker_b = CacheCompartido(ruta_cache), CacheCompartido(ruta_cache)
+    cuerpo = b'{"precios": [' + b'1000.0, ' * 500 + b'1.0]}'  # Supera el umbral: se guarda comprimido
+
+    assert worker_b.obtener('api', '/api/faena?start=1', '7') is None
+    worker_a.publicar('api', '/api/faena?start=1', cuerpo, version='7',
+                      content_type='application/json', headers={'X-Agrupacion': 'semanal'})
+
+    guardada = worker_b.obtener('api', '/api/faena?start=1', '7')
+    assert guardada.cuerpo == cuerpo
+    assert guardada.content_type == 'application/json'
+    assert guardada.headers == {'X-Agrupacion': 'semanal'}
+    assert worker_b.estadisticas()['hits'] == 1
+    assert worker_a.estadisticas()['bytes'] < len(cuerpo)
+
+
+def test_version_nueva_invalida_las_anteriores(ruta_cache):
+    cache = CacheCompartido(ruta_cache)
+    cache.publicar('api', 'a', b'v1', version='1')
+    cache.publicar('pagina', 'p', b'html')
+
+    assert cache.obtener('api', 'a', '2') is None
+    cache.publicar('api', 'b', b'v2', version='2')
+    assert cache.estadisticas()['entradas'] == 2  # 'a' (versión 1) se borró; la página no se toca
+
+
+def test_ttl_e_invalidacion_por_espacio(ruta_cache, monkeypatch):
+    cache = CacheCompartido(ruta_cache)
+    ahora = [1000.0]
+    monkeypatch.setattr(cache_compartido.time, 'time', lambda: ahora[0])
+
+    cache.publicar('pagina', '/mercado?', b'<html>', ttl=60)
+    assert cache.obtener('pagina', '/mercado?') is not None
+    ahora[0] += 61
+    assert cache.obtener('pagina', '/mercado?') is None
+
+    cache.publicar('pagina', '/mercado?', b'<html>', ttl=60)
+    cache.invalidar('pagina')
+    assert cache.obtener('pagina', '/mercado?') is None
+
+
+def test_desalojo_por_tamano(ruta_cache, monkeypatch):
+    cache = CacheCompartido(ruta_cache, max_bytes=250)
+    ahora = [1000.0]
+    monkeypatch.setattr(cache_compartido.time, 'time', lambda: ahora[0])
+
+    for clave in ('a', 'b', 'c'):
+        ahora[0] += 1
+        cache.publicar('api', clave, b'x' * 100)
+
+    assert cache.obtener('api', 'a') is None  # La menos usada recientemente
+    assert cache.obtener('api', 'c') is not None
+    assert cache.estadisticas()['desalojos'] == 1
+    assert cache.publicar('api', 'enorme', os.urandom(1000)) is False
+
+
+def test_error_de_sqlite_es_un_miss(tmp_path):
+    cache = CacheCompartido(str(tmp_path / 'no_existe' / 'cache.db'))
+    assert cache.obtener('api', 'a') is None
+    assert cache.publicar('api', 'a', b'x') is False
+    assert cache.estadisticas()['errores'] == 2
+
+
+def test_contadores_compartidos_por_dia(ruta_cache, monkeypatch):
+    """Los dos workers suman sobre el mismo contador; el ranking solo mira los últimos días pedidos."""
+    worker_a, worker_b = CacheCompartido(ruta_cache), CacheCompartido(ruta_cache)
+    ahora = [1_760_000_000.0]
+    monkeypatch.setattr(cache_compartido.time, 'time', lambda: ahora[0])
+
+    for _ in range(3):
+        worker_a.contar('vistas', 'VACAS')  # Hace 100 días
+    ahora[0] += 100 * 86400
+    worker_a.contar('vistas', 'NOVILLOS')
+    worker_b.contar('vistas', 'NOVILLOS')
+    worker_b.contar('vistas', 'VAQUILLONAS')
+
+    assert worker_a.ranking('vistas', dias=90) == [('NOVILLOS', 2), ('VAQUILLONAS', 1)]
+    assert worker_b.ranking('vistas', dias=365)[0] == ('VACAS', 3)
+    assert worker_b.ranking('otro', dias=90) == []
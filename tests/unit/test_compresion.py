@@ -0,0 +1,64 @@
+import sys
+import os
+import gzip
+import pytest
+from werkzeug.http import parse_accept_header
+
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from web_app.utils import compresion
+from web_app.utils.compresion import CacheVariantes
+
+
+def _accept(valor):
+    return parse_accept_header(valor)
+
+
+@pytest.mark.parametrize("cabecera,esperada", [
+    ("gzip, deflate", 'gzip'),
+    ("gzip;q=0.5, br", 'br'),
+    ("br;q=0, gzip", 'gzip'),
+    ("*", 'br'),
+    ("identity", None),
+    ("", None),
+])
+def test_elegir_codificacion(monkeypatch, cabecera, esperada):
+    monkeypatch.setattr(compresion, 'brotli', object())  # Simula brotli instalado
+    assert compresion.elegir_codificacion(_accept(cabecera)) == esperada
+
+
+def test_sin_brotli_solo_gzip(monkeypatch):
+    monkeypatch.setattr(compresion, 'brotli', None)
+    assert compresion.elegir_codificacion(_accept("br, gzip;q=0.1")) == 'gzip'
+    assert compresion.elegir_codificacion(_accept("br")) is None
+
+
+def test_gzip_determinista_y_stream_equivalente():
+    datos = b'{"precio_promedio_kg": 1234.5}, ' * 5000
+    assert compresion.comprimir(datos, 'gzip') == compresion.comprimir(datos, 'gzip')
+
+    trozos = [datos[i:i + 1000].decode() for i in range(0, len(datos), 1000)]
+    en_stream = b''.join(compresion.comprimir_stream(trozos, 'gzip'))
+    assert gzip.decompress(en_stream) == datos
+
+
+def test_brotli_stream():
+    brotli = pytest.importorskip('brotli')
+    datos = b'fecha,precio\n' + b'2025-11-20,1234.5\n' * 5000
+    en_stream = b''.join(compresion.comprimir_stream(compresion._en_bloques(datos), 'br'))
+    assert brotli.decompress(en_stream) == datos
+
+
+def test_cache_variantes_reutiliza_y_acota():
+    cache = CacheVariantes(max_bytes=200)
+    datos = os.urandom(150)  # Incompresible: cada variante ocupa ~170 bytes
+
+    primera = cache.obtener('v1-a', 'gzip', datos)
+    assert cache.obtener('v1-a', 'gzip', datos) is primera
+    cache.obtener('v1-b', 'gzip', datos)
+
+    estadisticas = cache.estadisticas()
+    assert (estadisticas['hits'], estadisticas['misses']) == (1, 2)
+    assert estadisticas['variantes'] == 1  # La más vieja se desalojó
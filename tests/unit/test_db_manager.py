@@ -7,12 +7,15 @@ import sys
 import os
 import pytest
 import sqlite3
+import time
+import threading
 from datetime import datetime
 
 project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
+from tests.conftest import fila_faena
 from shared_code.database import db_manager
 
 # Las fixtures conn_precios y conn_market ahora vienen de conftest.py
@@ -71,6 +74,581 @@ def test_insertar_y_obtener_faena(conn_precios):
     assert len(data_historica) == 1
     assert data_historica[0]['precio_promedio_kg'] == 1000.0
 
+def test_variacion_semanal_materializada_as_of(conn_precios):
+    # Lunes 03/11 y martes 11/11: la referencia del martes es el último dato <= 04/11
+    db_manager.insertar_datos_faena(conn_precios, [fila_faena('03/11/2025', 1000)])
+    db_manager.insertar_datos_faena(conn_precios, [fila_faena('11/11/2025', 1100)])
+
+    cursor = conn_precios.cursor()
+    cursor.execute("SELECT variacion_semanal_precio, fecha_referencia_variacion FROM faena WHERE fecha_consulta = '2025-11-11'")
+    fila = cursor.fetchone()
+    assert fila['variacion_semanal_precio'] == 10.0
+    assert fila['fecha_referencia_variacion'] == '2025-11-03'
+
+    data = db_manager.get_faena_historico(conn_precios, '2025-11-01', '2025-11-30')
+    assert [d['variacion_semanal_precio'] for d in data] == [None, 10.0]
+
+def test_variacion_semanal_no_mezcla_series(conn_precios):
+    db_manager.insertar_datos_faena(conn_precios, [
+        fila_faena('03/11/2025', 1000, raza='Angus'),
+        fila_faena('03/11/2025', 500, raza='Hereford'),
+    ])
+    db_manager.insertar_datos_faena(conn_precios, [fila_faena('10/11/2025', 550, raza='Hereford')])
+
+    variaciones = db_manager.get_variacion_faena(conn_precios, '2025-11-10')
+    assert variaciones[('NOVILLOS', 'Hereford', '300-400 kg')] == (10.0, '2025-11-03')
+
+def test_recalcular_variacion_faena_historico(conn_precios):
+    db_manager.insertar_datos_faena(conn_precios, [fila_faena('03/11/2025', 1000), fila_faena('10/11/2025', 900)])
+    conn_precios.execute("UPDATE faena SET variacion_semanal_precio = NULL, fecha_referencia_variacion = NULL")
+    conn_precios.commit()
+
+    db_manager.recalcular_variacion_faena(conn_precios)
+
+    variaciones = db_manager.get_variacion_faena(conn_precios, '2025-11-10')
+    assert variaciones[('NOVILLOS', 'Angus', '300-400 kg')] == (-10.0, '2025-11-03')
+
+def test_crear_tablas_precios_migra_columnas_variacion():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("""
+        CREATE TABLE faena (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, fecha_extraccion TIMESTAMP NOT NULL,
+            fecha_consulta TEXT NOT NULL, tipo_hacienda TEXT, categoria_original TEXT NOT NULL,
+            raza TEXT, rango_peso TEXT, precio_max_kg REAL, precio_min_kg REAL,
+            precio_promedio_kg REAL, cabezas INTEGER, kilos_total INTEGER, importe_total REAL,
+            UNIQUE(fecha_consulta, categoria_original, raza, rango_peso)
+        )
+    """)
+    db_manager.crear_tablas_precios(conn)
+
+    columnas = {row[1] for row in conn.execute("PRAGMA table_info(faena)")}
+    assert {'variacion_semanal_precio', 'fecha_referencia_variacion'} <= columnas
+    conn.close()
+
+def test_faena_agrupado_semanal_y_mensual(conn_precios):
+    # Lunes 03/11, miércoles 05/11 y lunes 10/11 de 2025
+    db_manager.insertar_datos_faena(conn_precios, [
+        fila_faena('03/11/2025', 1000, cabezas=10),
+        fila_faena('05/11/2025', 1200, cabezas=30),
+        fila_faena('10/11/2025', 1100, cabezas=20),
+    ])
+
+    agrupacion, semanas = db_manager.get_faena_agrupado(conn_precios, '2025-11-01', '2025-11-30', agrupacion='semanal')
+    assert agrupacion == 'semanal'
+    assert [s['fecha_consulta'] for s in semanas] == ['03/11/2025', '10/11/2025']
+    primera = semanas[0]
+    assert primera['precio_promedio_kg'] == 1100.0
+    assert primera['precio_ponderado_kg'] == 1150.0  # (1000*10 + 1200*30) / 40
+    assert primera['cabezas'] == 40
+    assert (primera['precio_promedio_min'], primera['precio_promedio_max']) == (1000.0, 1200.0)
+
+    _, meses = db_manager.get_faena_agrupado(conn_precios, '2025-11-01', '2025-11-30', agrupacion='mensual')
+    assert len(meses) == 1
+    assert meses[0]['fecha_consulta'] == '01/11/2025'
+    assert meses[0]['registros'] == 3
+
+def test_faena_agrupado_auto_resuelve_por_tamano(conn_precios, monkeypatch):
+    db_manager.insertar_datos_faena(conn_precios, [fila_faena(f'{d:02d}/11/2025', 1000) for d in range(1, 11)])
+
+    agrupacion, _ = db_manager.get_faena_agrupado(conn_precios, '2025-11-01', '2025-11-30', agrupacion='auto')
+    assert agrupacion == 'diario'
+
+    monkeypatch.setattr(db_manager, 'UMBRAL_AUTO_SEMANAL', 5)
+    agrupacion, _ = db_manager.get_faena_agrupado(conn_precios, '2025-11-01', '2025-11-30', agrupacion='auto')
+    assert agrupacion == 'semanal'
+
+def test_invernada_agrupado_mensual(conn_precios):
+    db_manager.insertar_datos_invernada(conn_precios, [
+        {'fecha_consulta_inicio': '01/11/2025', 'fecha_consulta_fin': '07/11/2025',
+         'categoria_original': 'Terneros', 'precio_promedio_kg': 2000, 'cabezas': 100},
+        {'fecha_consulta_inicio': '08/11/2025', 'fecha_consulta_fin': '14/11/2025',
+         'categoria_original': 'Terneros', 'precio_promedio_kg': 2200, 'cabezas': 300},
+    ])
+    _, meses = db_manager.get_invernada_agrupado(conn_precios, '2025-11-01', '2025-11-30', 'Terneros', agrupacion='mensual')
+    assert meses == [{
+        'fecha_consulta_fin': '01/11/2025', 'precio_promedio_kg': 2100.0, 'precio_ponderado_kg': 2150.0,
+        'cabezas': 400, 'precio_promedio_min': 2000.0, 'precio_promedio_max': 2200.0, 'registros': 2,
+    }]
+
+def test_agrupacion_invalida(conn_precios):
+    with pytest.raises(ValueError):
+        db_manager.get_faena_agrupado(conn_precios, '2025-11-01', '2025-11-30', agrupacion='anual')
+
+def test_faena_columnar_agrupa_dimensiones_constantes(conn_precios):
+    db_manager.insertar_datos_faena(conn_precios, [fila_faena('03/11/2025', 1000), fila_faena('04/11/2025', 1100)])
+
+    serie = db_manager.get_faena_columnar(conn_precios, '2025-11-01', '2025-11-30', categoria='NOVILLOS')
+    assert serie['n'] == 2
+    assert serie['constantes'] == {'categoria_original': 'NOVILLOS', 'raza': 'Angus', 'rango_peso': '300-400 kg'}
+    assert serie['columnas']['fecha_consulta'] == ['2025-11-03', '2025-11-04']
+    assert serie['columnas']['precio_promedio_kg'] == [1000.0, 1100.0]
+    assert 'raza' not in serie['columnas']
+
+    # Una dimensión que varía se mantiene como columna; fechas como días desde 1970-01-01
+    db_manager.insertar_datos_faena(conn_precios, [fila_faena('05/11/2025', 900, raza='Hereford')])
+    serie = db_manager.get_faena_columnar(conn_precios, '2025-11-01', '2025-11-30', formato_fecha='epoch_day')
+    assert serie['columnas']['raza'] == ['Angus', 'Angus', 'Hereford']
+    assert serie['columnas']['fecha_consulta'][0] == 20395  # 2025-11-03
+    assert 'raza' not in serie['constantes']
+
+def test_agrupado_columnar_igual_a_filas(conn_precios):
+    db_manager.insertar_datos_faena(conn_precios, [fila_faena(f'{d:02d}/11/2025', 1000 + d) for d in range(1, 20)])
+
+    _, filas = db_manager.get_faena_agrupado(conn_precios, '2025-11-01', '2025-11-30', agrupacion='semanal')
+    _, serie = db_manager.get_faena_agrupado(conn_precios, '2025-11-01', '2025-11-30', agrupacion='semanal',
+                                             formato_fecha='iso')
+    assert serie['n'] == len(filas)
+    assert serie['columnas']['precio_promedio_kg'] == [f['precio_promedio_kg'] for f in filas]
+    assert serie['columnas']['fecha_consulta'][0] == '2025-10-27'
+
+def test_formato_fecha_invalido(conn_precios):
+    with pytest.raises(ValueError):
+        db_manager.get_faena_columnar(conn_precios, '2025-11-01', '2025-11-30', formato_fecha='unix')
+
+def test_cambios_desde_cursor(conn_precios):
+    """El delta trae solo filas nuevas o con valores distintos; un reemplazo arrastra la variación de fechas posteriores."""
+    rango = ('2025-11-01', '2025-11-30')
+    db_manager.insertar_datos_faena(conn_precios, [fila_faena('03/11/2025', 1000)])
+    primera = db_manager.get_faena_cambios(conn_precios, *rango, categoria='NOVILLOS', desde=0)
+    assert [f['fecha_consulta'] for f in primera['datos']] == ['03/11/2025']
+
+    db_manager.insertar_datos_faena(conn_precios, [fila_faena('11/11/2025', 1100)])
+    segunda = db_manager.get_faena_cambios(conn_precios, *rango, categoria='NOVILLOS', desde=primera['cursor'])
+    assert [f['fecha_consulta'] for f in segunda['datos']] == ['11/11/2025']
+    assert segunda['cursor'] == primera['cursor'] + 1
+
+    # Corrección del 03/11: cambia su precio y la variación materializada del 11/11
+    db_manager.insertar_datos_faena(conn_precios, [fila_faena('03/11/2025', 1050)])
+    tercera = db_manager.get_faena_cambios(conn_precios, *rango, desde=segunda['cursor'], formato_fecha='iso')
+    assert tercera['columnas']['fecha_consulta'] == ['2025-11-03', '2025-11-11']
+    assert tercera['columnas']['variacion_semanal_precio'][1] == pytest.approx(4.76)
+
+    # Recalcular sin cambios no marca filas
+    db_manager.recalcular_variacion_faena(conn_precios)
+    assert db_manager.get_faena_cambios(conn_precios, *rango, desde=tercera['cursor'])['datos'] == []
+
+def test_cambios_con_cursor_de_fecha(conn_precios):
+    db_manager.insertar_datos_invernada(conn_precios, [
+        {'fecha_consulta_inicio': '03/11/2025', 'fecha_consulta_fin': '07/11/2025',
+         'categoria_original': 'Terneros', 'precio_promedio_kg': 3000.0, 'cabezas': 5},
+    ])
+    rango = ('2025-11-01', '2025-11-30')
+    assert db_manager.resolver_cursor(conn_precios, '2000-01-01') is None  # Anterior al historial: todo
+    assert len(db_manager.get_invernada_cambios(conn_precios, *rango, desde='2000-01-01')['datos']) == 1
+    assert db_manager.get_invernada_cambios(conn_precios, *rango, desde='2999-01-01T00:00:00')['datos'] == []
+    with pytest.raises(ValueError):
+        db_manager.resolver_cursor(conn_precios, 'ayer')
+
+def test_version_datos_se_incrementa_con_cada_escritura(conn_precios):
+    version_inicial, _ = db_manager.get_version_datos_db(conn_precios)
+
+    db_manager.insertar_datos_faena(conn_precios, [fila_faena('03/11/2025', 1000)])
+    db_manager.insertar_datos_invernada(conn_precios, [{
+        'fecha_consulta_inicio': '01/11/2025', 'fecha_consulta_fin': '07/11/2025',
+        'categoria_original': 'Terneros', 'precio_promedio_kg': 2000,
+    }])
+    assert db_manager.get_version_datos_db(conn_precios)[0] == version_inicial + 2
+
+    # Un lote sin filas válidas no toca la versión
+    db_manager.insertar_datos_faena(conn_precios, [{'fecha_consulta_inicio': 'fecha-rota'}])
+    assert db_manager.get_version_datos_db(conn_precios)[0] == version_inicial + 2
+
+def test_upsert_faena_solo_escribe_lo_que_cambio(conn_precios):
+    lote = [fila_faena('03/11/2025', 1000), fila_faena('10/11/2025', 1100), fila_faena('10/11/2025', 900, raza='Hereford')]
+    assert db_manager.insertar_datos_faena(conn_precios, lote, detalle=True) == \
+        {'insertados': 3, 'actualizados': 0, 'sin_cambios': 0}
+    version, _ = db_manager.get_version_datos_db(conn_precios)
+    antes = conn_precios.execute("SELECT id, fecha_extraccion FROM faena ORDER BY id").fetchall()
+
+    # Re-scrape idéntico (corrida de las 20:00): no reescribe filas ni toca la versión
+    assert db_manager.insertar_datos_faena(conn_precios, lote, detalle=True) == \
+        {'insertados': 0, 'actualizados': 0, 'sin_cambios': 3}
+    assert db_manager.get_version_datos_db(conn_precios)[0] == version
+    assert conn_precios.execute("SELECT id, fecha_extraccion FROM faena ORDER BY id").fetchall() == antes
+
+    # Un precio corregido se actualiza en su lugar (mismo id) y recalcula la variación
+    lote[1] = fila_faena('10/11/2025', 1200)
+    assert db_manager.insertar_datos_faena(conn_precios, lote + [fila_faena('11/11/2025', 1300)]) == 2
+    fila = conn_precios.execute("SELECT id, variacion_semanal_precio, version_cambio FROM faena "
+                                "WHERE fecha_consulta = '2025-11-10' AND raza = 'Angus'").fetchone()
+    assert fila['id'] == antes[1]['id']
+    assert fila['variacion_semanal_precio'] == 20.0
+    assert fila['version_cambio'] == version + 1
+    assert db_manager.get_version_datos_db(conn_precios)[0] == version + 1
+
+def test_upsert_invernada_cuenta_insertados_actualizados_y_sin_cambios(conn_precios):
+    fila = {'fecha_consulta_inicio': '01/11/2025', 'fecha_consulta_fin': '07/11/2025',
+            'categoria_original': 'Terneros', 'precio_promedio_kg': 2000, 'cabezas': 50}
+    db_manager.insertar_datos_invernada(conn_precios, [fila])
+    version, _ = db_manager.get_version_datos_db(conn_precios)
+
+    nueva = dict(fila, categoria_original='Terneras')
+    assert db_manager.insertar_datos_invernada(conn_precios, [dict(fila, cabezas=60), nueva, fila | {'fecha_consulta_fin': 'rota'}],
+                                               detalle=True) == {'insertados': 1, 'actualizados': 1, 'sin_cambios': 0}
+    assert db_manager.insertar_datos_invernada(conn_precios, [nueva], detalle=True)['sin_cambios'] == 1
+    assert db_manager.get_version_datos_db(conn_precios)[0] == version + 1
+    assert conn_precios.execute("SELECT COUNT(*) FROM invernada").fetchone()[0] == 2
+
+def test_upsert_faena_raza_y_peso_nulos_no_duplica(conn_precios):
+    """Las filas de CAC llegan con raza / rango_peso en None: reingestarlas no debe duplicarlas."""
+    fila = fila_faena('03/11/2025', 1000, raza=None, rango_peso=None)
+    db_manager.insertar_datos_faena(conn_precios, [fila])
+    version, _ = db_manager.get_version_datos_db(conn_precios)
+
+    for _ in range(2):
+        assert db_manager.insertar_datos_faena(conn_precios, [fila], detalle=True) == \
+            {'insertados': 0, 'actualizados': 0, 'sin_cambios': 1}
+    assert db_manager.insertar_datos_faena(conn_precios, [dict(fila, precio_promedio_kg=1100)], detalle=True) == \
+        {'insertados': 0, 'actualizados': 1, 'sin_cambios': 0}
+    assert conn_precios.execute("SELECT COUNT(*) FROM faena").fetchone()[0] == 1
+    assert db_manager.get_version_datos_db(conn_precios)[0] == version + 1
+
+def test_crear_tablas_elimina_faena_repetida_de_bases_previas(conn_precios):
+    """Una base con filas NULL ya duplicadas se limpia al crear el índice de la clave (queda la última)."""
+    db_manager.insertar_datos_faena(conn_precios, [fila_faena('03/11/2025', 1000, raza=None, rango_peso=None)])
+    conn_precios.execute("DROP INDEX idx_faena_clave")
+    conn_precios.execute("""
+        INSERT INTO faena (fecha_extraccion, fecha_consulta, categoria_original, precio_promedio_kg, cabezas)
+        VALUES ('2025-11-03T20:00:00', '2025-11-03', 'NOVILLOS', 1200, 10)
+    """)
+    version, _ = db_manager.get_version_datos_db(conn_precios)
+
+    db_manager.crear_tablas_precios(conn_precios)
+
+    assert [tuple(f) for f in conn_precios.execute("SELECT precio_promedio_kg FROM faena")] == [(1200,)]
+    assert conn_precios.execute("SELECT suma_precio FROM faena_rollup WHERE tipo_periodo = 'semanal'").fetchone()[0] == 1200
+    assert db_manager.get_version_datos_db(conn_precios)[0] == version + 1
+
+def test_version_datos_se_publica_en_archivo_sello(tmp_path, monkeypatch):
+    """Solo la base canónica publica el sello que leen los workers web."""
+    ruta_db = str(tmp_path / 'precios_historicos.db')
+    monkeypatch.setattr(db_manager, 'DB_PRECIOS_PATH', ruta_db)
+    monkeypatch.setattr(db_manager, 'ARCHIVO_VERSION_PRECIOS', ruta_db + '.version')
+
+    conn = db_manager.get_db_connection(ruta_db)
+    db_manager.crear_tablas_precios(conn)
+    assert db_manager.get_version_datos()[0] == 1
+
+    db_manager.insertar_datos_faena(conn, [fila_faena('03/11/2025', 1000)])
+    version, actualizada = db_manager.get_version_datos()
+    assert version == 2
+    assert isinstance(actualizada, datetime)
+    conn.close()
+
+    # Una base en memoria (tests, scripts) no pisa el sello
+    conn_memoria = sqlite3.connect(":memory:")
+    db_manager.crear_tablas_precios(conn_memoria)
+    db_manager.insertar_datos_faena(conn_memoria, [fila_faena('03/11/2025', 1000)])
+    assert db_manager.get_version_datos()[0] == 2
+    conn_memoria.close()
+
+class _Reloj:
+    def __init__(self):
+        self.ahora = 1000.0
+
+    def monotonic(self):
+        return self.ahora
+
+@pytest.fixture
+def cache_lecturas(monkeypatch):
+    """Caché aislada con reloj controlado y versión de datos fija (modificable vía `version`)."""
+    reloj = _Reloj()
+    version = {'actual': 1}
+    monkeypatch.setattr(db_manager, 'time', reloj)
+    monkeypatch.setattr(db_manager, 'get_version_datos', lambda: (version['actual'], datetime(2025, 11, 20)))
+    cache = db_manager.CacheLecturas(max_entradas=3, max_bytes=10 ** 6, ttl=60, swr=30)
+    return cache, reloj, version
+
+def test_cache_lecturas_hit_y_ttl(cache_lecturas):
+    cache, reloj, _ = cache_lecturas
+    calculos = []
+    calcular = lambda: calculos.append(1) or len(calculos)
+
+    assert cache.obtener('a', calcular) == 1
+    assert cache.obtener('a', calcular) == 1
+    reloj.ahora += 100  # Fuera de TTL y de la ventana stale-while-revalidate
+    assert cache.obtener('a', calcular) == 2
+
+    stats = cache.estadisticas()
+    assert (stats['hits'], stats['misses']) == (1, 2)
+    assert stats['hit_ratio'] == pytest.approx(1 / 3, abs=1e-4)
+
+def test_cache_lecturas_stale_while_revalidate(cache_lecturas):
+    cache, reloj, _ = cache_lecturas
+    valores = iter(['viejo', 'nuevo'])
+    calcular = lambda: next(valores)
+
+    cache.obtener('a', calcular)
+    reloj.ahora += 70  # Vencido pero dentro de la ventana SWR
+    assert cache.obtener('a', calcular) == 'viejo'
+
+    for _ in range(100):  # El refresco corre en un hilo aparte
+        if not cache._refrescando:
+            break
+        time.sleep(0.01)
+    assert cache.obtener('a', calcular) == 'nuevo'
+    assert cache.estadisticas()['stale_hits'] == 1
+
+def test_cache_lecturas_se_invalida_con_nueva_version(cache_lecturas):
+    """Una escritura (en este u otro proceso) cambia la versión del sello e invalida todo."""
+    cache, _, version = cache_lecturas
+    cache.obtener('a', lambda: 'antes')
+    version['actual'] = 2
+    assert cache.obtener('a', lambda: 'despues') == 'despues'
+    assert cache.estadisticas()['invalidaciones'] == 1
+
+def test_cache_lecturas_acotada_lru(cache_lecturas):
+    cache, _, _ = cache_lecturas
+    for clave in 'abc':
+        cache.obtener(clave, lambda: clave)
+    cache.obtener('a', lambda: 'otro')   # 'a' pasa a ser la más reciente
+    cache.obtener('d', lambda: 'd')      # Desaloja 'b'
+
+    assert cache.obtener('a', lambda: 'otro') == 'a'
+    assert cache.obtener('b', lambda: 'recalculado') == 'recalculado'
+    assert cache.estadisticas()['desalojos'] >= 1
+
+    # Límite de memoria: un resultado más grande que la caché no se guarda
+    cache.max_bytes = 1000
+    cache.obtener('grande', lambda: list(range(1000)))
+    assert cache.estadisticas()['bytes'] <= 1000
+
+def test_clave_lectura_normaliza_parametros():
+    clave = db_manager._clave_lectura
+    funcion = db_manager.get_faena_historico
+    assert clave(funcion, ('2025-11-01', '2025-11-30', 'NOVILLOS', ''), {}) == \
+        clave(funcion, ('2025-11-01', '2025-11-30', ' NOVILLOS', None), {})
+    assert clave(funcion, (), {'a': 1, 'b': 2}) == clave(funcion, (), {'b': 2, 'a': 1})
+
+def test_single_flight_comparte_el_calculo():
+    """Pedidos idénticos concurrentes esperan al que está calculando y reciben su resultado."""
+    vuelos = db_manager.LecturasEnVuelo()
+    liberar, calculos = threading.Event(), []
+
+    def calcular():
+        calculos.append(1)
+        liberar.wait(5)
+        return ['fila']
+
+    resultados = []
+    hilos = [threading.Thread(target=lambda: resultados.append(vuelos.ejecutar('a', calcular))) for _ in range(5)]
+    for hilo in hilos:
+        hilo.start()
+    for _ in range(200):  # Hasta que los 4 seguidores estén esperando
+        if vuelos.estadisticas()['coalescidas'] == 4:
+            break
+        time.sleep(0.005)
+    liberar.set()
+    for hilo in hilos:
+        hilo.join()
+
+    assert len(calculos) == 1
+    assert resultados == [['fila']] * 5
+    stats = vuelos.estadisticas()
+    assert (stats['ejecutadas'], stats['coalescidas'], stats['en_vuelo']) == (1, 4, 0)
+    assert vuelos.ejecutar('a', lambda: 'nuevo') == 'nuevo'  # Terminado el vuelo, se vuelve a calcular
+
+def test_single_flight_propaga_error_y_espera_maxima():
+    vuelos = db_manager.LecturasEnVuelo(espera_max=0.01)
+    en_curso = threading.Event()
+
+    def fallar():
+        en_curso.set()
+        time.sleep(0.05)
+        raise sqlite3.OperationalError("database is locked")
+
+    errores = []
+    def seguir():
+        try:
+            vuelos.ejecutar('a', fallar)
+        except sqlite3.Error as e:
+            errores.append(e)
+    lider = threading.Thread(target=seguir)
+    lider.start()
+    en_curso.wait(1)
+    assert vuelos.ejecutar('a', lambda: 'propio') == 'propio'  # Espera vencida: calcula por su cuenta
+    lider.join()
+
+    assert len(errores) == 1
+    stats = vuelos.estadisticas()
+    assert (stats['esperas_vencidas'], stats['errores']) == (1, 1)
+
+def _cargar_faena_varios_meses(conn):
+    filas = []
+    for mes in (9, 10, 11, 12):
+        for dia in range(1, 29, 2):
+            for raza, base in (('Angus', 1000), ('Hereford', 900)):
+                filas.append(dict(fila_faena(f'{dia:02d}/{mes:02d}/2025', base + mes * 10 + dia, raza=raza),
+                                  cabezas=dia, kilos_total=dia * 400, importe_total=dia * 400 * (base + mes)))
+    db_manager.insertar_datos_faena(conn, filas)
+
+@pytest.mark.parametrize("agrupacion", ['semanal', 'mensual'])
+def test_agrupado_con_rollups_igual_a_crudo(conn_precios, monkeypatch, agrupacion):
+    """Rollups (períodos completos) + bordes crudos deben dar lo mismo que agregar todo desde las filas crudas."""
+    _cargar_faena_varios_meses(conn_precios)
+    rango = ('2025-09-10', '2025-12-05')
+
+    _, con_rollups = db_manager.get_faena_agrupado(conn_precios, *rango, categoria='NOVILLOS', agrupacion=agrupacion)
+    monkeypatch.setattr(db_manager, '_periodos_completos', lambda *args: None)
+    _, crudo = db_manager.get_faena_agrupado(conn_precios, *rango, categoria='NOVILLOS', agrupacion=agrupacion)
+
+    assert len(con_rollups) == len(crudo) > 3
+    for a, b in zip(con_rollups, crudo):
+        assert a.keys() == b.keys()
+        for clave in a:
+            assert a[clave] == pytest.approx(b[clave])
+    assert con_rollups[0]['precio_ponderado_kilos'] is not None
+
+def test_rollups_se_actualizan_al_insertar(conn_precios):
+    db_manager.insertar_datos_faena(conn_precios, [fila_faena('03/11/2025', 1000), fila_faena('05/11/2025', 1200)])
+    # Reingesta del 05/11 con otro precio: solo cambia la semana y el mes que la contienen
+    db_manager.insertar_datos_faena(conn_precios, [fila_faena('05/11/2025', 1400)])
+
+    fila = conn_precios.execute("""
+        SELECT registros, suma_precio, precio_max FROM faena_rollup
+        WHERE tipo_periodo = 'semanal' AND periodo = '2025-11-03'
+    """).fetchone()
+    assert tuple(fila) == (2, 2400.0, 1400.0)
+
+    _, meses = db_manager.get_faena_agrupado(conn_precios, '2025-11-01', '2025-11-30', agrupacion='mensual')
+    assert meses[0]['precio_promedio_kg'] == 1200.0
+
+def test_rollups_se_pueblan_en_base_existente():
+    """Una base creada antes de los rollups los obtiene al crear tablas; reconstruir_rollups los regenera."""
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    db_manager.crear_tablas_precios(conn)
+    _cargar_faena_varios_meses(conn)
+    conn.execute("DROP TABLE faena_rollup")
+
+    db_manager.crear_tablas_precios(conn)
+    filas = conn.execute("SELECT COUNT(*) FROM faena_rollup").fetchone()[0]
+    assert filas > 0
+
+    conn.execute("DELETE FROM faena_rollup")
+    assert db_manager.reconstruir_rollups(conn)['faena_rollup'] == filas
+    conn.close()
+
+
+def test_catalogo_series_arbol_filtrado_con_rangos(conn_precios):
+    db_manager.insertar_datos_faena(conn_precios, [
+        fila_faena('03/11/2025', 1000),
+        fila_faena('10/11/2025', 1100, rango_peso='400-500 kg'),
+        fila_faena('05/11/2025', 900, raza='Hereford'),
+        fila_faena('05/11/2025', 900, categoria='NOVILLOS + CRUZA CEBU'),
+        fila_faena('05/11/2025', 900, categoria='VACAS CRUZA'),
+    ])
+    db_manager.insertar_datos_invernada(conn_precios, [
+        {'fecha_consulta_inicio': '01/11/2025', 'fecha_consulta_fin': '07/11/2025', 'categoria_original': 'Terneros 160-180 kg',
+         'precio_promedio_kg': 3000.0, 'cabezas': 100},
+        {'fecha_consulta_inicio': '01/11/2025', 'fecha_consulta_fin': '07/11/2025', 'categoria_original': 'Ternera Holando',
+         'precio_promedio_kg': 2000.0, 'cabezas': 10},
+    ])
+
+    catalogo = db_manager.get_catalogo_series(conn_precios)
+
+    assert [n['categoria'] for n in catalogo['faena']] == ['NOVILLOS']
+    novillos = catalogo['faena'][0]
+    assert (novillos['desde'], novillos['hasta']) == ('2025-11-03', '2025-11-10')
+    angus = next(r for r in novillos['razas'] if r['raza'] == 'Angus')
+    assert [p['rango_peso'] for p in angus['pesos']] == ['300-400 kg', '400-500 kg']
+    assert (angus['pesos'][1]['desde'], angus['pesos'][1]['registros']) == ('2025-11-10', 1)
+    assert catalogo['invernada'] == [{'categoria': 'Terneros 160-180 kg', 'desde': '2025-11-07',
+                                      'hasta': '2025-11-07', 'registros': 1}]
+
+def test_catalogo_series_se_calcula_si_no_esta_guardado(conn_precios):
+    """Base previa al catálogo: se calcula en el momento y crear_tablas_precios lo guarda."""
+    db_manager.insertar_datos_faena(conn_precios, [fila_faena('03/11/2025', 1000)])
+    conn_precios.execute("DELETE FROM metadatos WHERE clave = 'catalogo_series'")
+
+    assert db_manager.get_catalogo_series(conn_precios)['faena'][0]['categoria'] == 'NOVILLOS'
+    db_manager.crear_tablas_precios(conn_precios)
+    assert conn_precios.execute("SELECT 1 FROM metadatos WHERE clave = 'catalogo_series'").fetchone()
+
+
+def test_iterar_faena_historico_por_lotes(conn_precios):
+    db_manager.insertar_datos_faena(conn_precios, [fila_faena(f'{d:02d}/11/2025', 1000 + d) for d in range(1, 8)])
+
+    lotes = list(db_manager.iterar_faena_historico(conn_precios, '2025-11-01', '2025-11-30', tamano_lote=3))
+
+    assert [len(l) for l in lotes] == [3, 3, 1]
+    assert [f for l in lotes for f in l] == db_manager.get_faena_historico(conn_precios, '2025-11-01', '2025-11-30')
+
+
+def test_exportar_precios_filas_crudas_por_lotes(conn_precios):
+    db_manager.insertar_datos_faena(conn_precios, [
+        fila_faena('05/11/2025', 1200), fila_faena('03/11/2025', 1000), fila_faena('04/11/2025', 900, raza='Hereford'),
+    ])
+
+    columnas, lotes = db_manager.exportar_precios(conn_precios, 'faena', '2025-11-01', '2025-11-30', raza='Angus',
+                                                  tamano_lote=1)
+    filas = [fila for lote in lotes for fila in lote]
+
+    assert columnas == list(db_manager.COLUMNAS_EXPORTACION['faena'])
+    assert [f[0] for f in filas] == ['2025-11-03', '2025-11-05']
+    assert filas[1][columnas.index('precio_promedio_kg')] == 1200
+    with pytest.raises(ValueError):
+        db_manager.exportar_precios(conn_precios, 'users', '2025-11-01', '2025-11-30')
+
+
+def test_agrupado_multi_igual_a_una_consulta_por_serie(conn_precios):
+    _cargar_faena_varios_meses(conn_precios)
+    db_manager.insertar_datos_faena(conn_precios, [
+        fila_faena(f'{d:02d}/10/2025', 800 + d, categoria='VAQUILLONAS', raza='Hereford') for d in range(1, 29)
+    ])
+    series = [('NOVILLOS', 'Angus', '300-400 kg'), ('VAQUILLONAS', None, None), ('NOVILLOS', '', '')]
+
+    for agrupacion in ('diario', 'semanal', 'mensual'):
+        aplicada, por_serie = db_manager.get_faena_agrupado_multi(conn_precios, '2025-09-10', '2025-11-20', series,
+                                                                  agrupacion=agrupacion)
+        assert aplicada == agrupacion and len(por_serie) == 3
+        for clave, filas in zip(series, por_serie):
+            _, esperadas = db_manager.get_faena_agrupado(conn_precios, '2025-09-10', '2025-11-20', *clave,
+                                                         agrupacion=agrupacion)
+            assert filas == esperadas
+
+def test_agrupado_multi_columnar_y_limites(conn_precios):
+    db_manager.insertar_datos_invernada(conn_precios, [
+        {'fecha_consulta_inicio': '01/11/2025', 'fecha_consulta_fin': '07/11/2025', 'categoria_original': categoria,
+         'precio_promedio_kg': 3000.0, 'cabezas': 100} for categoria in ('Terneros 160-180 kg', 'Vaquillonas')
+    ])
+    _, por_serie = db_manager.get_invernada_agrupado_multi(conn_precios, '2025-11-01', '2025-11-30',
+                                                           ['Vaquillonas', 'Inexistente'], agrupacion='diario',
+                                                           formato_fecha='epoch_day')
+    assert por_serie[0]['columnas']['fecha_consulta_fin'] == [20399]
+    assert por_serie[1]['n'] == 0
+    with pytest.raises(ValueError):
+        db_manager.get_invernada_agrupado_multi(conn_precios, '2025-11-01', '2025-11-30', [])
+
+
+def test_resumen_faena_kpis(conn_precios):
+    db_manager.insertar_datos_faena(conn_precios, [
+        fila_faena('03/10/2025', 900),                      # Período anterior
+        fila_faena('03/11/2025', 1000), fila_faena('10/11/2025', 1500),
+        fila_faena('17/11/2025', 800), fila_faena('24/11/2025', 1100),
+        fila_faena('20/11/2025', 5000, raza='Hereford'),    # Otra serie: no cuenta
+    ])
+
+    r = db_manager.get_faena_resumen(conn_precios, '2025-11-01', '2025-11-30', 'NOVILLOS', 'Angus', '300-400 kg')
+
+    assert (r['registros'], r['cabezas_total']) == (4, 40)
+    assert (r['precio_max'], r['fecha_max']) == (1500, '2025-11-10')
+    assert (r['precio_min'], r['fecha_min']) == (800, '2025-11-17')
+    assert (r['precio_ultimo'], r['fecha_ultimo']) == (1100, '2025-11-24')
+    assert r['precio_promedio'] == 1100
+    assert r['precio_promedio_anterior'] == 900
+    assert r['variacion_periodo'] == 22.22
+
+def test_resumen_con_rollups_igual_a_crudo(conn_precios, monkeypatch):
+    """Un rango de varios meses usa los rollups mensuales; el resultado no cambia si se fuerzan las filas crudas."""
+    _cargar_faena_varios_meses(conn_precios)
+    con_rollups = db_manager.get_faena_resumen(conn_precios, '2025-09-10', '2025-12-20', 'NOVILLOS')
+    monkeypatch.setattr(db_manager, '_periodos_completos', lambda *a: None)
+    crudo = db_manager.get_faena_resumen(conn_precios, '2025-09-10', '2025-12-20', 'NOVILLOS')
+
+    assert con_rollups == pytest.approx(crudo)
+    assert db_manager.get_invernada_resumen(conn_precios, '2025-09-10', '2025-12-20')['registros'] == 0
+
 
 # === TESTS BASE DE DATOS TRANSACCIONAL (Marketplace) ===
 
@@ -142,3 +720,253 @@ def test_guardar_media(conn_market):
     archivos = [m['filename'] for m in galeria]
     assert "video.mp4" in archivos
     assert "foto.jpg" in archivos
+
+
+# === TESTS POOL DE CONEXIONES ===
+
+def test_pool_reutiliza_conexiones(tmp_path):
+    pool = db_manager.ConnectionPool(str(tmp_path / "pool.db"), size=2)
+
+    conn = pool.adquirir()
+    pool.liberar(conn)
+    conn_2 = pool.adquirir()
+
+    assert conn_2 is conn
+    stats = pool.estadisticas()
+    assert stats['misses'] == 1
+    assert stats['hits'] == 1
+    assert stats['abiertas'] == 1
+    pool.liberar(conn_2)
+    pool.cerrar()
+
+def test_pool_aplica_pragmas_una_vez(tmp_path):
+    pool = db_manager.ConnectionPool(str(tmp_path / "pool.db"), size=1)
+    with pool.conexion() as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+        assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+        assert conn.execute("PRAGMA temp_store").fetchone()[0] == 2   # MEMORY
+    pool.cerrar()
+
+def test_pool_agotado_espera_y_falla(tmp_path):
+    pool = db_manager.ConnectionPool(str(tmp_path / "pool.db"), size=1, timeout=0.05)
+    conn = pool.adquirir()
+
+    with pytest.raises(sqlite3.OperationalError):
+        pool.adquirir()
+
+    assert pool.estadisticas()['waits'] == 1
+    pool.liberar(conn)
+    pool.cerrar()
+
+def test_pool_descarta_conexion_rota(tmp_path):
+    pool = db_manager.ConnectionPool(str(tmp_path / "pool.db"), size=1)
+    conn = pool.adquirir()
+    pool.liberar(conn)
+    conn.close()  # Simula una conexión que murió estando ociosa
+
+    conn_nueva = pool.adquirir()
+    assert conn_nueva is not conn
+    assert pool.estadisticas()['descartadas'] == 1
+    pool.liberar(conn_nueva)
+    pool.cerrar()
+
+def test_pool_revierte_transaccion_pendiente(tmp_path):
+    pool = db_manager.ConnectionPool(str(tmp_path / "pool.db"), size=1)
+    with pool.conexion() as conn:
+        conn.execute("CREATE TABLE t (x INTEGER)")
+        conn.commit()
+        conn.execute("INSERT INTO t VALUES (1)")  # Sin commit
+
+    with pool.conexion() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 0
+    pool.cerrar()
+
+def test_pool_tras_fork_no_reutiliza_conexiones_del_padre(tmp_path, mocker):
+    pool = db_manager.ConnectionPool(str(tmp_path / "pool.db"), size=1)
+    conn_padre = pool.adquirir()
+    pool.liberar(conn_padre)
+
+    # Simulamos ser el worker hijo (otro PID)
+    mocker.patch('shared_code.database.db_manager.os.getpid', return_value=pool._pid + 1)
+    conn_hijo = pool.adquirir()
+
+    assert conn_hijo is not conn_padre
+    assert pool.estadisticas()['misses'] == 1
+    pool.liberar(conn_padre)  # Ajena al hijo: se ignora
+    assert pool.estadisticas()['libres'] == 0
+    pool.liberar(conn_hijo)
+    pool.cerrar()
+    conn_padre.close()
+
+
+# === TESTS GENERACIONES DE LA BASE DE PRECIOS ===
+
+@pytest.fixture
+def base_escritor(tmp_path, monkeypatch):
+    """Base del escritor en disco como base canónica, con generaciones activadas en tmp_path."""
+    ruta_db = str(tmp_path / 'precios_historicos.db')
+    monkeypatch.setattr(db_manager, 'DB_PRECIOS_PATH', ruta_db)
+    monkeypatch.setattr(db_manager, 'ARCHIVO_VERSION_PRECIOS', ruta_db + '.version')
+    monkeypatch.setattr(db_manager, 'GENERACIONES_DIR', str(tmp_path / 'generaciones'))
+    monkeypatch.setattr(db_manager, 'PRECIOS_GENERACIONES', True)
+    conn = db_manager.get_db_connection(ruta_db)
+    db_manager.crear_tablas_precios(conn)
+    yield conn
+    conn.close()
+
+def test_publicar_generacion_inmutable_y_puntero(base_escritor, tmp_path):
+    db_manager.insertar_datos_faena(base_escritor, [fila_faena('03/11/2025', 1000)])
+    # La escritura no publica el sello: la web todavía no ve esa versión
+    assert db_manager.get_version_datos() is None
+
+    ruta = db_manager.publicar_generacion(base_escritor)
+    assert ruta == db_manager.get_generacion_actual()
+    assert db_manager.get_version_datos()[0] == db_manager.get_version_datos_db(base_escritor)[0]
+
+    lectura = db_manager.conectar_solo_lectura(ruta)
+    assert lectura.execute("SELECT COUNT(*) FROM faena").fetchone()[0] == 1
+    assert lectura.execute("SELECT COUNT(*) FROM sqlite_stat1").fetchone()[0] > 0  # ANALYZE
+    with pytest.raises(sqlite3.OperationalError):
+        lectura.execute("DELETE FROM faena")
+    lectura.close()
+
+    # Sin cambios no se genera otra; con cambios sí, y se conservan solo las últimas
+    assert db_manager.publicar_generacion(base_escritor) == ruta
+    for dia in range(4, 8):
+        db_manager.insertar_datos_faena(base_escritor, [fila_faena(f'{dia:02d}/11/2025', 1000 + dia)])
+        db_manager.publicar_generacion(base_escritor)
+    generaciones = sorted(n for n in os.listdir(tmp_path / 'generaciones') if n.endswith('.db'))
+    assert len(generaciones) == db_manager.GENERACIONES_CONSERVADAS
+    assert db_manager.get_generacion_actual().endswith(generaciones[-1])
+
+def test_pool_generaciones_cambia_entre_prestamos(base_escritor):
+    pool = db_manager.PoolGeneraciones(db_manager.DB_PRECIOS_PATH, size=2)
+    # Sin generación publicada lee la base del escritor
+    with pool.conexion() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM faena").fetchone()[0] == 0
+
+    db_manager.insertar_datos_faena(base_escritor, [fila_faena('03/11/2025', 1000)])
+    db_manager.publicar_generacion(base_escritor)
+    en_curso = pool.adquirir()
+    assert en_curso.execute("SELECT COUNT(*) FROM faena").fetchone()[0] == 1
+
+    # La petición en curso sigue en su generación; la siguiente ya ve la nueva
+    db_manager.insertar_datos_faena(base_escritor, [fila_faena('04/11/2025', 1000)])
+    db_manager.publicar_generacion(base_escritor)
+    assert en_curso.execute("SELECT COUNT(*) FROM faena").fetchone()[0] == 1
+    with pool.conexion() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM faena").fetchone()[0] == 2
+    pool.liberar(en_curso)
+
+    stats = pool.estadisticas()
+    assert stats['cambios_generacion'] == 2
+    assert stats['libres'] == 1 and stats['generacion'].startswith('precios_v')
+    pool.cerrar()
+
+
+def _lecturas_precios(conn):
+    rango = ('2025-09-01', '2025-12-31')
+    orden = lambda filas: sorted(filas, key=lambda f: tuple(str(v) for v in f.values()))
+    return {
+        'historico': orden(db_manager.get_faena_historico(conn, *rango, 'NOVILLOS')),
+        'agrupado': db_manager.get_faena_agrupado(conn, *rango, 'NOVILLOS', agrupacion='semanal', formato_fecha='iso'),
+        'resumen': db_manager.get_faena_resumen(conn, *rango, 'NOVILLOS', 'Angus'),
+        'invernada': orden(db_manager.get_invernada_historico(conn, *rango)),
+        'catalogo': db_manager.get_catalogo_series(conn),
+    }
+
+def test_migrar_esquema_v2_no_cambia_las_lecturas(conn_precios):
+    _cargar_faena_varios_meses(conn_precios)
+    db_manager.insertar_datos_invernada(conn_precios, [
+        {'fecha_consulta_inicio': f'{1 + 7 * s:02d}/10/2025', 'fecha_consulta_fin': f'{7 + 7 * s:02d}/10/2025',
+         'categoria_original': 'Terneros 160-180 kg', 'precio_promedio_kg': 3000.0 + s, 'cabezas': 100}
+        for s in range(4)
+    ])
+    antes = _lecturas_precios(conn_precios)
+    version, _ = db_manager.get_version_datos_db(conn_precios)
+
+    assert db_manager.migrar_esquema_v2(conn_precios) == {'faena': 112, 'invernada': 4, 'descartadas': 0}
+
+    tipos = dict(conn_precios.execute("SELECT name, type FROM sqlite_master WHERE name IN ('faena', 'faena_v2')"))
+    assert tipos == {'faena': 'view', 'faena_v2': 'table'}
+    assert _lecturas_precios(conn_precios) == antes
+    assert db_manager.get_version_datos_db(conn_precios)[0] == version + 1
+    assert db_manager.migrar_esquema_v2(conn_precios) == {}
+    # Una base ya migrada se reabre sin recrear las tablas v1
+    db_manager.crear_tablas_precios(conn_precios)
+    assert _lecturas_precios(conn_precios) == antes
+
+def test_esquema_v2_upsert_variacion_y_cambios(conn_precios):
+    db_manager.insertar_datos_faena(conn_precios, [fila_faena('03/11/2025', 1000)])
+    db_manager.migrar_esquema_v2(conn_precios)
+    version, _ = db_manager.get_version_datos_db(conn_precios)
+
+    lote = [fila_faena('10/11/2025', 1100), fila_faena('10/11/2025', 900, raza='Hereford')]
+    assert db_manager.insertar_datos_faena(conn_precios, lote, detalle=True) == \
+        {'insertados': 2, 'actualizados': 0, 'sin_cambios': 0}
+    assert db_manager.insertar_datos_faena(conn_precios, lote, detalle=True) == \
+        {'insertados': 0, 'actualizados': 0, 'sin_cambios': 2}
+    assert db_manager.insertar_datos_faena(conn_precios, [fila_faena('10/11/2025', 1200)], detalle=True) == \
+        {'insertados': 0, 'actualizados': 1, 'sin_cambios': 0}
+
+    fila = conn_precios.execute("""
+        SELECT variacion_semanal_precio, fecha_referencia_variacion, version_cambio FROM faena
+        WHERE fecha_consulta = '2025-11-10' AND raza = 'Angus'
+    """).fetchone()
+    assert tuple(fila) == (20.0, '2025-11-03', version + 2)
+    cambios = db_manager.get_faena_cambios(conn_precios, '2025-11-01', '2025-11-30', desde=version + 1)
+    assert [f['precio_promedio_kg'] for f in cambios['datos']] == [1200]
+
+    invernada = {'fecha_consulta_inicio': '01/11/2025', 'fecha_consulta_fin': '07/11/2025',
+                 'categoria_original': 'Terneros', 'precio_promedio_kg': 2000, 'cabezas': 50}
+    assert db_manager.insertar_datos_invernada(conn_precios, [invernada, dict(invernada, cabezas=60)], detalle=True) == \
+        {'insertados': 1, 'actualizados': 1, 'sin_cambios': 0}
+    assert db_manager.get_invernada_historico(conn_precios, '2025-11-01', '2025-11-30')[0]['cabezas'] == 60
+
+    # Los backfill vacían las tablas a través de las vistas
+    conn_precios.execute("DELETE FROM faena")
+    assert conn_precios.execute("SELECT COUNT(*) FROM faena_v2").fetchone()[0] == 0
+
+def test_esquema_v2_raza_y_peso_nulos_o_vacios_son_la_misma_serie(conn_precios):
+    """Como en v1: CAC envía None y MAG '', y reingestar cualquiera de las dos cuenta como sin cambios."""
+    db_manager.insertar_datos_faena(conn_precios, [fila_faena('03/11/2025', 1000)])
+    db_manager.migrar_esquema_v2(conn_precios)
+    fila = fila_faena('10/11/2025', 1000, raza=None, rango_peso=None)
+    assert db_manager.insertar_datos_faena(conn_precios, [fila], detalle=True)['insertados'] == 1
+    version, _ = db_manager.get_version_datos_db(conn_precios)
+
+    for repetida in (fila, dict(fila, raza='', rango_peso='')):
+        assert db_manager.insertar_datos_faena(conn_precios, [repetida], detalle=True) == \
+            {'insertados': 0, 'actualizados': 0, 'sin_cambios': 1}
+    assert conn_precios.execute("SELECT COUNT(*) FROM dim_serie_faena").fetchone()[0] == 2
+    assert db_manager.get_version_datos_db(conn_precios)[0] == version
+
+def test_esquema_v2_unifica_series_repetidas_de_bases_previas(conn_precios):
+    """Una base v2 con la misma serie en NULL y en '' se unifica al crear tablas; a igual día queda la más nueva."""
+    db_manager.migrar_esquema_v2(conn_precios)
+    db_manager.insertar_datos_faena(conn_precios, [fila_faena('03/11/2025', 1000, raza=None, rango_peso=None),
+                                                   fila_faena('04/11/2025', 1000, raza=None, rango_peso=None)])
+    conn_precios.execute("DROP INDEX idx_dim_serie_faena_clave")
+    conn_precios.execute("INSERT INTO dim_serie_faena (categoria_original, raza, rango_peso) VALUES ('NOVILLOS', '', '')")
+    conn_precios.execute("""
+        INSERT INTO faena_v2 (serie_id, dia, extraccion, precio_promedio_kg, cabezas)
+        SELECT MAX(serie_id), CAST(julianday('2025-11-04') - 2440587.5 AS INTEGER), 4102444800, 1200, 10
+        FROM dim_serie_faena
+    """)
+    version, _ = db_manager.get_version_datos_db(conn_precios)
+
+    db_manager.crear_tablas_precios(conn_precios)
+
+    filas = conn_precios.execute("SELECT fecha_consulta, precio_promedio_kg FROM faena ORDER BY 1").fetchall()
+    assert [tuple(f) for f in filas] == [('2025-11-03', 1000), ('2025-11-04', 1200)]
+    assert conn_precios.execute("SELECT COUNT(*) FROM dim_serie_faena").fetchone()[0] == 1
+    assert conn_precios.execute("SELECT registros FROM faena_rollup WHERE tipo_periodo = 'semanal'").fetchone()[0] == 2
+    assert db_manager.get_version_datos_db(conn_precios)[0] == version + 1
+
+def test_esquema_v2_filtros_de_fecha_usan_indices(conn_precios):
+    db_manager.migrar_esquema_v2(conn_precios)
+    plan = lambda sql, params: ' '.join(f[3] for f in conn_precios.execute(f"EXPLAIN QUERY PLAN {sql}", params))
+
+    por_serie = plan(*db_manager._sql_faena_historico('2025-01-01', '2025-12-31', 'NOVILLOS', 'Angus', '300-400 kg'))
+    assert 'idx_faena_v2_serie_fecha' in por_serie
+    assert 'idx_faena_v2_fecha' in plan(*db_manager._sql_faena_historico('2025-01-01', '2025-12-31'))
@@ -0,0 +1,53 @@
+import sys
+import os
+import csv
+import gzip
+import json
+import sqlite3
+import argparse
+
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from shared_code import exportacion
+from shared_code.database import db_manager
+from data_pipeline import exportar as cli_exportar
+
+COLUMNAS = ['fecha_consulta', 'categoria_original', 'precio_promedio_kg']
+LOTES = [[('2025-11-03', 'NOVILLOS, especiales', 1000.5)], [('2025-11-04', 'VACAS', None)]]
+
+
+def test_csv_en_lotes_un_trozo_por_lote():
+    trozos = list(exportacion.csv_en_lotes(COLUMNAS, iter(LOTES)))
+
+    assert len(trozos) == 2  # El encabezado viaja con el primer lote
+    filas = list(csv.reader(''.join(trozos).splitlines()))
+    assert filas == [COLUMNAS, ['2025-11-03', 'NOVILLOS, especiales', '1000.5'], ['2025-11-04', 'VACAS', '']]
+    assert list(exportacion.csv_en_lotes(COLUMNAS, iter([]))) == ['fecha_consulta,categoria_original,precio_promedio_kg\n']
+
+
+def test_ndjson_en_lotes():
+    lineas = ''.join(exportacion.serializar('ndjson', COLUMNAS, iter(LOTES))).splitlines()
+    assert [json.loads(l) for l in lineas][1] == {'fecha_consulta': '2025-11-04', 'categoria_original': 'VACAS',
+                                                  'precio_promedio_kg': None}
+
+
+def test_cli_exporta_a_gzip(tmp_path):
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    db_manager.crear_tablas_precios(conn)
+    db_manager.insertar_datos_invernada(conn, [
+        {'fecha_consulta_inicio': f'{d:02d}/11/2025', 'fecha_consulta_fin': f'{d + 6:02d}/11/2025',
+         'categoria_original': 'Terneros 160-180 kg', 'precio_promedio_kg': 3000.0 + d, 'cabezas': 100}
+        for d in range(1, 11)
+    ])
+    salida = str(tmp_path / 'invernada.ndjson.gz')
+    args = argparse.Namespace(tabla='invernada', desde='0001-01-01', hasta='9999-12-31', categoria=None,
+                              raza=None, rango_peso=None, formato='ndjson', salida=salida)
+
+    assert cli_exportar.exportar(conn, args) == 10
+    with gzip.open(salida, 'rt', encoding='utf-8') as archivo:
+        registros = [json.loads(l) for l in archivo]
+    assert registros[0]['fecha_consulta_fin'] == '2025-11-07'
+    conn.close()
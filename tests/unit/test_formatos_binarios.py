@@ -0,0 +1,45 @@
+import sys
+import os
+import pytest
+import numpy as np
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import parse_accept_header
+
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from web_app.utils import formatos_binarios
+from web_app.utils.formatos_binarios import MIME_JSON, MIME_ARROW, MIME_MSGPACK
+
+
+@pytest.mark.parametrize("cabecera,esperada", [
+    ("", MIME_JSON),
+    ("text/html,*/*;q=0.8", MIME_JSON),
+    ("text/html", MIME_JSON),
+    ("application/vnd.apache.arrow.stream", MIME_ARROW),
+    ("application/msgpack, application/json;q=0.5", MIME_MSGPACK),
+    ("application/json, application/msgpack;q=0.5", MIME_JSON),
+])
+def test_negociar(monkeypatch, cabecera, esperada):
+    monkeypatch.setattr(formatos_binarios, 'pa', object())  # Simula las dos librerías instaladas
+    monkeypatch.setattr(formatos_binarios, 'msgpack', object())
+    assert formatos_binarios.negociar(parse_accept_header(cabecera, MIMEAccept)) == esperada
+
+
+def test_negociar_sin_libreria(monkeypatch):
+    """Si piden solo Arrow y no está instalado: None (406); si además aceptan JSON, JSON."""
+    monkeypatch.setattr(formatos_binarios, 'pa', None)
+    assert formatos_binarios.negociar(parse_accept_header(MIME_ARROW, MIMEAccept)) is None
+    assert formatos_binarios.negociar(parse_accept_header(f"{MIME_ARROW}, {MIME_JSON};q=0.1", MIMEAccept)) == MIME_JSON
+
+
+def test_columnas_tipadas_con_nulos():
+    datos, nulos = formatos_binarios._columna_numpy([10, None, 30], 'int32')
+    assert datos.dtype == np.int32 and list(datos) == [10, 0, 30]
+    assert list(nulos) == [False, True, False]
+
+    datos, nulos = formatos_binarios._columna_numpy([1.5, 2.5], 'float64')
+    assert datos.dtype == np.float64 and nulos is None
+    assert [formatos_binarios.tipo_columna(c) for c in ('fecha_consulta_fin', 'registros', 'raza', 'precio_ponderado_kg')] \
+        == ['date32', 'int32', 'utf8', 'float64']
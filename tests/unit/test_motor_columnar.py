@@ -0,0 +1,126 @@
+import sys
+import os
+import pytest
+
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from tests.conftest import fila_faena
+from shared_code.database import db_manager, motor_columnar
+from shared_code.database.motor_columnar import MotorColumnar
+
+
+@pytest.fixture
+def conn_series(db_precios):
+    """Tres series de Faena (una con raza NULL) e Invernada con nulos, de septiembre a noviembre."""
+    filas = []
+    for d in range(1, 91):
+        dia = f"{(d - 1) % 30 + 1:02d}/{9 + (d - 1) // 30:02d}/2025"
+        filas.append(fila_faena(dia, 1000.0 + d * 3.5))
+        if d % 2:
+            filas.append(fila_faena(dia, 1100.0 + d, rango_peso='400-500 kg', cabezas=None if d % 9 == 0 else 25))
+        if d % 5 == 0:
+            filas.append(fila_faena(dia, None if d % 10 == 0 else 950.0 + d, raza=None))
+    db_manager.insertar_datos_faena(db_precios, filas)
+    db_manager.insertar_datos_invernada(db_precios, [
+        {'fecha_consulta_inicio': None if s == 3 else f'{1 + 7 * s:02d}/10/2025',
+         'fecha_consulta_fin': f'{7 + 7 * s:02d}/10/2025', 'categoria_original': categoria,
+         'precio_promedio_kg': 3000.0 + 10 * s + len(categoria), 'cabezas': 100 + s}
+        for s in range(4) for categoria in ('Terneros 160-180 kg', 'Terneras 160-180 kg')
+    ])
+    return db_precios
+
+
+@pytest.fixture
+def motor(conn_series):
+    return MotorColumnar.cargar(conn_series)
+
+
+def _aproximado(valor):
+    """Las sumas en punto flotante pueden diferir de SQLite en el último decimal."""
+    if isinstance(valor, list):
+        return [_aproximado(v) for v in valor]
+    if isinstance(valor, dict):
+        return {k: _aproximado(v) for k, v in valor.items()}
+    if isinstance(valor, float):
+        return pytest.approx(valor, rel=1e-12)
+    return valor
+
+
+def _orden(filas, *claves):
+    return sorted(filas, key=lambda f: tuple(str(f[c]) for c in claves))
+
+
+@pytest.mark.parametrize("filtros", [
+    ('NOVILLOS', None, None), ('NOVILLOS', 'Angus', None), ('NOVILLOS', 'Angus', '400-500 kg'),
+    (None, None, None), ('VACAS', None, None), ('NOVILLOS', '', ''),
+])
+def test_historico_faena_igual_a_sql(conn_series, motor, filtros):
+    esperado = db_manager.get_faena_historico(conn_series, '2025-09-10', '2025-11-20', *filtros)
+    obtenido = motor.faena_historico('2025-09-10', '2025-11-20', *filtros)
+    # SQL ordena solo por fecha: a igual fecha el orden entre series no está definido
+    claves = ('fecha_consulta', 'raza', 'rango_peso')
+    assert _orden(obtenido, *claves) == _orden(esperado, *claves)
+    assert [f['fecha_consulta'] for f in obtenido] == [f['fecha_consulta'] for f in esperado]
+
+
+@pytest.mark.parametrize("categoria", [None, 'Terneros 160-180 kg'])
+def test_historico_invernada_igual_a_sql(conn_series, motor, categoria):
+    esperado = db_manager.get_invernada_historico(conn_series, '2025-10-01', '2025-10-31', categoria)
+    obtenido = motor.invernada_historico('2025-10-01', '2025-10-31', categoria)
+    claves = ('fecha_consulta_fin', 'categoria_original')
+    assert _orden(obtenido, *claves) == _orden(esperado, *claves)
+    assert any(f['fecha_consulta_inicio'] is None for f in obtenido)
+
+
+@pytest.mark.parametrize("agrupacion", ['diario', 'semanal', 'mensual', 'auto'])
+@pytest.mark.parametrize("formato_fecha", [None, 'iso', 'epoch_day'])
+def test_agrupado_igual_a_sql(conn_series, motor, agrupacion, formato_fecha):
+    for tabla, filtros, funcion in (('faena', ('NOVILLOS', None, None), db_manager.get_faena_agrupado),
+                                    ('invernada', (None,), db_manager.get_invernada_agrupado)):
+        esperado = funcion(conn_series, '2025-09-03', '2025-11-26', *filtros, agrupacion=agrupacion,
+                           formato_fecha=formato_fecha)
+        assert motor.agrupado(tabla, '2025-09-03', '2025-11-26', filtros, agrupacion, formato_fecha) \
+            == _aproximado(esperado)
+
+
+def test_agrupado_sin_filas(conn_series, motor):
+    esperado = db_manager.get_faena_agrupado(conn_series, '2024-01-01', '2024-02-01', 'NOVILLOS', formato_fecha='iso')
+    assert motor.agrupado('faena', '2024-01-01', '2024-02-01', ('NOVILLOS', None, None), 'auto', 'iso') == esperado
+
+
+@pytest.mark.parametrize("rango", [('2025-10-01', '2025-10-31'), ('2025-09-01', '2025-11-30'), ('2024-01-01', '2024-01-31')])
+def test_resumen_igual_a_sql(conn_series, motor, rango):
+    assert motor.resumen('faena', *rango, ('NOVILLOS', 'Angus', None)) \
+        == _aproximado(db_manager.get_faena_resumen(conn_series, *rango, 'NOVILLOS', 'Angus'))
+    assert motor.resumen('invernada', *rango, (None,)) \
+        == _aproximado(db_manager.get_invernada_resumen(conn_series, *rango))
+
+
+def test_variacion_semanal_coincide_con_la_materializada(conn_series, motor):
+    calculada = motor.variacion_semanal_faena('NOVILLOS', 'Angus', '400-500 kg')
+    filas = conn_series.execute("""
+        SELECT fecha_consulta, variacion_semanal_precio, fecha_referencia_variacion FROM faena
+        WHERE categoria_original = 'NOVILLOS' AND raza = 'Angus' AND rango_peso = '400-500 kg'
+        ORDER BY fecha_consulta
+    """).fetchall()
+    assert calculada['fecha_consulta'] == [f[0] for f in filas]
+    assert calculada['fecha_referencia_variacion'] == [f[2] for f in filas]
+    assert calculada['variacion_semanal_precio'] == _aproximado([f[1] for f in filas])
+
+
+def test_backend_recarga_al_cambiar_la_version(conn_series):
+    filtros = ('2025-11-01', '2025-12-31', 'NOVILLOS', 'Angus', '300-400 kg')
+    antes = motor_columnar.get_faena_historico(conn_series, *filtros)
+    assert motor_columnar.get_motor(conn_series) is motor_columnar.get_motor(conn_series)
+
+    db_manager.insertar_datos_faena(conn_series, [fila_faena('01/12/2025', 5000.0)])
+
+    despues = motor_columnar.get_faena_historico(conn_series, *filtros)
+    assert len(despues) == len(antes) + 1 and despues[-1]['precio_promedio_kg'] == 5000.0
+    # Fechas no ISO y lecturas incrementales se resuelven con SQL
+    assert motor_columnar.get_faena_historico(conn_series, '2025-11-1', '2025-11-30') \
+        == db_manager.get_faena_historico(conn_series, '2025-11-1', '2025-11-30')
+    assert motor_columnar.get_faena_historico(conn_series, *filtros, desde_version=0) \
+        == db_manager.get_faena_historico(conn_series, *filtros, desde_version=0)
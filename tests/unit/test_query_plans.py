@@ -0,0 +1,153 @@
+"""
+Tests de regresión de planes de consulta (EXPLAIN QUERY PLAN) para las lecturas de db_manager.
+
+Cada lectura de precios se ejecuta sobre una base con datos, se capturan las sentencias
+que realmente envía a SQLite (set_trace_callback) y se verifica que ninguna recorra
+una tabla completa ("SCAN faena" sin índice).
+"""
+import sys
+import os
+import re
+import sqlite3
+import pytest
+
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from shared_code.database import db_manager
+
+# "SCAN faena" / "SCAN f" (alias) sin "USING ... INDEX" es un full table scan
+PATRON_FULL_SCAN = re.compile(r"^SCAN \w+(?: AS \w+)?$")
+
+
+@pytest.fixture(scope="module")
+def conn_plan():
+    """Base de precios con algunas series cargadas y estadísticas (ANALYZE)."""
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    db_manager.crear_tablas_precios(conn)
+
+    faena = []
+    for dia in range(1, 29):
+        for categoria, raza, peso in [('NOVILLOS', 'Angus', '300-400 kg'), ('NOVILLOS', 'Hereford', '400-500 kg'),
+                                      ('VACAS', 'Angus', '')]:
+            faena.append({
+                'fecha_consulta_inicio': f"{dia:02d}/11/2025", 'categoria_original': categoria,
+                'raza': raza, 'rango_peso': peso, 'precio_promedio_kg': 1000 + dia, 'cabezas': 10,
+            })
+    db_manager.insertar_datos_faena(conn, faena)
+
+    invernada = [{
+        'fecha_consulta_inicio': f"{dia:02d}/11/2025", 'fecha_consulta_fin': f"{dia + 1:02d}/11/2025",
+        'categoria_original': categoria, 'precio_promedio_kg': 2000 + dia, 'cabezas': 50,
+    } for dia in range(1, 28) for categoria in ('Terneros 160-180 kg', 'Vaquillonas 180-220 kg')]
+    db_manager.insertar_datos_invernada(conn, invernada)
+
+    conn.execute("ANALYZE")
+    yield conn
+    conn.close()
+
+
+def _sentencias_ejecutadas(conn, funcion, *args, **kwargs):
+    sentencias = []
+    conn.set_trace_callback(sentencias.append)
+    try:
+        funcion(conn, *args, **kwargs)
+    finally:
+        conn.set_trace_callback(None)
+    return [s for s in sentencias if s.lstrip().upper().startswith(("SELECT", "WITH"))]
+
+
+def _full_scans(conn, sql):
+    plan = [fila[3] for fila in conn.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()]
+    # Las tablas VALUES de claves (MATERIALIZE x) se recorren enteras a propósito: son de pocas filas
+    materializadas = {detalle.split()[1] for detalle in plan if detalle.startswith("MATERIALIZE ")}
+    # metadatos es una tabla clave/valor de pocas filas (versión de datos, catálogo)
+    chicas = materializadas | {'metadatos'}
+    return [detalle for detalle in plan
+            if PATRON_FULL_SCAN.match(detalle) and detalle.split()[1] not in chicas]
+
+
+# Todas las lecturas de precios de db_manager con sus combinaciones de filtros
+LECTURAS = [
+    ("faena_sin_filtros", db_manager.get_faena_historico, ('2025-11-01', '2025-11-30'), {}),
+    ("faena_categoria", db_manager.get_faena_historico, ('2025-11-01', '2025-11-30'), {'categoria': 'NOVILLOS'}),
+    ("faena_categoria_raza", db_manager.get_faena_historico, ('2025-11-01', '2025-11-30'),
+     {'categoria': 'NOVILLOS', 'raza': 'Angus'}),
+    ("faena_serie_completa", db_manager.get_faena_historico, ('2025-11-01', '2025-11-30'),
+     {'categoria': 'NOVILLOS', 'raza': 'Angus', 'rango_peso': '300-400 kg'}),
+    ("faena_categoria_peso", db_manager.get_faena_historico, ('2025-11-01', '2025-11-30'),
+     {'categoria': 'NOVILLOS', 'rango_peso': '300-400 kg'}),
+    ("invernada_sin_filtros", db_manager.get_invernada_historico, ('2025-11-01', '2025-11-30'), {}),
+    ("invernada_categoria", db_manager.get_invernada_historico, ('2025-11-01', '2025-11-30'),
+     {'categoria': 'Terneros 160-180 kg'}),
+    ("categorias", db_manager.get_categorias_precios, (), {}),
+    ("subcategorias", db_manager.get_subcategorias_faena, ('NOVILLOS',), {}),
+    ("subcategorias_raza", db_manager.get_subcategorias_faena, ('NOVILLOS',), {'raza': 'Angus'}),
+    ("variacion_del_dia", db_manager.get_variacion_faena, ('2025-11-20',), {}),
+    ("faena_agrupado_auto", db_manager.get_faena_agrupado, ('2025-11-01', '2025-11-30'),
+     {'categoria': 'NOVILLOS', 'raza': 'Angus', 'rango_peso': '300-400 kg'}),
+    ("faena_agrupado_mensual_categoria", db_manager.get_faena_agrupado, ('2025-11-01', '2025-11-30'),
+     {'categoria': 'NOVILLOS', 'agrupacion': 'mensual'}),
+    ("invernada_agrupado_semanal", db_manager.get_invernada_agrupado, ('2025-11-01', '2025-11-30'),
+     {'categoria': 'Terneros 160-180 kg', 'agrupacion': 'semanal'}),
+    ("faena_columnar", db_manager.get_faena_columnar, ('2025-11-01', '2025-11-30'),
+     {'categoria': 'NOVILLOS', 'raza': 'Angus', 'rango_peso': '300-400 kg', 'formato_fecha': 'epoch_day'}),
+    ("invernada_columnar", db_manager.get_invernada_columnar, ('2025-11-01', '2025-11-30'),
+     {'categoria': 'Terneros 160-180 kg'}),
+    # Rango largo con bordes parciales: rollups + filas crudas de los extremos
+    ("faena_agrupado_rollups_sin_filtros", db_manager.get_faena_agrupado, ('2025-10-15', '2025-11-25'),
+     {'agrupacion': 'semanal'}),
+    ("faena_agrupado_rollups_serie", db_manager.get_faena_agrupado, ('2025-10-15', '2025-11-25'),
+     {'categoria': 'NOVILLOS', 'raza': 'Angus', 'rango_peso': '300-400 kg', 'agrupacion': 'semanal'}),
+    ("invernada_agrupado_rollups", db_manager.get_invernada_agrupado, ('2025-10-15', '2025-11-25'),
+     {'agrupacion': 'mensual'}),
+    ("catalogo_series", db_manager.get_catalogo_series, (), {}),
+    ("exportar_faena", db_manager.exportar_precios, ('faena', '2025-11-01', '2025-11-30'), {}),
+    ("exportar_faena_serie", db_manager.exportar_precios, ('faena', '2025-11-01', '2025-11-30'),
+     {'categoria': 'NOVILLOS', 'raza': 'Angus'}),
+    ("exportar_invernada", db_manager.exportar_precios, ('invernada', '2025-11-01', '2025-11-30'),
+     {'categoria': 'Terneros 160-180 kg'}),
+    ("faena_multi_semanal", db_manager.get_faena_agrupado_multi, ('2025-10-15', '2025-11-25'),
+     {'series': [('NOVILLOS', 'Angus', '300-400 kg'), ('NOVILLOS', 'Angus', None), ('VAQUILLONAS', None, None)],
+      'agrupacion': 'semanal'}),
+    ("faena_multi_diario", db_manager.get_faena_agrupado_multi, ('2025-11-01', '2025-11-30'),
+     {'series': [('NOVILLOS', 'Angus', '300-400 kg'), ('NOVILLOS', 'Hereford', '300-400 kg')], 'agrupacion': 'diario'}),
+    ("faena_resumen", db_manager.get_faena_resumen, ('2025-10-15', '2025-11-25'),
+     {'categoria': 'NOVILLOS', 'raza': 'Angus', 'rango_peso': '300-400 kg'}),
+    ("faena_resumen_categoria", db_manager.get_faena_resumen, ('2025-10-15', '2025-11-25'), {'categoria': 'NOVILLOS'}),
+    ("invernada_resumen", db_manager.get_invernada_resumen, ('2025-10-15', '2025-11-25'),
+     {'categoria': 'Terneros 160-180 kg'}),
+    ("faena_cambios", db_manager.get_faena_cambios, ('2025-11-01', '2025-11-30'), {'categoria': 'NOVILLOS', 'desde': 1}),
+    ("faena_cambios_columnar_fecha", db_manager.get_faena_cambios, ('2025-11-01', '2025-11-30'),
+     {'desde': '2025-11-20', 'formato_fecha': 'iso'}),
+    ("invernada_cambios", db_manager.get_invernada_cambios, ('2025-11-01', '2025-11-30'), {'desde': 1}),
+    ("invernada_multi", db_manager.get_invernada_agrupado_multi, ('2025-10-15', '2025-11-25'),
+     {'categorias': ['Terneros 160-180 kg', 'Vaquillonas 180-220 kg'], 'agrupacion': 'mensual'}),
+]
+
+
+@pytest.mark.parametrize("nombre,funcion,args,kwargs", LECTURAS, ids=[l[0] for l in LECTURAS])
+def test_lecturas_sin_full_table_scan(conn_plan, nombre, funcion, args, kwargs):
+    sentencias = _sentencias_ejecutadas(conn_plan, funcion, *args, **kwargs)
+    assert sentencias, f"{nombre}: no se capturó ninguna consulta"
+
+    for sql in sentencias:
+        scans = _full_scans(conn_plan, sql)
+        assert not scans, f"{nombre}: full table scan {scans} en:\n{sql}"
+
+
+def test_lecturas_de_serie_usan_indice_cubriente(conn_plan):
+    sentencias = _sentencias_ejecutadas(
+        conn_plan, db_manager.get_faena_historico, '2025-11-01', '2025-11-30',
+        categoria='NOVILLOS', raza='Angus', rango_peso='300-400 kg'
+    )
+    plan = " | ".join(fila[3] for fila in conn_plan.execute(f"EXPLAIN QUERY PLAN {sentencias[0]}"))
+    assert "COVERING INDEX idx_faena_serie_cubriente" in plan
+    assert "TEMP B-TREE" not in plan  # El índice ya entrega las filas ordenadas por fecha
+
+
+def test_detector_de_full_scan(conn_plan):
+    """Sanidad del propio detector: una consulta sin índice debe marcarse."""
+    assert _full_scans(conn_plan, "SELECT * FROM faena WHERE importe_total > 0")
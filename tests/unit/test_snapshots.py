@@ -0,0 +1,76 @@
+import sys
+import os
+import gzip
+import json
+import pytest
+from datetime import date
+
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from tests.conftest import fila_faena
+from shared_code import snapshots
+from shared_code.database import db_manager
+
+HOY = date(2025, 11, 30)
+
+
+@pytest.fixture
+def conn_con_datos(db_precios):
+    db_manager.insertar_datos_faena(db_precios, [fila_faena(f'{d:02d}/11/2025', 1000 + d) for d in range(3, 28)])
+    db_manager.insertar_datos_invernada(db_precios, [
+        {'fecha_consulta_inicio': '01/11/2025', 'fecha_consulta_fin': '07/11/2025',
+         'categoria_original': 'Terneros 160-180 kg', 'precio_promedio_kg': 3000.0, 'cabezas': 100},
+    ])
+    return db_precios
+
+
+def test_publicar_snapshots_manifest_y_archivos(conn_con_datos, tmp_path):
+    assert snapshots.publicar_snapshots(conn_con_datos, str(tmp_path), hoy=HOY) > 0
+
+    manifest = json.loads((tmp_path / 'manifest.json').read_bytes())
+    assert manifest['version_datos'] == db_manager.get_version_datos_db(conn_con_datos)[0]
+    assert manifest['hasta'] == '2025-11-30'
+
+    # Mismo contenido que la API para esa consulta, en claro y precomprimido
+    entrada = snapshots.buscar_snapshot('faena', '2025-09-01', '2025-11-30', 'NOVILLOS', 'Angus', agrupacion='auto',
+                                        version=manifest['version_datos'], directorio=str(tmp_path))
+    aplicada, esperado = db_manager.get_faena_agrupado(conn_con_datos, '2025-09-01', '2025-11-30', 'NOVILLOS', 'Angus',
+                                                       formato_fecha='iso')
+    ruta = tmp_path / entrada['archivo']
+    assert entrada['agrupacion'] == aplicada
+    assert json.loads(ruta.read_bytes()) == esperado
+    assert 'gzip' in entrada['codificaciones']
+    assert json.loads(gzip.decompress((tmp_path / (entrada['archivo'] + '.gz')).read_bytes())) == esperado
+
+    # "Todo" empieza en el primer dato de la serie; Invernada también se publica
+    claves = manifest['series']
+    assert snapshots.clave_serie('faena', '2025-11-03', '2025-11-30', 'NOVILLOS', agrupacion='mensual') in claves
+    assert snapshots.clave_serie('invernada', '2025-11-07', '2025-11-30', 'Terneros 160-180 kg') in claves
+
+
+def test_buscar_snapshot_ignora_otra_version(conn_con_datos, tmp_path):
+    snapshots.publicar_snapshots(conn_con_datos, str(tmp_path), hoy=HOY)
+    version = db_manager.get_version_datos_db(conn_con_datos)[0]
+    argumentos = ('faena', '2025-09-01', '2025-11-30', 'NOVILLOS')
+
+    assert snapshots.buscar_snapshot(*argumentos, version=version, directorio=str(tmp_path))
+    assert snapshots.buscar_snapshot(*argumentos, version=version + 1, directorio=str(tmp_path)) is None
+    assert snapshots.buscar_snapshot(*argumentos, version=version, directorio=str(tmp_path / 'vacio')) is None
+
+
+def test_republicar_conserva_el_manifest_anterior_y_borra_huerfanos(conn_con_datos, tmp_path):
+    snapshots.publicar_snapshots(conn_con_datos, str(tmp_path), hoy=HOY)
+    primeros = {e['archivo'] for e in json.loads((tmp_path / 'manifest.json').read_bytes())['series'].values()}
+    (tmp_path / 'series' / 'viejo.json').write_bytes(b'[]')
+    (tmp_path / 'series' / 'viejo.json.gz').write_bytes(b'')
+
+    db_manager.insertar_datos_faena(conn_con_datos, [fila_faena('28/11/2025', 2000)])
+    snapshots.publicar_snapshots(conn_con_datos, str(tmp_path), hoy=HOY)
+    segundos = {e['archivo'] for e in json.loads((tmp_path / 'manifest.json').read_bytes())['series'].values()}
+
+    assert primeros != segundos
+    assert all((tmp_path / archivo).exists() for archivo in primeros | segundos)
+    assert not (tmp_path / 'series' / 'viejo.json').exists()
+    assert not (tmp_path / 'series' / 'viejo.json.gz').exists()
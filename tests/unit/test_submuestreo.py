@@ -0,0 +1,68 @@
+import sys
+import os
+import numpy as np
+
+project_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from shared_code import submuestreo
+
+
+def test_lttb_conserva_extremos_y_tamano():
+    x = np.arange(1000)
+    y = np.sin(x / 50.0)
+    indices = submuestreo.lttb_indices(x, y, 100)
+
+    assert len(indices) == 100
+    assert indices[0] == 0 and indices[-1] == 999
+    assert np.all(np.diff(indices) > 0)  # Orden cronológico y sin duplicados
+
+
+def test_lttb_conserva_picos():
+    """Un pico aislado debe sobrevivir al submuestreo (un promedio por bucket lo perdería)."""
+    y = np.full(500, 1000.0)
+    y[137] = 5000.0
+    y[388] = 200.0
+    indices = submuestreo.lttb_indices(np.arange(500), y, 20)
+
+    assert 137 in indices
+    assert 388 in indices
+
+
+def test_lttb_sin_reduccion_si_hay_pocos_puntos():
+    assert list(submuestreo.lttb_indices([1, 2, 3], [1, 2, 3], 10)) == [0, 1, 2]
+
+
+def test_reducir_filas_historico():
+    filas = [{'fecha_consulta': f"{dia:02d}/{mes:02d}/2025", 'precio_promedio_kg': 1000.0 + dia}
+             for mes in range(1, 13) for dia in range(1, 29)]
+    filas[5]['precio_promedio_kg'] = None
+
+    reducidas = submuestreo.reducir_filas(filas, 50, 'fecha_consulta')
+
+    assert len(reducidas) == 50
+    assert reducidas[0] is filas[0] and reducidas[-1] is filas[-1]
+    assert all(f['precio_promedio_kg'] is not None for f in reducidas)
+    # Pocas filas: se devuelven sin tocar
+    assert submuestreo.reducir_filas(filas[:10], 50, 'fecha_consulta') == filas[:10]
+
+
+def test_reducir_columnar_recorta_todas_las_columnas():
+    n = 400
+    serie = {
+        'n': n,
+        'constantes': {'categoria_original': 'NOVILLOS'},
+        'columnas': {
+            'fecha_consulta': list(range(19000, 19000 + n)),  # epoch_day
+            'precio_promedio_kg': [1000.0 + (i % 7) for i in range(n)],
+            'cabezas': [10] * n,
+        },
+    }
+    reducida = submuestreo.reducir_columnar(serie, 40, 'fecha_consulta', formato_fecha='epoch_day')
+
+    assert reducida['n'] == 40
+    assert all(len(col) == 40 for col in reducida['columnas'].values())
+    assert reducida['columnas']['fecha_consulta'][0] == 19000
+    assert reducida['columnas']['fecha_consulta'][-1] == 19000 + n - 1
+    assert reducida['constantes'] == serie['constantes']
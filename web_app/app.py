@@ -1,17 +1,25 @@
 import sys
 import os
-from flask import Flask, jsonify, request, render_template, abort, g, send_from_directory, redirect, url_for, flash
+from flask import Flask, jsonify, request, render_template, abort, g, send_from_directory, redirect, url_for, flash, make_response, session, Response, stream_with_context
 import sqlite3
 import uuid 
+import hashlib
+import json
+import threading
+from functools import wraps
+from urllib.parse import urlencode
 from werkzeug.utils import secure_filename
 import re
 from email_validator import validate_email, EmailNotValidError
 import magic
 from web_app.utils.video_optimizer_v2 import optimizar_video_async
+from web_app.utils import compresion
+from web_app.utils import formatos_binarios
 
 # --- SEGURIDAD Y AUTH ---
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.security import generate_password_hash, check_password_hash, safe_join
+from werkzeug.exceptions import NotFound
 from flask_wtf.csrf import CSRFProtect
 
 # --- CONFIGURACIÓN DE RUTAS ---
@@ -24,6 +32,8 @@ static_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
 try:
     from shared_code.database import db_manager
     from shared_code.logger_config import setup_logger
+    from shared_code import submuestreo
+    from shared_code import exportacion
 except ModuleNotFoundError as e:
     print(f"CRITICAL ERROR: No se pudieron cargar módulos compartidos: {e}")
     sys.exit(1)
@@ -32,12 +42,17 @@ logger = setup_logger('Web_App')
 
 app = Flask(__name__, template_folder=template_dir, static_folder=static_dir)
 csrf = CSRFProtect(app)
+# gzip/brotli según Accept-Encoding (primer after_request registrado = último en ejecutarse)
+compresion.instalar(app)
 
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from flask_cors import CORS
 
 from shared_code.database import db_manager
+from shared_code.database.cache_compartido import get_cache_compartido
+from shared_code.database import motor_columnar
+from shared_code import snapshots
 
 # Habilitamos CORS para que React (localhost:5173) pueda pedir datos a Flask (localhost:5000)
 CORS(app, resources={r"/api/*": {"origins": "*"}})
@@ -99,23 +114,24 @@ login_manager.init_app(app)
 login_manager.login_view = 'login' # Si alguien intenta entrar a zona privada, va aquí
 
 # --- LISTA NEGRA (Filtros Visuales) ---
-CATEGORIAS_EXCLUIDAS = ["Ternera Holando", "Vacas CUT con cría", "TERNERAS", "NOVILLOS + CRUZA CEBU", "NOVILLOS + CRUZA EUROPEA"]
+# Vive en db_manager: la ingesta la aplica al armar el catálogo de series
+CATEGORIAS_EXCLUIDAS = db_manager.CATEGORIAS_EXCLUIDAS
 
 # --- GESTIÓN DE DOBLE BASE DE DATOS ---
 
 def get_db_precios():
-    """Conexión a la DB Analítica (Historial de Precios)."""
+    """Conexión a la DB Analítica (Historial de Precios), prestada por el pool del worker."""
     if 'db_precios' not in g:
-        g.db_precios = db_manager.get_conn_precios()
+        g.db_precios = db_manager.adquirir_conn_precios()
         if g.db_precios is None:
             logger.critical("Fallo conexión DB Precios.")
             abort(500)
     return g.db_precios
 
 def get_db_market():
-    """Conexión a la DB Transaccional (Usuarios y Lotes)."""
+    """Conexión a la DB Transaccional (Usuarios y Lotes), prestada por el pool del worker."""
     if 'db_market' not in g:
-        g.db_market = db_manager.get_conn_market()
+        g.db_market = db_manager.adquirir_conn_market()
         if g.db_market is None:
             logger.critical("Fallo conexión DB Marketplace.")
             abort(500)
@@ -123,12 +139,12 @@ def get_db_market():
 
 @app.teardown_appcontext
 def close_dbs(e=None):
-    """Cierra ambas conexiones al terminar la petición."""
+    """Devuelve ambas conexiones al pool al terminar la petición."""
     db_p = g.pop('db_precios', None)
-    if db_p is not None: db_p.close()
+    if db_p is not None: db_manager.liberar_conn_precios(db_p)
     
     db_m = g.pop('db_market', None)
-    if db_m is not None: db_m.close()
+    if db_m is not None: db_manager.liberar_conn_market(db_m)
 
 # --- MODELO DE USUARIO (Flask-Login) ---
 class User(UserMixin):
@@ -164,7 +180,11 @@ def inicio():
 
 @app.route('/precios')
 def dashboard():
-    return render_template('dashboard.html') 
+    # Árbol de filtros + serie por defecto embebidos: el primer render no espera ninguna llamada a la API
+    datos_iniciales = _datos_iniciales_dashboard()
+    if datos_iniciales and datos_iniciales['serie']:
+        get_cache_compartido().contar(CONTADOR_VISTAS, datos_iniciales['serie']['categoria'])
+    return render_template('dashboard.html', datos_iniciales=datos_iniciales)
 
 @app.route('/favicon.ico')
 def favicon():
@@ -395,7 +415,7 @@ def perfil():
 
 # --- RECUPERACIÓN DE CONTRASEÑA ---
 
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta, timezone
 import secrets
 
 @app.route('/recuperar-password', methods=['GET', 'POST'])
@@ -481,74 +501,625 @@ def reset_password(token):
 
 # --- API ENDPOINTS (Usan DB Precios) ---
 
+# Los precios cambian solo con la ingesta (11:00 y 20:00): el navegador puede reutilizar
+# la respuesta unos segundos y luego revalidarla con If-None-Match / If-Modified-Since.
+API_CACHE_MAX_AGE = int(os.environ.get('API_CACHE_MAX_AGE', 60))
+
+# Rangos más largos (en días) se envían en streaming: la memoria del worker no crece con el rango
+STREAM_UMBRAL_DIAS = int(os.environ.get('STREAM_UMBRAL_DIAS', 400))
+
+try:
+    import orjson  # Serializador rápido (opcional)
+except ImportError:
+    orjson = None
+
+# Backend de las lecturas de series: consultas SQL o el motor columnar en memoria (MOTOR_PRECIOS=numpy)
+if motor_columnar.MOTOR_PRECIOS == 'numpy':
+    lecturas_precios = motor_columnar
+    threading.Thread(target=motor_columnar.precargar, daemon=True).start()
+else:
+    lecturas_precios = db_manager
+
+def leer_precios(funcion, *args, **kwargs):
+    """Lectura de DB Precios a través de la caché del worker; en un miss usa la conexión de la petición."""
+    return db_manager.leer_precios_cacheado(funcion, *args, obtener_conn=get_db_precios, **kwargs)
+
+def _clave_peticion():
+    """Ruta + query string normalizada (parámetros ordenados): identifica la representación pedida."""
+    # Orden estable por nombre: los valores repetidos (p.ej. ?serie=) conservan su orden. Se re-codifican
+    # (urlencode): un '&' o '=' dentro de un valor no puede producir la clave de otra consulta
+    argumentos = urlencode(sorted(request.args.items(multi=True), key=lambda kv: kv[0]))
+    clave = f"{request.path}?{argumentos}"
+    # Con Accept binario (Arrow / MessagePack) la misma URL es otra representación
+    representacion = formatos_binarios.negociar(request.accept_mimetypes)
+    if representacion and representacion != formatos_binarios.MIME_JSON:
+        clave += f"#{representacion}"
+    return clave
+
+def _respuesta_guardada(guardada):
+    response = make_response(guardada.cuerpo)
+    response.content_type = guardada.content_type
+    response.headers.update(guardada.headers)
+    return response
+
+def _publicar_respuesta(espacio, response, version='', ttl=None):
+    """Publica en la caché compartida una respuesta 200 (sin cookies) con sus headers propios (X-*, Vary)."""
+    if response.status_code != 200 or response.direct_passthrough or response.is_streamed \
+            or 'Set-Cookie' in response.headers:
+        return
+    headers = {k: v for k, v in response.headers.items() if k.startswith('X-') or k == 'Vary'}
+    get_cache_compartido().publicar(espacio, _clave_peticion(), response.get_data(), version=version,
+                                    content_type=response.content_type, headers=headers, ttl=ttl)
+
+def respuesta_compartida(vista):
+    """
+    Caché de respuestas de las APIs de precios compartida entre los workers (ver cache_compartido).
+    La entrada queda atada a la versión de datos: la ingesta la invalida para todos.
+    """
+    @wraps(vista)
+    def envoltura(*args, **kwargs):
+        version = db_manager.get_version_datos()
+        if version is None:
+            return vista(*args, **kwargs)
+        version = str(version[0])
+        guardada = get_cache_compartido().obtener('api', _clave_peticion(), version)
+        if guardada:
+            return _respuesta_guardada(guardada)
+        response = make_response(vista(*args, **kwargs))
+        _publicar_respuesta('api', response, version=version)
+        return response
+    return envoltura
+
+def respuesta_condicional(vista):
+    """
+    ETag fuerte (versión de datos + URL), Last-Modified y Cache-Control para las APIs de precios.
+    Si el cliente ya tiene la versión vigente responde 304 antes de ejecutar la vista (sin tocar SQLite).
+    """
+    @wraps(vista)
+    def envoltura(*args, **kwargs):
+        version = db_manager.get_version_datos()
+        if version is None:
+            return vista(*args, **kwargs)
+        numero, actualizada = version
+        # HTTP trabaja en UTC y con resolución de segundos
+        actualizada = actualizada.replace(microsecond=0).astimezone(timezone.utc)
+
+        # Misma clave (query re-codificada) que la caché compartida: dos consultas distintas nunca
+        # comparten ETag, ni por lo tanto 304 o variante comprimida (que se guarda por ETag)
+        huella = hashlib.sha1(_clave_peticion().encode()).hexdigest()[:16]
+        etag = f"v{numero}-{huella}"
+
+        # El cliente puede tener la variante comprimida (ETag con sufijo -gzip/-br)
+        etag_cliente = None
+        if request.if_none_match:
+            etag_cliente = next((e for e in compresion.variantes_etag(etag) if request.if_none_match.contains(e)), None)
+            no_modificado = etag_cliente is not None
+        else:
+            no_modificado = bool(request.if_modified_since and request.if_modified_since >= actualizada)
+
+        response = make_response('', 304) if no_modificado else make_response(vista(*args, **kwargs))
+        if response.status_code in (200, 304):
+            # Un snapshot precomprimido ya sale codificado: su ETag es el de esa variante
+            codificacion = response.headers.get('Content-Encoding') if response.status_code == 200 else None
+            response.set_etag(etag_cliente or (f"{etag}-{codificacion}" if codificacion else etag))
+            response.headers['X-Version-Datos'] = str(numero)  # Cursor para pedir luego solo los cambios (?since=)
+            response.last_modified = actualizada
+            response.headers['Cache-Control'] = f'public, max-age={API_CACHE_MAX_AGE}, must-revalidate'
+        return response
+    return envoltura
+
+def _leer_max_points():
+    """Lee ?max_points=N (entero >= 3). Lanza ValueError si es inválido."""
+    valor = request.args.get('max_points')
+    if valor is None:
+        return None
+    max_points = int(valor)
+    if max_points < 3:
+        raise ValueError("max_points debe ser >= 3")
+    return max_points
+
+def _leer_formato_columnar():
+    """
+    Lee ?format=columnar y ?fechas=iso|epoch_day. Devuelve el formato de fecha a usar
+    (o None si la respuesta es la lista de filas). Lanza ValueError si es inválido.
+    """
+    formato = request.args.get('format')
+    if formato is None:
+        return None
+    fechas = request.args.get('fechas', 'iso')
+    if formato != 'columnar' or fechas not in db_manager.FORMATOS_FECHA:
+        raise ValueError("Formato inválido")
+    return fechas
+
+def _leer_since():
+    """?since=<versión de datos | fecha ISO>: cursor para pedir solo los cambios. Lanza ValueError si es inválido."""
+    since = request.args.get('since')
+    if since is None or since.isdigit():
+        return since
+    datetime.fromisoformat(since)
+    return since
+
+def _leer_parametros_serie():
+    """Valida los parámetros comunes de /api/faena y /api/invernada. Lanza ValueError con el mensaje de error."""
+    agrupacion = request.args.get('agrupacion')
+    if agrupacion and agrupacion not in db_manager.AGRUPACIONES:
+        raise ValueError("Agrupación inválida")
+    try:
+        max_points = _leer_max_points()
+    except ValueError:
+        raise ValueError("max_points inválido")
+    try:
+        formato_fecha = _leer_formato_columnar()
+    except ValueError:
+        raise ValueError("Formato inválido")
+    try:
+        since = _leer_since()
+    except ValueError:
+        raise ValueError("since inválido")
+    if since is not None and (agrupacion or max_points):
+        # El delta son filas crudas: un bucket o una muestra LTTB no se pueden actualizar por partes
+        raise ValueError("since no admite agrupacion ni max_points")
+    return agrupacion, max_points, formato_fecha, since
+
+def _leer_representacion():
+    """Mimetype negociado con Accept (JSON, Arrow o MessagePack). Lanza ValueError si no hay ninguno aceptable."""
+    representacion = formatos_binarios.negociar(request.accept_mimetypes)
+    if representacion is None:
+        raise ValueError("Formato no aceptable")
+    return representacion
+
+def _respuesta_serie(agrupacion, data, max_points=None, clave_fecha='fecha_consulta', formato_fecha=None,
+                     representacion=formatos_binarios.MIME_JSON):
+    """
+    JSON de la serie; si se agrupó en el servidor, informa el período aplicado.
+    Con max_points, la serie se reduce con LTTB y se envuelve con el conteo original
+    para que la UI pueda indicar cuántos puntos se omitieron.
+    En formato columnar (`formato_fecha`), `data` ya es un dict y los totales se agregan a él.
+    Con una `representacion` binaria (siempre columnar) se serializa a Arrow / MessagePack.
+    """
+    if formato_fecha:
+        if max_points:
+            columnas = data['columnas']
+            totales = _totales_serie(columnas.get('cabezas', []), columnas['precio_promedio_kg'])
+            reducida = submuestreo.reducir_columnar(data, max_points, clave_fecha, formato_fecha)
+            data = dict(reducida, total_original=data['n'], total=reducida['n'], max_points=max_points, **totales)
+        if representacion != formatos_binarios.MIME_JSON:
+            extra = {'agrupacion': agrupacion} if agrupacion else None
+            response = make_response(formatos_binarios.serializar(data, representacion, extra))
+            response.mimetype = representacion
+        else:
+            response = jsonify(data)
+    elif max_points:
+        reducida = submuestreo.reducir_filas(data, max_points, clave_fecha)
+        response = jsonify({
+            'datos': reducida,
+            'total_original': len(data),
+            'total': len(reducida),
+            'max_points': max_points,
+            **_totales_serie([f.get('cabezas') for f in data], [f.get('precio_promedio_kg') for f in data]),
+        })
+    else:
+        response = jsonify(data)
+    if agrupacion:
+        response.headers['X-Agrupacion'] = agrupacion
+    response.vary.add('Accept')
+    return response
+
+def _usar_stream(start, end):
+    """?stream=1/0 fuerza o desactiva el streaming; si no se indica, depende del largo del rango."""
+    forzado = request.args.get('stream')
+    if forzado is not None:
+        return forzado == '1'
+    try:
+        dias = (datetime.strptime(end, '%Y-%m-%d') - datetime.strptime(start, '%Y-%m-%d')).days
+    except ValueError:
+        return False
+    return dias > STREAM_UMBRAL_DIAS
+
+def _json_bytes(valor):
+    if orjson:
+        return orjson.dumps(valor)
+    return json.dumps(valor, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+def _json_en_lotes(lotes):
+    """Arreglo JSON escrito lote a lote: '[' + elementos separados por ',' + ']'."""
+    yield b'['
+    primero = True
+    for lote in lotes:
+        if not lote:
+            continue
+        cuerpo = _json_bytes(lote)[1:-1]  # Sin los corchetes del lote
+        yield cuerpo if primero else b',' + cuerpo
+        primero = False
+    yield b']'
+
+def _stream_protegido(trozos):
+    """Un error a mitad del envío ya no puede volverse un 500 (los headers salieron): se registra y se corta."""
+    try:
+        yield from trozos
+    except Exception as e:
+        logger.error(f"Error en respuesta en streaming: {e}")
+
+def _respuesta_stream(lotes):
+    """Respuesta en streaming (la conexión de la petición se libera al terminar de enviar)."""
+    response = Response(stream_with_context(_stream_protegido(_json_en_lotes(lotes))), mimetype='application/json')
+    response.vary.add('Accept')
+    return response
+
+def _totales_serie(cabezas, precios):
+    """Totales sobre la serie completa: los KPIs no deben calcularse sobre la muestra."""
+    return {
+        'cabezas_total': sum(c or 0 for c in cabezas),
+        'precio_max': max((p for p in precios if p is not None), default=None),
+    }
+
+# --- SNAPSHOTS ESTÁTICOS (PUBLICADOS POR EL PIPELINE) ---
+# Series por rango estándar ya serializadas y comprimidas (ver shared_code/snapshots.py).
+# Se envían con send_file: GET condicional y Range sin pasar por SQLite ni por el serializador.
+
+SNAPSHOT_MAX_AGE = 365 * 24 * 3600  # Nombre por hash de contenido: el archivo no cambia nunca
+
+def _enviar_snapshot(archivo, codificaciones):
+    """El archivo en la variante precomprimida que acepte el cliente (o sin comprimir)."""
+    codificacion = request.accept_encodings.best_match(codificaciones) if codificaciones else None
+    ruta = archivo + snapshots.EXTENSIONES[codificacion] if codificacion else archivo
+    response = send_from_directory(snapshots.SNAPSHOTS_DIR, ruta, mimetype='application/json')
+    if codificacion:
+        response.headers['Content-Encoding'] = codificacion
+    response.vary.add('Accept-Encoding')
+    return response
+
+def _respuesta_snapshot(tabla, start, end, *filtros, agrupacion):
+    """Respuesta desde el snapshot de esa consulta si se publicó con la versión de datos vigente; si no, None."""
+    version = db_manager.get_version_datos()
+    entrada = snapshots.buscar_snapshot(tabla, start, end, *filtros, agrupacion=agrupacion,
+                                        version=version[0] if version else None)
+    if not entrada:
+        return None
+    try:
+        response = _enviar_snapshot(entrada['archivo'], entrada['codificaciones'])
+    except NotFound:
+        logger.warning(f"Snapshot del manifest inexistente: {entrada['archivo']}")
+        return None
+    response.headers['X-Agrupacion'] = entrada['agrupacion']
+    response.vary.add('Accept')
+    return response
+
+@app.route('/datos/<path:archivo>')
+def servir_snapshot(archivo):
+    """Manifest y archivos de snapshots, para clientes que los piden directamente."""
+    if archivo == snapshots.ARCHIVO_MANIFEST:
+        return send_from_directory(snapshots.SNAPSHOTS_DIR, archivo, mimetype='application/json',
+                                   max_age=API_CACHE_MAX_AGE)
+    if not archivo.startswith(f"{snapshots.SUBDIR_SERIES}/") or not archivo.endswith('.json'):
+        abort(404)
+    ruta = safe_join(snapshots.SNAPSHOTS_DIR, archivo)
+    if not ruta:
+        abort(404)
+    codificaciones = [c for c, extension in snapshots.EXTENSIONES.items() if os.path.isfile(ruta + extension)]
+    response = _enviar_snapshot(archivo, codificaciones)
+    response.headers['Cache-Control'] = f'public, max-age={SNAPSHOT_MAX_AGE}, immutable'
+    return response
+
 @app.route('/api/faena')
+@respuesta_condicional
+@respuesta_compartida
 def api_faena():
     try:
-        conn = get_db_precios() # DB Precios
         start, end = request.args.get('start'), request.args.get('end')
         if not start or not end: return jsonify({"error": "Fechas requeridas"}), 400
+        try:
+            agrupacion, max_points, formato_fecha, since = _leer_parametros_serie()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        try:
+            representacion = _leer_representacion()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 406
+        if representacion != formatos_binarios.MIME_JSON:
+            formato_fecha = 'epoch_day'  # Las columnas binarias son date32: días desde 1970-01-01
         
-        data = db_manager.get_faena_historico(conn, start, end, request.args.get('categoria'), request.args.get('raza'), request.args.get('rango_peso'))
-        return jsonify(data)
+        filtros = (request.args.get('categoria'), request.args.get('raza'), request.args.get('rango_peso'))
+        if since is None and agrupacion and formato_fecha == 'iso' and not max_points \
+                and representacion == formatos_binarios.MIME_JSON:
+            # Vista estándar del Dashboard: puede estar publicada como archivo por el pipeline (nunca un delta)
+            snapshot = _respuesta_snapshot('faena', start, end, *filtros, agrupacion=agrupacion)
+            if snapshot:
+                return snapshot
+        if since is not None:
+            data = leer_precios(db_manager.get_faena_cambios, start, end, *filtros, desde=since, formato_fecha=formato_fecha)
+        elif agrupacion:
+            agrupacion, data = leer_precios(lecturas_precios.get_faena_agrupado, start, end, *filtros, agrupacion=agrupacion,
+                                            formato_fecha=formato_fecha)
+        elif formato_fecha:
+            data = leer_precios(db_manager.get_faena_columnar, start, end, *filtros, formato_fecha=formato_fecha)
+        elif not max_points and _usar_stream(start, end):
+            return _respuesta_stream(db_manager.iterar_faena_historico(get_db_precios(), start, end, *filtros))
+        else:
+            data = leer_precios(lecturas_precios.get_faena_historico, start, end, *filtros)
+        return _respuesta_serie(agrupacion, data, max_points, 'fecha_consulta', formato_fecha, representacion)
     except Exception as e:
         logger.error(f"API Faena Error: {e}")
         return jsonify({"error": "Error interno"}), 500
 
 @app.route('/api/invernada')
+@respuesta_condicional
+@respuesta_compartida
 def api_invernada():
     try:
-        conn = get_db_precios() # DB Precios
         start, end = request.args.get('start'), request.args.get('end')
         if not start or not end: return jsonify({"error": "Fechas requeridas"}), 400
+        try:
+            agrupacion, max_points, formato_fecha, since = _leer_parametros_serie()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        try:
+            representacion = _leer_representacion()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 406
+        if representacion != formatos_binarios.MIME_JSON:
+            formato_fecha = 'epoch_day'  # Las columnas binarias son date32: días desde 1970-01-01
         
-        data = db_manager.get_invernada_historico(conn, start, end, request.args.get('categoria'))
-        return jsonify(data)
+        categoria = request.args.get('categoria')
+        if since is None and agrupacion and formato_fecha == 'iso' and not max_points \
+                and representacion == formatos_binarios.MIME_JSON:
+            # Vista estándar del Dashboard: puede estar publicada como archivo por el pipeline (nunca un delta)
+            snapshot = _respuesta_snapshot('invernada', start, end, categoria, agrupacion=agrupacion)
+            if snapshot:
+                return snapshot
+        if since is not None:
+            data = leer_precios(db_manager.get_invernada_cambios, start, end, categoria, desde=since,
+                                formato_fecha=formato_fecha)
+        elif agrupacion:
+            agrupacion, data = leer_precios(lecturas_precios.get_invernada_agrupado, start, end, categoria,
+                                            agrupacion=agrupacion, formato_fecha=formato_fecha)
+        elif formato_fecha:
+            data = leer_precios(db_manager.get_invernada_columnar, start, end, categoria, formato_fecha=formato_fecha)
+        elif not max_points and _usar_stream(start, end):
+            return _respuesta_stream(db_manager.iterar_invernada_historico(get_db_precios(), start, end, categoria))
+        else:
+            data = leer_precios(lecturas_precios.get_invernada_historico, start, end, categoria)
+        return _respuesta_serie(agrupacion, data, max_points, 'fecha_consulta_fin', formato_fecha, representacion)
     except Exception as e:
         logger.error(f"API Invernada Error: {e}")
         return jsonify({"error": "Error interno"}), 500
 
+# --- RESUMEN (KPIs) ---
+
+def _leer_rango_iso():
+    """start/end obligatorios en YYYY-MM-DD. Lanza ValueError con el mensaje de error."""
+    start, end = request.args.get('start'), request.args.get('end')
+    if not start or not end:
+        raise ValueError("Fechas requeridas")
+    try:
+        datetime.strptime(start, '%Y-%m-%d')
+        datetime.strptime(end, '%Y-%m-%d')
+    except ValueError:
+        raise ValueError("Fechas inválidas")
+    return start, end
+
+@app.route('/api/faena/resumen')
+@respuesta_condicional
+@respuesta_compartida
+def api_faena_resumen():
+    try:
+        start, end = _leer_rango_iso()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        filtros = (request.args.get('categoria'), request.args.get('raza'), request.args.get('rango_peso'))
+        return jsonify(leer_precios(lecturas_precios.get_faena_resumen, start, end, *filtros))
+    except Exception as e:
+        logger.error(f"API Faena Resumen Error: {e}")
+        return jsonify({"error": "Error interno"}), 500
+
+@app.route('/api/invernada/resumen')
+@respuesta_condicional
+@respuesta_compartida
+def api_invernada_resumen():
+    try:
+        start, end = _leer_rango_iso()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        return jsonify(leer_precios(lecturas_precios.get_invernada_resumen, start, end, request.args.get('categoria')))
+    except Exception as e:
+        logger.error(f"API Invernada Resumen Error: {e}")
+        return jsonify({"error": "Error interno"}), 500
+
+# --- COMPARACIÓN DE SERIES (MULTI) ---
+
+def _leer_series(columnas):
+    """
+    Lee las ?serie= repetidas ("categoria|raza|rango_peso" en Faena, "categoria" en Invernada).
+    Las partes vacías significan "todas". Lanza ValueError si faltan o sobran series.
+    """
+    series = []
+    for valor in request.args.getlist('serie'):
+        partes = [p.strip() or None for p in valor.split('|')]
+        if not partes[0] or len(partes) > len(columnas):
+            raise ValueError("Serie inválida")
+        series.append(tuple(partes + [None] * (len(columnas) - len(partes))))
+    if not series or len(series) > db_manager.MAX_SERIES_MULTI:
+        raise ValueError(f"Se esperan entre 1 y {db_manager.MAX_SERIES_MULTI} series")
+    return tuple(series)
+
+def _respuesta_multi(funcion, columnas):
+    start, end = request.args.get('start'), request.args.get('end')
+    if not start or not end:
+        return jsonify({"error": "Fechas requeridas"}), 400
+    agrupacion = request.args.get('agrupacion', 'auto')
+    if agrupacion not in db_manager.AGRUPACIONES:
+        return jsonify({"error": "Agrupación inválida"}), 400
+    try:
+        series = _leer_series(columnas)
+        formato_fecha = _leer_formato_columnar()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # Invernada recibe la lista de categorías; Faena, las tuplas (categoria, raza, rango_peso)
+    claves = series if len(columnas) > 1 else tuple(clave[0] for clave in series)
+    agrupacion, datos = leer_precios(funcion, start, end, claves, agrupacion=agrupacion, formato_fecha=formato_fecha)
+    response = jsonify({
+        'agrupacion': agrupacion,
+        'series': [{'clave': dict(zip(columnas, clave)), 'datos': filas} for clave, filas in zip(series, datos)],
+    })
+    response.headers['X-Agrupacion'] = agrupacion
+    return response
+
+@app.route('/api/faena/multi')
+@respuesta_condicional
+@respuesta_compartida
+def api_faena_multi():
+    try:
+        return _respuesta_multi(db_manager.get_faena_agrupado_multi, ('categoria', 'raza', 'rango_peso'))
+    except Exception as e:
+        logger.error(f"API Faena Multi Error: {e}")
+        return jsonify({"error": "Error interno"}), 500
+
+@app.route('/api/invernada/multi')
+@respuesta_condicional
+@respuesta_compartida
+def api_invernada_multi():
+    try:
+        return _respuesta_multi(db_manager.get_invernada_agrupado_multi, ('categoria',))
+    except Exception as e:
+        logger.error(f"API Invernada Multi Error: {e}")
+        return jsonify({"error": "Error interno"}), 500
+
+# --- EXPORTACIÓN (CSV / NDJSON) ---
+
+def _respuesta_exportacion(tabla, **filtros):
+    """Descarga en streaming de la tabla cruda; ?compresion=gzip entrega un .gz."""
+    try:
+        start, end = _leer_rango_iso()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    formato = request.args.get('format', 'csv')
+    compresion_archivo = request.args.get('compresion')
+    if formato not in exportacion.FORMATOS_EXPORTACION or compresion_archivo not in (None, 'gzip'):
+        return jsonify({"error": "Formato inválido"}), 400
+
+    try:
+        columnas, lotes = db_manager.exportar_precios(get_db_precios(), tabla, start, end, **filtros)
+    except sqlite3.Error as e:
+        logger.error(f"Error exportando {tabla}: {e}")
+        return jsonify({"error": "Error interno"}), 500
+
+    trozos = exportacion.serializar(formato, columnas, lotes)
+    nombre = f"{tabla}_{start}_{end}.{formato}"
+    mimetype = exportacion.TIPOS_CONTENIDO[formato]
+    if compresion_archivo:
+        trozos = compresion.comprimir_stream(trozos, 'gzip')
+        nombre += '.gz'
+        mimetype = 'application/gzip'
+    response = Response(stream_with_context(_stream_protegido(trozos)), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{nombre}"'
+    return response
+
+@app.route('/api/export/faena')
+@respuesta_condicional
+def api_export_faena():
+    return _respuesta_exportacion('faena', categoria=request.args.get('categoria'),
+                                  raza=request.args.get('raza'), rango_peso=request.args.get('rango_peso'))
+
+@app.route('/api/export/invernada')
+@respuesta_condicional
+def api_export_invernada():
+    return _respuesta_exportacion('invernada', categoria=request.args.get('categoria'))
+
 @app.route('/api/categorias')
+@respuesta_condicional
+@respuesta_compartida
 def api_categorias():
     try:
-        conn = get_db_precios()
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT DISTINCT categoria_original FROM faena ORDER BY categoria_original")
-        all_faena = [r[0] for r in cursor.fetchall()]
-        
-        cursor.execute("SELECT DISTINCT categoria_original FROM invernada ORDER BY categoria_original")
-        all_inv = [r[0] for r in cursor.fetchall()]
-        
-        excl = [c.lower() for c in CATEGORIAS_EXCLUIDAS]
+        all_faena, all_inv = leer_precios(db_manager.get_categorias_precios)
         
         return jsonify({
-            'faena': [c for c in all_faena if c.lower() not in excl and "cruza" not in c.lower()],
-            'invernada': [c for c in all_inv if c.lower() not in excl]
+            'faena': [c for c in all_faena if db_manager.categoria_visible('faena', c)],
+            'invernada': [c for c in all_inv if db_manager.categoria_visible('invernada', c)]
         })
     except Exception as e:
         logger.error(f"API Categorias Error: {e}")
         return jsonify({"error": "Error interno"}), 500
 
+@app.route('/api/dashboard/bootstrap')
+@respuesta_condicional
+@respuesta_compartida
+def api_dashboard_bootstrap():
+    """Todo lo que el Dashboard necesita para armar sus filtros: árbol de series con rangos de fechas."""
+    try:
+        return jsonify(leer_precios(db_manager.get_catalogo_series))
+    except Exception as e:
+        logger.error(f"API Bootstrap Error: {e}")
+        return jsonify({"error": "Error interno"}), 500
+
+# --- DATOS INICIALES DEL DASHBOARD ---
+# /precios embebe (JSON en la página) el árbol de filtros y la serie que el Dashboard muestra
+# al abrir: la categoría de Faena más vista en los últimos DIAS_SERIE_INICIAL días, con el
+# resumen de KPIs. Se leen con las mismas llamadas (y la misma caché de lecturas) que usa la API.
+# Las vistas se cuentan una vez por vista del Dashboard (la serie embebida al abrir /precios y
+# cada cambio de categoría que hace el usuario), no por pedido a /api/faena, en un contador por
+# día de la caché compartida: todos los workers ven el mismo ranking y sobrevive a los deploys.
+
+DIAS_SERIE_INICIAL = 90
+CONTADOR_VISTAS = 'vistas_categoria_faena'
+
+def _categoria_mas_vista(catalogo):
+    """La categoría de Faena más vista que siga en el catálogo (si no hay vistas, la primera)."""
+    disponibles = [nodo['categoria'] for nodo in catalogo.get('faena', [])]
+    ranking = get_cache_compartido().ranking(CONTADOR_VISTAS, dias=DIAS_SERIE_INICIAL)
+    return next((categoria for categoria, _ in ranking if categoria in disponibles),
+                disponibles[0] if disponibles else None)
+
+@app.route('/api/dashboard/vista', methods=['POST'])
+@csrf.exempt
+@limiter.limit("30 per minute")
+def api_dashboard_vista():
+    """El Dashboard avisa que el usuario eligió una categoría de Faena: cuenta una vista."""
+    categoria = ((request.get_json(silent=True) or {}).get('categoria') or '').strip()
+    try:
+        catalogo = leer_precios(db_manager.get_catalogo_series)
+    except Exception as e:
+        logger.error(f"API Vista Dashboard Error: {e}")
+        return jsonify({"error": "Error interno"}), 500
+    # Solo categorías del catálogo: el contador no acepta claves arbitrarias
+    if categoria not in {nodo['categoria'] for nodo in catalogo.get('faena', [])}:
+        return jsonify({"error": "Categoría inválida"}), 400
+    get_cache_compartido().contar(CONTADOR_VISTAS, categoria)
+    return '', 204
+
+def _datos_iniciales_dashboard():
+    """{catalogo, serie: {modo, categoria, start, end, agrupacion, datos, resumen}} o None si falla la lectura."""
+    try:
+        catalogo = leer_precios(db_manager.get_catalogo_series)
+        categoria = _categoria_mas_vista(catalogo)
+        if not categoria:
+            return {'catalogo': catalogo, 'serie': None}
+        end = date.today()
+        start = (end - timedelta(days=DIAS_SERIE_INICIAL)).isoformat()
+        end = end.isoformat()
+        # Mismos argumentos que /api/faena y /api/faena/resumen: comparten las entradas de la caché
+        agrupacion, datos = leer_precios(lecturas_precios.get_faena_agrupado, start, end, categoria, None, None,
+                                         agrupacion='auto', formato_fecha='iso')
+        resumen = leer_precios(lecturas_precios.get_faena_resumen, start, end, categoria, None, None)
+        return {
+            'catalogo': catalogo,
+            'serie': {'modo': 'faena', 'categoria': categoria, 'start': start, 'end': end,
+                      'agrupacion': 'auto', 'agrupacion_aplicada': agrupacion, 'datos': datos, 'resumen': resumen},
+        }
+    except Exception as e:
+        logger.error(f"Datos iniciales del Dashboard: {e}")
+        return None
+
 @app.route('/api/subcategorias')
+@respuesta_condicional
+@respuesta_compartida
 def api_subcategorias():
     cat = request.args.get('categoria')
     if not cat: return jsonify({"error": "Categoria requerida"}), 400
     try:
-        conn = get_db_precios()
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT DISTINCT raza FROM faena WHERE categoria_original = ? AND raza != '' ORDER BY raza", (cat,))
-        razas = [r[0] for r in cursor.fetchall()]
-        
-        query_peso = "SELECT DISTINCT rango_peso FROM faena WHERE categoria_original = ? AND rango_peso != ''"
-        params_peso = [cat]
-        if request.args.get('raza'):
-            query_peso += " AND raza = ?"
-            params_peso.append(request.args.get('raza'))
-        query_peso += " ORDER BY rango_peso"
-        
-        cursor.execute(query_peso, tuple(params_peso))
-        pesos = [r[0] for r in cursor.fetchall()]
+        razas, pesos = leer_precios(db_manager.get_subcategorias_faena, cat, request.args.get('raza'))
         
         return jsonify({'razas': razas, 'pesos': pesos})
     except Exception as e:
@@ -558,6 +1129,34 @@ def api_subcategorias():
 
 # --- RUTAS DE MARKETPLACE ---
 
+# Páginas públicas del marketplace cacheadas entre workers (solo visitantes anónimos).
+CACHE_PAGINAS_TTL = int(os.environ.get('CACHE_PAGINAS_TTL', 60))
+
+def pagina_compartida(vista):
+    """
+    Sirve la página renderizada desde la caché compartida a visitantes anónimos.
+    No se cachea si hay un usuario logueado (la navegación cambia) ni si hay mensajes flash pendientes.
+    Cualquier POST exitoso invalida todas las páginas (ver invalidar_paginas_cacheadas).
+    """
+    @wraps(vista)
+    def envoltura(*args, **kwargs):
+        if CACHE_PAGINAS_TTL <= 0 or current_user.is_authenticated or session.get('_flashes'):
+            return vista(*args, **kwargs)
+        guardada = get_cache_compartido().obtener('pagina', _clave_peticion())
+        if guardada:
+            return _respuesta_guardada(guardada)
+        response = make_response(vista(*args, **kwargs))
+        _publicar_respuesta('pagina', response, ttl=CACHE_PAGINAS_TTL)
+        return response
+    return envoltura
+
+@app.after_request
+def invalidar_paginas_cacheadas(response):
+    """Publicar, editar, borrar o activar lotes (todas vía POST) deja obsoletas las páginas cacheadas."""
+    if request.method == 'POST' and response.status_code < 400 and CACHE_PAGINAS_TTL > 0:
+        get_cache_compartido().invalidar('pagina')
+    return response
+
 @app.route('/publicar', methods=['GET', 'POST'])
 @login_required
 @limiter.limit("10 per hour")
@@ -788,6 +1387,7 @@ def eliminar_publicacion(pub_id):
 # --- RUTA DE LA VIDRIERA (PÚBLICA) ---
 
 @app.route('/mercado')
+@pagina_compartida
 def mercado():
     conn = get_db_market()
     lotes = db_manager.obtener_publicaciones(conn)
@@ -809,6 +1409,21 @@ def admin_panel():
     
     return render_template('admin/panel.html', usuarios=usuarios, publicaciones=publicaciones)
 
+@app.route('/admin/metricas')
+@login_required
+def admin_metricas():
+    """Contadores del worker que atiende la petición: pools de conexiones y cachés."""
+    if not current_user.es_admin:
+        abort(403)
+    return jsonify({
+        'pid': os.getpid(),
+        'pools': db_manager.get_pool_stats(),
+        'cache_lecturas': db_manager.get_cache_stats(),
+        'single_flight': db_manager.get_lecturas_en_vuelo().estadisticas(),
+        'cache_compartido': get_cache_compartido().estadisticas(),
+        'compresion': compresion.get_cache_variantes().estadisticas(),
+    })
+
 @app.route('/admin/borrar_lote/<int:id>', methods=['POST'])
 @login_required
 def admin_borrar_lote(id):
@@ -880,6 +1495,7 @@ def admin_toggle_user(id):
     return jsonify({'success': False, 'msg': 'Error en DB'}), 500
 
 @app.route('/mercado/<int:lote_id>')
+@pagina_compartida
 def detalle_lote(lote_id):
     conn = get_db_market()
     
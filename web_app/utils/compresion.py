@@ -0,0 +1,206 @@
+"""
+Compresión de respuestas HTTP negociada con Accept-Encoding (brotli si está instalado, si no gzip).
+
+- Solo se comprimen tipos de texto (HTML, JSON, CSV, JS...) por encima de un tamaño mínimo:
+  en respuestas chicas los headers y la CPU pesan más que lo que se ahorra.
+- Las respuestas cacheables (con ETag) guardan su variante comprimida en memoria del worker:
+  la misma serie pedida por varios clientes se comprime una sola vez por versión de datos.
+  El ETag de la variante lleva el sufijo de la codificación ("v12-abc...-br").
+- Las respuestas en streaming (generadores) y las muy grandes se comprimen por bloques
+  a medida que se envían, sin armar el cuerpo comprimido completo en memoria.
+"""
+import os
+import gzip
+import zlib
+import threading
+from collections import OrderedDict
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # Dependencia opcional: sin ella se negocia solo gzip
+    brotli = None
+
+COMPRESION_MIN_BYTES = int(os.environ.get('COMPRESION_MIN_BYTES', 1024))
+COMPRESION_STREAM_BYTES = int(os.environ.get('COMPRESION_STREAM_BYTES', 512 * 1024))
+COMPRESION_CACHE_MB = float(os.environ.get('COMPRESION_CACHE_MB', 16))
+NIVEL_GZIP = 6
+NIVEL_BROTLI = 5    # Comprime como gzip -9 con bastante menos CPU
+TAMANO_BLOQUE = 64 * 1024
+
+TIPOS_COMPRIMIBLES = ('text/', 'application/json', 'application/javascript', 'application/x-ndjson',
+                      'application/xml', 'image/svg+xml',
+                      'application/vnd.apache.arrow.stream', 'application/msgpack')  # Fechas/enteros comprimen bien
+
+
+def codificaciones_disponibles():
+    """En orden de preferencia del servidor."""
+    return ('br', 'gzip') if brotli else ('gzip',)
+
+
+def elegir_codificacion(accept_encodings):
+    """Mejor codificación aceptada por el cliente (respeta q=0 y '*'); None = sin comprimir."""
+    return accept_encodings.best_match(codificaciones_disponibles())
+
+
+def variantes_etag(etag):
+    """ETag base y los de sus variantes comprimidas (para validar If-None-Match)."""
+    return [etag] + [f"{etag}-{codificacion}" for codificacion in ('br', 'gzip')]
+
+
+def comprimir(datos, codificacion):
+    if codificacion == 'br':
+        return brotli.compress(datos, quality=NIVEL_BROTLI)
+    # mtime=0: la misma entrada produce siempre los mismos bytes
+    return gzip.compress(datos, NIVEL_GZIP, mtime=0)
+
+
+def comprimir_stream(trozos, codificacion):
+    """Generador que comprime un iterable de bytes/str bloque a bloque."""
+    if codificacion == 'br':
+        compresor = brotli.Compressor(quality=NIVEL_BROTLI)
+        procesar, terminar = compresor.process, compresor.finish
+    else:
+        compresor = zlib.compressobj(NIVEL_GZIP, zlib.DEFLATED, 31)  # wbits=31: formato gzip
+        procesar, terminar = compresor.compress, compresor.flush
+    for trozo in trozos:
+        if isinstance(trozo, str):
+            trozo = trozo.encode('utf-8')
+        salida = procesar(trozo)
+        if salida:
+            yield salida
+    yield terminar()
+
+
+def _en_bloques(datos):
+    for inicio in range(0, len(datos), TAMANO_BLOQUE):
+        yield datos[inicio:inicio + TAMANO_BLOQUE]
+
+
+class CacheVariantes:
+    """LRU acotada por bytes de cuerpos comprimidos, por (ETag, codificación)."""
+
+    def __init__(self, max_bytes=int(COMPRESION_CACHE_MB * 1024 * 1024)):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._reiniciar()
+
+    def _reiniciar(self):
+        self._pid = os.getpid()
+        self._entradas = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.bytes_originales = 0
+        self.bytes_enviados = 0
+
+    def obtener(self, etag, codificacion, datos):
+        clave = (etag, codificacion)
+        with self._lock:
+            if os.getpid() != self._pid:
+                self._reiniciar()
+            cuerpo = self._entradas.get(clave)
+            if cuerpo is not None:
+                self._entradas.move_to_end(clave)
+                self.hits += 1
+                return cuerpo
+            self.misses += 1
+
+        cuerpo = comprimir(datos, codificacion)
+        if len(cuerpo) <= self.max_bytes:
+            with self._lock:
+                if clave not in self._entradas:
+                    self._entradas[clave] = cuerpo
+                    self._bytes += len(cuerpo)
+                while self._bytes > self.max_bytes:
+                    _, viejo = self._entradas.popitem(last=False)
+                    self._bytes -= len(viejo)
+        return cuerpo
+
+    def registrar(self, originales, enviados):
+        with self._lock:
+            self.bytes_originales += originales
+            self.bytes_enviados += enviados
+
+    def limpiar(self):
+        with self._lock:
+            self._reiniciar()
+
+    def estadisticas(self):
+        with self._lock:
+            consultas = self.hits + self.misses
+            return {
+                'codificaciones': list(codificaciones_disponibles()),
+                'variantes': len(self._entradas),
+                'bytes_variantes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / consultas, 4) if consultas else None,
+                'bytes_originales': self.bytes_originales,
+                'bytes_enviados': self.bytes_enviados,
+            }
+
+
+_VARIANTES = CacheVariantes()
+
+def get_cache_variantes():
+    return _VARIANTES
+
+
+def _es_comprimible(response):
+    if response.status_code != 200 or response.direct_passthrough:
+        return False  # direct_passthrough: archivos servidos con send_file
+    if 'Content-Encoding' in response.headers or 'no-transform' in response.headers.get('Cache-Control', ''):
+        return False
+    return (response.mimetype or '').startswith(TIPOS_COMPRIMIBLES)
+
+
+def comprimir_respuesta(response):
+    """Hook after_request: comprime la respuesta según lo que acepte el cliente."""
+    if response.status_code == 304 and response.get_etag()[0]:
+        response.vary.add('Accept-Encoding')
+        return response
+    if not _es_comprimible(response):
+        return response
+    response.vary.add('Accept-Encoding')
+    codificacion = elegir_codificacion(request.accept_encodings)
+    if codificacion is None:
+        return response
+
+    etag, _ = response.get_etag()
+    if response.is_streamed:
+        response.response = comprimir_stream(response.response, codificacion)
+    else:
+        datos = response.get_data()
+        if len(datos) < COMPRESION_MIN_BYTES:
+            return response
+        if etag:
+            cuerpo = _VARIANTES.obtener(etag, codificacion, datos)
+            if len(cuerpo) >= len(datos):
+                return response
+            response.set_data(cuerpo)
+            _VARIANTES.registrar(len(datos), len(cuerpo))
+        elif len(datos) >= COMPRESION_STREAM_BYTES:
+            response.response = comprimir_stream(_en_bloques(datos), codificacion)
+        else:
+            cuerpo = comprimir(datos, codificacion)
+            if len(cuerpo) >= len(datos):
+                return response
+            response.set_data(cuerpo)
+            _VARIANTES.registrar(len(datos), len(cuerpo))
+
+    if response.is_streamed:
+        response.headers.pop('Content-Length', None)
+    response.headers['Content-Encoding'] = codificacion
+    if etag:
+        response.set_etag(f"{etag}-{codificacion}")
+    return response
+
+
+def instalar(app):
+    """
+    Registra la compresión en la app. Conviene llamarla antes que cualquier otro after_request:
+    Flask los ejecuta en orden inverso, así la compresión es lo último que toca la respuesta.
+    """
+    app.after_request(comprimir_respuesta)
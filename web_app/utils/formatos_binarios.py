@@ -0,0 +1,144 @@
+"""
+Representaciones binarias de las series de precios, negociadas con el header Accept.
+
+- `application/vnd.apache.arrow.stream`: Arrow IPC (formato stream), una columna tipada por campo.
+  Requiere `pyarrow`.
+- `application/msgpack`: MessagePack con un buffer little-endian por columna. Requiere `msgpack`.
+
+Las dos parten del formato columnar de db_manager (una lista por columna). Cada columna se
+convierte entera a un arreglo numpy del tipo que le corresponde, sin recorrer filas en Python:
+    fechas        -> date32 (días desde 1970-01-01, las consultas se piden con fechas=epoch_day)
+    cabezas, registros -> int32
+    dimensiones   -> utf8
+    resto         -> float64
+Si la librería de un formato no está instalada, ese tipo no se ofrece en la negociación.
+"""
+import io
+import json
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+except ImportError:  # Dependencia opcional: sin ella no se ofrece Arrow
+    pa = None
+
+try:
+    import msgpack
+except ImportError:  # Dependencia opcional: sin ella no se ofrece MessagePack
+    msgpack = None
+
+MIME_JSON = 'application/json'
+MIME_ARROW = 'application/vnd.apache.arrow.stream'
+MIME_MSGPACK = 'application/msgpack'
+TIPOS_BINARIOS = (MIME_ARROW, MIME_MSGPACK)
+
+COLUMNAS_ENTERAS = ('cabezas', 'registros')
+COLUMNAS_TEXTO = ('categoria_original', 'raza', 'rango_peso')
+
+
+def tipos_disponibles():
+    """En orden de preferencia del servidor (JSON primero: es lo que recibe un cliente con */*)."""
+    tipos = [MIME_JSON]
+    if pa is not None:
+        tipos.append(MIME_ARROW)
+    if msgpack is not None:
+        tipos.append(MIME_MSGPACK)
+    return tipos
+
+
+def negociar(accept_mimetypes):
+    """
+    Mimetype de la respuesta según Accept. Sin Accept, o si no pide nada que conozcamos, JSON.
+    Devuelve None si el cliente pidió explícitamente un formato binario que el servidor no
+    puede generar (y no acepta JSON): corresponde un 406.
+    """
+    if not accept_mimetypes:
+        return MIME_JSON
+    elegido = accept_mimetypes.best_match(tipos_disponibles())
+    if elegido:
+        return elegido
+    if any(valor in TIPOS_BINARIOS for valor, _ in accept_mimetypes):
+        return None
+    return MIME_JSON
+
+
+def tipo_columna(nombre):
+    if nombre.startswith('fecha'):
+        return 'date32'
+    if nombre in COLUMNAS_ENTERAS:
+        return 'int32'
+    if nombre in COLUMNAS_TEXTO:
+        return 'utf8'
+    return 'float64'
+
+
+def _columna_numpy(valores, tipo):
+    """(arreglo tipado, máscara de nulos o None). NULL llega como None y numpy lo lee como NaN."""
+    flotantes = np.array(valores, dtype=np.float64)
+    nulos = np.isnan(flotantes)
+    if not nulos.any():
+        nulos = None
+    if tipo == 'float64':
+        return flotantes, nulos
+    # int32 / date32: los valores enteros de SQLite entran exactos en float64
+    if nulos is not None:
+        flotantes[nulos] = 0
+    return flotantes.astype(np.int32), nulos
+
+
+def _metadatos(data, extra):
+    """Todo lo que no es columna (n, constantes, totales de max_points...) más `extra`."""
+    metadatos = {k: v for k, v in data.items() if k != 'columnas'}
+    metadatos.update(extra or {})
+    return metadatos
+
+
+def a_arrow(data, extra=None):
+    """Serie columnar -> bytes Arrow IPC. Los metadatos viajan como JSON en el schema."""
+    campos, arreglos = [], []
+    for nombre, valores in data['columnas'].items():
+        tipo = tipo_columna(nombre)
+        if tipo == 'utf8':
+            arreglo = pa.array(valores, type=pa.string())
+        else:
+            datos, nulos = _columna_numpy(valores, tipo)
+            arreglo = pa.array(datos, mask=nulos, type=getattr(pa, tipo)())
+        campos.append(pa.field(nombre, arreglo.type))
+        arreglos.append(arreglo)
+
+    schema = pa.schema(campos, metadata={'serie': json.dumps(_metadatos(data, extra), ensure_ascii=False)})
+    salida = io.BytesIO()
+    with pa.ipc.new_stream(salida, schema) as escritor:
+        escritor.write_batch(pa.record_batch(arreglos, schema=schema))
+    return salida.getvalue()
+
+
+def a_msgpack(data, extra=None):
+    """
+    Serie columnar -> bytes MessagePack:
+        {n, constantes, ..., columnas: {nombre: {tipo, datos, nulos}}}
+    `datos` es el buffer little-endian de la columna (float64 / int32; date32 = int32 de días) o,
+    para utf8, la lista de textos. `nulos`, si hay, es un bitmap (1 = nulo, orden de bits little).
+    """
+    columnas = {}
+    for nombre, valores in data['columnas'].items():
+        tipo = tipo_columna(nombre)
+        if tipo == 'utf8':
+            columnas[nombre] = {'tipo': tipo, 'datos': list(valores), 'nulos': None}
+            continue
+        datos, nulos = _columna_numpy(valores, tipo)
+        columnas[nombre] = {
+            'tipo': tipo,
+            'datos': datos.astype(datos.dtype.newbyteorder('<'), copy=False).tobytes(),
+            'nulos': np.packbits(nulos, bitorder='little').tobytes() if nulos is not None else None,
+        }
+    return msgpack.packb(dict(_metadatos(data, extra), columnas=columnas), use_bin_type=True)
+
+
+def serializar(data, mimetype, extra=None):
+    if mimetype == MIME_ARROW:
+        return a_arrow(data, extra)
+    if mimetype == MIME_MSGPACK:
+        return a_msgpack(data, extra)
+    raise ValueError(f"Tipo binario no soportado: {mimetype}")